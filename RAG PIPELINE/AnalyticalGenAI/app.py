@@ -1,7 +1,9 @@
+import sys
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 import os
+import re
 import json
 from dotenv import load_dotenv
 from datetime import datetime
@@ -19,11 +21,15 @@ from langchain.schema import Document
 import pandas as pd
 import numpy as np
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
 from langchain.tools import Tool
 from langchain.agents import initialize_agent, AgentType
 from langchain_core.messages import HumanMessage
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataEngineering'))
+from schema import enforce_schema
+from cube_store import GoldCube
+from region_index import RegionIndex
+
 # --- Flask App ---
 app = Flask(__name__)
 CORS(app)  # allow frontend calls
@@ -71,9 +77,11 @@ memory = ConversationBufferMemory(memory_key="chat_history", return_messages=Tru
 
 # ---------------- SIMPLE RAG CHAIN ----------------
 class SimpleRagChain:
-    def __init__(self, retriever, df):
+    def __init__(self, retriever, df, cube=None, regions=None):
         self.retriever = retriever
         self.df = df  # keep raw data
+        self.cube = cube  # memory-mapped gold cube, if built
+        self.regions = regions  # named sea/basin masks on the cube grid, if built
         # Column descriptions
         self.column_desc = {
             "lat": "Latitude",
@@ -90,10 +98,17 @@ class SimpleRagChain:
 
     def find_nearest(self, lat, lon, top_k=3):
         """Find top-k nearest locations using raw lat/lon"""
-        self.df["distance"] = self.df.apply(
-            lambda row: geodesic((lat, lon), (float(row["lat"]), float(row["lon"]))).km,
-            axis=1,
-        )
+        if self.cube is not None:
+            found = self._find_nearest_in_cube(lat, lon, top_k)
+            if found["answer"]:
+                return found
+
+        # Vectorized haversine on the numeric columns, no per-row geodesic
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2 = np.radians(self.df["lat"].to_numpy(dtype=np.float64))
+        lon2 = np.radians(self.df["lon"].to_numpy(dtype=np.float64))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        self.df["distance"] = 6371.0088 * 2 * np.arcsin(np.sqrt(a))
         nearest = self.df.nsmallest(top_k, "distance")
         results = []
         for _, row in nearest.iterrows():
@@ -102,6 +117,15 @@ class SimpleRagChain:
             results.append(result)
         return {"answer": results}
 
+    def _find_nearest_in_cube(self, lat, lon, top_k):
+        """Nearest cells straight from the gold cube arrays"""
+        results = []
+        for record in self.cube.nearest(lat, lon, top_k):
+            result = {desc: record[col] for col, desc in self.column_desc.items() if col in record}
+            result["Distance from query (km)"] = f"{record['distance']:.2f}"
+            results.append(result)
+        return {"answer": results}
+
     def format_nearest_human_readable(self, lat, lon, top_k=3):
         """Return a human-readable string for nearest points"""
         data = self.find_nearest(lat, lon, top_k)["answer"]
@@ -112,15 +136,39 @@ class SimpleRagChain:
                 lines.append(f"   - {k}: {v}")
         return "\n".join(lines)
 
+    def resolve_region(self, text):
+        """Named sea/basin mentioned in text, if the region index is available"""
+        if self.cube is None or self.regions is None:
+            return None
+        return self.regions.resolve(text)
+
+    def format_region_summary(self, region, time_range=None):
+        """Return a human-readable aggregate of every variable over a named region"""
+        summary = self.regions.aggregate(self.cube, region, time_range=time_range)
+        months = summary["months"]
+        if not months:
+            return f"[ERROR] No data for {region} in the requested period."
+
+        period = f"{months[0][0]}-{months[0][1]:02d} to {months[-1][0]}-{months[-1][1]:02d}"
+        lines = [f"[OCEAN] Oceanographic summary for {region} ({period}, {summary['cells']} grid cells):"]
+        for var, stats in summary["variables"].items():
+            if stats["count"] == 0:
+                continue
+            lines.append(f"   - {self.column_desc.get(var, var)}: mean {stats['mean']:.3f}, "
+                         f"min {stats['min']:.3f}, max {stats['max']:.3f} ({stats['count']} observations)")
+        return "\n".join(lines)
+
 # ---------------- VECTORSTORE BUILDER ----------------
-def build_vectorstore(parquet_path, persist_directory="./chroma_db", batch_size=1000):
+def build_vectorstore(parquet_path, persist_directory="./chroma_db", batch_size=1000, cube_path=None):
     embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
     
-    df = pd.read_parquet(parquet_path).astype(str)
+    df = enforce_schema(pd.read_parquet(parquet_path))
+    cube = GoldCube(cube_path) if cube_path and os.path.exists(cube_path) else None
+    regions = RegionIndex(cube_path) if cube is not None and RegionIndex.exists(cube_path) else None
 
     if os.path.exists(persist_directory) and os.listdir(persist_directory):
         vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
-        return SimpleRagChain(vectorstore.as_retriever(search_kwargs={"k": 5}), df)
+        return SimpleRagChain(vectorstore.as_retriever(search_kwargs={"k": 5}), df, cube, regions)
 
     vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_directory)
     
@@ -134,14 +182,14 @@ def build_vectorstore(parquet_path, persist_directory="./chroma_db", batch_size=
                     f"AOT_862: {row['aot_862']}, Chlor_a: {row['chlor_a']}, "
                     f"Kd_490: {row['Kd_490']}"
                 ),
-                metadata=row.to_dict()
+                metadata={k: str(v) for k, v in row.items()}
             )
             for _, row in batch.iterrows()
         ]
         vectorstore.add_documents(docs)
         vectorstore.persist()
 
-    return SimpleRagChain(vectorstore.as_retriever(search_kwargs={"k": 5}), df)
+    return SimpleRagChain(vectorstore.as_retriever(search_kwargs={"k": 5}), df, cube, regions)
 
 # ---------------- TOOLS ----------------
 def _tool1_impl(user_input: str) -> str:
@@ -154,7 +202,17 @@ def _tool1_impl(user_input: str) -> str:
     response = llm([HumanMessage(content=prompt)])
     return response.content.strip()
 
+def _years_in(text: str):
+    """((first_year, 1), (last_year, 12)) for the years mentioned in text, or None"""
+    years = [int(y) for y in re.findall(r"\b(?:19|20)\d{2}\b", text)]
+    return ((min(years), 1), (max(years), 12)) if years else None
+
 def _tool2_impl(city_name: str):
+    # Named seas and basins resolve to region masks instead of a single geocoded point
+    region = rag_chain.resolve_region(city_name)
+    if region:
+        return rag_chain.format_region_summary(region, _years_in(city_name))
+
     geolocator = Nominatim(user_agent="rag_location_app")
     location = geolocator.geocode(city_name)
     if not location:
@@ -187,6 +245,11 @@ def run_with_agent(user_input: str):
     if user_input.lower().strip() in greetings:
         return "[INFO] Hi there! How can I help you with SST or oceanographic data today?"
 
+    # Region-scoped questions are answered from the cube masks without an LLM round trip
+    region = rag_chain.resolve_region(user_input)
+    if region:
+        return rag_chain.format_region_summary(region, _years_in(user_input))
+
     try:
         return agent_executor.run(input=user_input)
     except Exception as e:
@@ -392,7 +455,8 @@ def delete_user(user_id: int):
         db.close()
 
 # ---------------- INITIALIZE VECTORSTORE ----------------
-rag_chain = build_vectorstore("RAG PIPELINE/dummy_ocean_data.parquet")
+rag_chain = build_vectorstore("RAG PIPELINE/dummy_ocean_data.parquet",
+                              cube_path="RAG PIPELINE/DataEngineering/Gold_Data/gold_cube")
 
 # ---------------- API ENDPOINT ----------------
 @app.route("/api/chat", methods=["POST"])
@@ -12,10 +12,18 @@ import folium
 from streamlit_folium import folium_static
 import requests
 import warnings
+import os
+import sys
 import pandas as pd
 from sqlalchemy import create_engine
 warnings.filterwarnings('ignore')
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataEngineering'))
+from pyramid import load_map_cells, collapse_months
+from config import PYRAMID_MAX_CELLS
+
+GOLD_LAYER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataEngineering', 'Gold_Data')
+
 # Page configuration
 st.set_page_config(
     page_title="Oceanography Data Analysis Dashboard",
@@ -144,7 +152,7 @@ def main():
         show_carbon_dynamics_tab(filtered_df)
     
     with tab4:
-        show_maps_tab(filtered_df)
+        show_maps_tab(filtered_df, selected_country)
     
     with tab5:
         show_correlations_tab(filtered_df)
@@ -411,53 +419,101 @@ def show_carbon_dynamics_tab(filtered_df):
         )
         st.plotly_chart(fig, use_container_width=True)
 
-def show_maps_tab(filtered_df):
+@st.cache_data
+def load_map_data(lat_range, lon_range, time_range, country='All'):
+    """Pre-aggregated map cells for the filters, or None if the pyramid cannot serve them
+
+    Pyramid cells carry no Country, so a country filter (like a missing
+    pyramid) falls back to the table rows.
+    """
+    pyramid_path = os.path.join(GOLD_LAYER_PATH, 'pyramid')
+    if country != 'All' or not os.path.exists(pyramid_path):
+        return None
+
+    cells, level = load_map_cells(pyramid_path, os.path.join(GOLD_LAYER_PATH, 'merged_gold'),
+                                  lat_range, lon_range, time_range, PYRAMID_MAX_CELLS)
+    variables = [col[:-len('_mean')] for col in cells.columns if col.endswith('_mean')]
+    cells = collapse_months(cells, variables)
+
+    # Plot the cell means under the plain variable names
+    cells = cells.rename(columns={f"{var}_mean": var for var in variables})
+    cells['level'] = level
+    return cells
+
+def show_maps_tab(filtered_df, selected_country='All'):
     """Maps tab with geospatial visualizations"""
     st.header("🗺️ Geospatial Analysis")
     
-    # SST heatmap
-    st.subheader("🌡️ Sea Surface Temperature Heatmap")
-    
-    # Create a sample for better visualization (too many points can be slow)
-    sample_df = filtered_df.sample(min(1000, len(filtered_df)))
+    if filtered_df.empty:
+        st.info("No data for the selected filters")
+        return
     
-    fig = px.density_mapbox(
-        sample_df,
-        lat='lat',
-        lon='lon',
-        z='sst',
-        radius=20,
-        center=dict(lat=0, lon=0),
-        zoom=1,
-        mapbox_style="carto-positron",
-        title="Sea Surface Temperature Distribution"
+    # Pre-aggregated pyramid cells cover the whole extent; the table rows are sampled as a fallback
+    sample_df = load_map_data(
+        (float(filtered_df['lat'].min()), float(filtered_df['lat'].max())),
+        (float(filtered_df['lon'].min()), float(filtered_df['lon'].max())),
+        ((int(filtered_df['year'].min()), 1), (int(filtered_df['year'].max()), 12)),
+        selected_country,
     )
+    if sample_df is None or sample_df.empty:
+        sample_df = filtered_df.sample(min(1000, len(filtered_df)))
+    else:
+        st.caption(f"Showing {len(sample_df)} aggregated cells (pyramid level: {sample_df['level'].iloc[0]})")
     
-    st.plotly_chart(fig, use_container_width=True)
+    # Either source may lack some of the variables
+    available = [param for param in ['sst', 'chlor_a', 'Kd_490', 'poc', 'pic', 'aot_862']
+                 if param in sample_df.columns and sample_df[param].notna().any()]
+    
+    # SST heatmap
+    st.subheader("🌡️ Sea Surface Temperature Heatmap")
+    
+    if 'sst' in available:
+        fig = px.density_mapbox(
+            sample_df,
+            lat='lat',
+            lon='lon',
+            z='sst',
+            radius=20,
+            center=dict(lat=0, lon=0),
+            zoom=1,
+            mapbox_style="carto-positron",
+            title="Sea Surface Temperature Distribution"
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No SST data for the selected filters")
     
     # Chlorophyll-a heatmap
     st.subheader("🌿 Chlorophyll-a Distribution")
     
-    fig = px.density_mapbox(
-        sample_df,
-        lat='lat',
-        lon='lon',
-        z='chlor_a',
-        radius=20,
-        center=dict(lat=0, lon=0),
-        zoom=1,
-        mapbox_style="carto-positron",
-        title="Chlorophyll-a Distribution"
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    if 'chlor_a' in available:
+        fig = px.density_mapbox(
+            sample_df,
+            lat='lat',
+            lon='lon',
+            z='chlor_a',
+            radius=20,
+            center=dict(lat=0, lon=0),
+            zoom=1,
+            mapbox_style="carto-positron",
+            title="Chlorophyll-a Distribution"
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No chlorophyll-a data for the selected filters")
     
     # Interactive map with multiple parameters
     st.subheader("🎯 Interactive Parameter Map")
     
+    if not available:
+        st.info("No parameters to map for the selected filters")
+        return
+    
     param_choice = st.selectbox(
         "Select parameter to visualize:",
-        ['sst', 'chlor_a', 'Kd_490', 'poc', 'pic', 'aot_862']
+        available
     )
     
     fig = px.scatter_mapbox(
@@ -466,7 +522,7 @@ def show_maps_tab(filtered_df):
         lon='lon',
         color=param_choice,
         size=param_choice,
-        hover_data=['Country', 'year', 'month'],
+        hover_data=[col for col in ['year', 'month', f"{param_choice}_count"] if col in sample_df.columns],
         zoom=1,
         mapbox_style="carto-positron",
         title=f"{param_choice.upper()} Distribution"
@@ -0,0 +1,192 @@
+# Argo Profile Store
+
+# Argo float measurements as contiguous columnar arrays with a profile offset index, memory-mapped from disk.
+import os
+import sys
+import json
+import shutil
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from gold_dataset import read_with_retry, _swap_directory
+
+from config import GOLD_LAYER, ARGO_MEASUREMENTS_CSV, ARGO_STORE_NAME, ARGO_VARIABLES
+
+ARGO_INDEX = 'index.json'
+SORT_ORDER = ['float_key', 'measurement_time', 'pressure']
+
+def build_argo_store(csv_path, store_path, variables=ARGO_VARIABLES):
+    """Build the Argo store from a measurements CSV (gold_fact_measurements layout)
+
+    Rows are sorted by (float_key, time, pressure) and each column is
+    saved as one .npy array, so every profile and every float's history
+    is a contiguous run of rows. A profile is the rows of one float at one
+    measurement_time; profile_offset (n_profiles + 1) holds where each one
+    starts and float_offset (n_floats + 1) the range of profiles of each
+    float. The store is written next to the old one and swapped in by
+    rename (see _swap_directory; ArgoStore retries over the swap).
+    """
+    if 'pressure' not in variables:
+        raise ValueError("The Argo variables must include pressure, the within-profile sort key")
+
+    df = pd.read_csv(csv_path, usecols=['measurement_key', 'float_key', 'measurement_time', 'lat', 'lon'] + variables)
+    if df.empty:
+        print(f"[WARN] No Argo measurements in {csv_path}, store not built")
+        return None
+
+    df['measurement_time'] = pd.to_datetime(df['measurement_time'], format='ISO8601')
+    df = df.sort_values(SORT_ORDER, kind='stable')
+
+    float_keys = df['float_key'].to_numpy(dtype=np.int64)
+    times = df['measurement_time'].to_numpy(dtype='datetime64[us]')
+    new_profile = np.ones(len(df), dtype=bool)
+    new_profile[1:] = (float_keys[1:] != float_keys[:-1]) | (times[1:] != times[:-1])
+    starts = np.flatnonzero(new_profile)
+
+    profile_float = float_keys[starts]
+    floats, float_starts = np.unique(profile_float, return_index=True)
+
+    arrays = {
+        'measurement_key': df['measurement_key'].to_numpy(dtype=np.int64),
+        'profile_offset': np.append(starts, len(df)).astype(np.int64),
+        'profile_float': profile_float,
+        'profile_time': times[starts],
+        # Position of a profile is that of its first level
+        'profile_lat': df['lat'].to_numpy(dtype=np.float64)[starts],
+        'profile_lon': df['lon'].to_numpy(dtype=np.float64)[starts],
+        'float_keys': floats,
+        'float_offset': np.append(float_starts, len(starts)).astype(np.int64),
+    }
+    for var in variables:
+        arrays[var] = df[var].to_numpy(dtype=np.float32)
+    del df
+
+    staging_path = store_path + '.staging'
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(staging_path, f"{name}.npy"), array)
+
+    index = {
+        'n_levels': int(len(arrays['measurement_key'])),
+        'n_profiles': int(len(starts)),
+        'n_floats': int(len(floats)),
+        'variables': variables,
+        'sort_order': SORT_ORDER,
+        'source': os.path.abspath(csv_path),
+    }
+    with open(os.path.join(staging_path, ARGO_INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+
+    _swap_directory(staging_path, store_path)
+
+    print(f"[INFO] Argo store built: {index['n_floats']} floats, {index['n_profiles']} profiles, "
+          f"{index['n_levels']} levels")
+    return store_path
+
+class ArgoStore:
+    """Read-only view of an Argo store; a profile or a float's history is one slice of each array"""
+
+    def __init__(self, store_path):
+        # The index and arrays are opened together, so a rebuild swapped in meanwhile is retried as a whole
+        read_with_retry(lambda: self._open(store_path))
+
+    def _open(self, store_path):
+        with open(os.path.join(store_path, ARGO_INDEX)) as f:
+            self.index = json.load(f)
+
+        self.variables = self.index['variables']
+        self.n_profiles = self.index['n_profiles']
+
+        def load(name, mmap_mode='r'):
+            return np.load(os.path.join(store_path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        self.measurement_key = load('measurement_key')
+        self.levels = {var: load(var) for var in self.variables}
+        # Profile and float indexes are small and searched on every lookup, so they are read in full
+        self.profile_offset = load('profile_offset', None)
+        self.profile_float = load('profile_float', None)
+        self.profile_time = load('profile_time', None)
+        self.profile_lat = load('profile_lat', None)
+        self.profile_lon = load('profile_lon', None)
+        self.float_keys = load('float_keys', None)
+        self.float_offset = load('float_offset', None)
+
+    def float_profiles(self, float_key):
+        """range of the profile positions of one float, or None for an unknown float"""
+        i = int(np.searchsorted(self.float_keys, float_key))
+        if i == len(self.float_keys) or self.float_keys[i] != float_key:
+            return None
+        return range(int(self.float_offset[i]), int(self.float_offset[i + 1]))
+
+    def find_profile(self, float_key, time):
+        """Position of the profile of float_key at time, or None"""
+        profiles = self.float_profiles(float_key)
+        if profiles is None:
+            return None
+
+        time = np.datetime64(pd.Timestamp(time), 'us')
+        i = profiles.start + int(np.searchsorted(self.profile_time[profiles.start:profiles.stop], time))
+        if i == profiles.stop or self.profile_time[i] != time:
+            return None
+        return i
+
+    def _levels(self, first, last):
+        """Rows of profiles first..last - 1 as a DataFrame in the CSV's columns"""
+        start, stop = int(self.profile_offset[first]), int(self.profile_offset[last])
+        counts = np.diff(self.profile_offset[first:last + 1])
+
+        df = pd.DataFrame({
+            'measurement_key': np.asarray(self.measurement_key[start:stop]),
+            'float_key': np.repeat(self.profile_float[first:last], counts),
+            'measurement_time': np.repeat(self.profile_time[first:last], counts),
+            'lat': np.repeat(self.profile_lat[first:last], counts),
+            'lon': np.repeat(self.profile_lon[first:last], counts),
+        })
+        for var in self.variables:
+            df[var] = np.asarray(self.levels[var][start:stop])
+        return df
+
+    def profile(self, i):
+        """Levels of the profile at position i, by increasing pressure"""
+        if not 0 <= i < self.n_profiles:
+            raise IndexError(f"Profile {i} out of range ({self.n_profiles} profiles)")
+        return self._levels(i, i + 1)
+
+    def float_history(self, float_key):
+        """Every level of one float, by time then pressure, or None for an unknown float"""
+        profiles = self.float_profiles(float_key)
+        if profiles is None:
+            return None
+        return self._levels(profiles.start, profiles.stop)
+
+    def profiles(self, float_key=None):
+        """Profile catalogue (one row per profile with its position and level count), optionally of one float"""
+        profiles = range(self.n_profiles) if float_key is None else self.float_profiles(float_key)
+        if profiles is None:
+            return None
+
+        first, last = profiles.start, profiles.stop
+        return pd.DataFrame({
+            'profile': np.arange(first, last),
+            'float_key': self.profile_float[first:last],
+            'measurement_time': self.profile_time[first:last],
+            'lat': self.profile_lat[first:last],
+            'lon': self.profile_lon[first:last],
+            'levels': np.diff(self.profile_offset[first:last + 1]),
+        })
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the columnar Argo profile store from the measurements CSV")
+    parser.add_argument("--source", default=ARGO_MEASUREMENTS_CSV, help="Argo measurements CSV")
+    parser.add_argument("--output", default=os.path.join(GOLD_LAYER, ARGO_STORE_NAME), help="Store directory")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    build_argo_store(args.source, args.output)
@@ -0,0 +1,139 @@
+# Backfill Runner
+
+# Rebuilds a range of months Bronze → Silver → Gold with one worker process per month.
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils_notebook import parse_month, month_range, build_input_path, list_netcdf_files
+from silver_layer_fixed import process_and_save_netcdf
+from gold_layer_fixed import merge_silver_to_gold, _build_gold_views
+from gold_dataset import load_partition_manifest
+from geo_enrichment import enrich_gold_dataset
+from platinum_loader import load_platinum
+
+from config import (SLIVER_CONFIG, BRONZE_LAYER, SILVER_LAYER, GOLD_LAYER, GRID_RESOLUTION, GOLD_PARTITIONED,
+                    GOLD_DATASET_NAME, GOLD_CUBE, GOLD_PYRAMID, GOLD_ENRICH, GOLD_REGION_INDEX)
+
+def process_month(year, month, incremental=False, resume=False):
+    """Bronze → Silver → Gold partitions for one month; returns the gold rows written
+
+    Month-level derivatives (enrichment, cube, pyramid) are left to
+    finalize_backfill so they are built once for the whole range. With
+    resume, Silver and gold continue from the month's checkpoints.
+    """
+    bronze_dirs = [build_input_path(BRONZE_LAYER, year, month, folder) for folder in SLIVER_CONFIG]
+    if not any(list_netcdf_files(path) for path in bronze_dirs):
+        print(f"[WARN] No Bronze granules for {year}-{month:02d}, skipping")
+        return 0
+
+    process_and_save_netcdf(BRONZE_LAYER, SLIVER_CONFIG, SILVER_LAYER, 'parquet',
+                            incremental=incremental, year=year, month=month, resume=resume)
+    merge_silver_to_gold(SILVER_LAYER, SLIVER_CONFIG, GOLD_LAYER, 'parquet', cube=False, pyramid=False,
+                         enrich=False, region_index=False, year=year, month=month, resume=resume)
+
+    partitions = load_partition_manifest(os.path.join(GOLD_LAYER, GOLD_DATASET_NAME)).get('partitions', {})
+    return sum(entry['rows'] for entry in partitions.values()
+               if (entry['year'], entry['month']) == (year, month))
+
+def _run_months(months, workers, incremental, resume=False):
+    """Run process_month over months, returning ({(year, month): rows}, {(year, month): error})"""
+    results, errors = {}, {}
+    pending = list(months)
+
+    if workers and workers > 1 and len(months) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(months))) as executor:
+                futures = {executor.submit(process_month, year, month, incremental, resume): (year, month)
+                           for year, month in months}
+                for future in as_completed(futures):
+                    year, month = futures[future]
+                    try:
+                        results[(year, month)] = future.result()
+                        print(f"[INFO] Backfilled {year}-{month:02d}: {results[(year, month)]} gold rows")
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        errors[(year, month)] = str(e)
+                        print(f"[ERROR] Backfill of {year}-{month:02d} failed: {str(e)}")
+            pending = []
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            print(f"[WARN] Process pool unavailable ({str(e)}), falling back to serial processing")
+            pending = [key for key in months if key not in results and key not in errors]
+
+    for year, month in pending:
+        try:
+            results[(year, month)] = process_month(year, month, incremental, resume)
+        except Exception as e:
+            errors[(year, month)] = str(e)
+            print(f"[ERROR] Backfill of {year}-{month:02d} failed: {str(e)}")
+
+    return results, errors
+
+def finalize_backfill(platinum=False, months=None):
+    """Enrich new gold partitions and update the cube, region index and pyramid once
+
+    months lists the (year, month) pairs that were rewritten (None
+    rebuilds the derivatives over the whole dataset).
+    """
+    dataset_path = os.path.join(GOLD_LAYER, GOLD_DATASET_NAME)
+
+    if GOLD_ENRICH:
+        enrich_gold_dataset(dataset_path)
+    _build_gold_views(dataset_path, GOLD_LAYER, SLIVER_CONFIG, GRID_RESOLUTION, GOLD_CUBE, GOLD_PYRAMID,
+                      GOLD_REGION_INDEX, months)
+    if platinum:
+        load_platinum(dataset_path)
+
+def run_backfill(start, end, workers=4, incremental=False, platinum=False, resume=False):
+    """Rebuild every month from start to end ((year, month) tuples, inclusive)
+
+    Months run concurrently in a process pool; each writes only its own
+    Silver folders and year=/month= gold partitions, and the gold partition
+    manifest is updated under a lock. Rows get the day of their granule's
+    observation time. Failed months are reported and left out of the
+    derivatives; the rest of the range still completes. With resume an
+    interrupted backfill skips the files, buckets and months it finished.
+    """
+    if not GOLD_PARTITIONED:
+        raise ValueError("Backfill needs the partitioned gold dataset (GOLD_PARTITIONED = True)")
+
+    months = month_range(start, end)
+    if not months:
+        raise ValueError(f"Empty month range: {start} to {end}")
+    print(f"[INFO] Backfilling {len(months)} months with {workers} workers")
+
+    results, errors = _run_months(months, workers, incremental, resume)
+
+    if any(results.values()):
+        finalize_backfill(platinum, sorted(results))
+
+    print("=" * 50)
+    for key in months:
+        status = f"failed: {errors[key]}" if key in errors else f"{results.get(key, 0)} gold rows"
+        print(f"{key[0]}-{key[1]:02d}  {status}")
+
+    return {'months': {f"{y}-{m:02d}": rows for (y, m), rows in sorted(results.items())},
+            'failed': {f"{y}-{m:02d}": error for (y, m), error in sorted(errors.items())}}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill a range of months Bronze → Silver → Gold in parallel")
+    parser.add_argument("start", help="First month, YYYY-MM")
+    parser.add_argument("end", help="Last month, YYYY-MM (inclusive)")
+    parser.add_argument("--workers", type=int, default=4, help="Months processed concurrently")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only extract new or changed granules, tracked by the Silver manifests")
+    parser.add_argument("--platinum", action="store_true", help="Load the gold dataset into Postgres after the backfill")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted backfill from its last checkpoints")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_backfill(parse_month(args.start), parse_month(args.end), args.workers,
+                          args.incremental, platinum=args.platinum, resume=args.resume)
+    if report['failed']:
+        sys.exit(1)
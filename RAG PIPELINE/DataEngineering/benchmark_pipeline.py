@@ -0,0 +1,168 @@
+# ETL Benchmark
+
+# Throughput and peak memory of extraction, gold merge and platinum loads on a synthetic Bronze tree.
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils_notebook import (get_current_date_parts, build_input_path, build_output_path, process_internal_folder,
+                            save_internal_folder)
+from gold_layer_fixed import merge_silver_to_gold
+from platinum_loader import SQLiteBackend, PostgresBackend, load_table, upsert_gold_dataset
+from pipeline_dag import path_stats, reset_peak_rss, peak_rss_bytes
+from synthetic_bronze import generate_bronze_tree
+
+from config import SLIVER_CONFIG, GOLD_DATASET_NAME, NETCDF_CHUNK_SIZE, RECORD_BATCH_SIZE, REGION_OF_INTEREST, RUN_REPORT_DIR
+
+def measure(name, func, bytes_in):
+    """Run func() and return its timing entry; func returns the number of rows it produced"""
+    rss_reset = reset_peak_rss()
+    t0 = time.perf_counter()
+    rows = func()
+    seconds = time.perf_counter() - t0
+
+    entry = {
+        'name': name,
+        'seconds': round(seconds, 3),
+        'rows': int(rows),
+        'mb_in': round(bytes_in / 2**20, 2),
+        'rows_per_s': round(rows / seconds) if seconds else None,
+        'mb_per_s': round(bytes_in / 2**20 / seconds, 2) if seconds else None,
+        'peak_rss_mb': round(peak_rss_bytes() / 2**20, 1),
+        'peak_rss_scope': 'stage' if rss_reset else 'process',
+    }
+    print(f"[INFO] {name}: {entry['rows']} rows in {seconds:.2f}s "
+          f"({entry['rows_per_s']} rows/s, {entry['mb_per_s']} MB/s), peak RSS {entry['peak_rss_mb']} MB")
+    return entry
+
+def extract_folders(bronze_layer, config, date_parts, chunk_size, batch_size, regions, packed=()):
+    """Bronze → DataFrame with process_internal_folder, one variable at a time; returns rows extracted"""
+    rows = 0
+    for folder_name, variable in config.items():
+        input_path = build_input_path(bronze_layer, date_parts['year'], date_parts['month'], folder_name)
+        rows += len(process_internal_folder(input_path, variable, date_parts, folder_name, chunk_size,
+                                            batch_size, regions, packed))
+    return rows
+
+def extract_to_silver(bronze_layer, silver_layer, config, date_parts, chunk_size, batch_size, regions, packed=()):
+    """Bronze → Silver with save_internal_folder, one variable at a time; returns rows written"""
+    rows = 0
+    for folder_name, variable in config.items():
+        input_path = build_input_path(bronze_layer, date_parts['year'], date_parts['month'], folder_name)
+        output_path = build_output_path(silver_layer, date_parts['year'], date_parts['month'], folder_name)
+        rows += save_internal_folder(input_path, variable, date_parts, output_path, folder_name, chunk_size,
+                                     batch_size, regions, packed)
+    return rows
+
+def merge_to_gold(silver_layer, config, gold_layer):
+    """Silver → Gold dataset only (no cube, pyramid or enrichment); returns gold rows"""
+    merge_silver_to_gold(silver_layer, config, gold_layer, 'parquet', cube=False, pyramid=False,
+                         enrich=False, region_index=False)
+    return path_stats([os.path.join(gold_layer, GOLD_DATASET_NAME)])[2] or 0
+
+def run_benchmark(work_dir, granules=4, ny=700, nx=900, fill_ratio=0.3, two_d=False, config=SLIVER_CONFIG,
+                  chunk_size=NETCDF_CHUNK_SIZE, batch_size=RECORD_BATCH_SIZE, regions=REGION_OF_INTEREST,
+                  postgres=False, seed=0, packed=False):
+    """Generate a Bronze tree in work_dir and time every layer against it
+
+    Stages: extract (Bronze → DataFrame with process_internal_folder),
+    silver (Bronze streamed into the Silver files), gold (grid merge and partitioned
+    dataset, without cube/pyramid/enrichment) and the replace and upsert
+    platinum loads. Loads go to a SQLite file in work_dir unless postgres
+    is set. With packed the granules are int16 scaled and every variable
+    stays packed through Silver. Returns the report dict.
+    """
+    year, month, day = get_current_date_parts()
+    date_parts = {'year': year, 'month': month, 'day': day}
+    bronze_layer = os.path.join(work_dir, 'Bronze_Data')
+    silver_layer = os.path.join(work_dir, 'Silver_Data')
+    gold_layer = os.path.join(work_dir, 'Gold_Data')
+    dataset_path = os.path.join(gold_layer, GOLD_DATASET_NAME)
+
+    for path in (bronze_layer, silver_layer, gold_layer):
+        shutil.rmtree(path, ignore_errors=True)
+    generate_bronze_tree(bronze_layer, year, month, config, granules, ny, nx, fill_ratio, two_d, seed=seed, packed=packed)
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'params': {'granules': granules, 'ny': ny, 'nx': nx, 'fill_ratio': fill_ratio, 'two_d': two_d,
+                   'variables': list(config.values()), 'chunk_size': chunk_size, 'batch_size': batch_size,
+                   'packed': packed, 'backend': 'postgres' if postgres else 'sqlite'},
+        'stages': [],
+    }
+
+    _, bronze_bytes, _ = path_stats([bronze_layer])
+    packed_variables = list(config.values()) if packed else ()
+    report['stages'].append(measure('extract', lambda: extract_folders(
+        bronze_layer, config, date_parts, chunk_size, batch_size, regions, packed_variables), bronze_bytes))
+    report['stages'].append(measure('silver', lambda: extract_to_silver(
+        bronze_layer, silver_layer, config, date_parts, chunk_size, batch_size, regions, packed_variables),
+        bronze_bytes))
+
+    _, silver_bytes, _ = path_stats([silver_layer])
+    report['stages'].append(measure('gold', lambda: merge_to_gold(silver_layer, config, gold_layer), silver_bytes))
+
+    _, gold_bytes, gold_rows = path_stats([dataset_path])
+    backend = PostgresBackend() if postgres else SQLiteBackend(os.path.join(work_dir, 'platinum.db'))
+    try:
+        report['stages'].append(measure('load_replace', lambda: load_table(dataset_path, 'benchmark_gold', backend),
+                                        gold_bytes))
+        report['stages'].append(measure('load_upsert', lambda: upsert_gold_dataset(
+            dataset_path, 'benchmark_gold_upsert', backend)['rows_written'], gold_bytes))
+    finally:
+        backend.close()
+
+    report['gold_rows'] = gold_rows
+    return report
+
+def print_report(report):
+    print("=" * 78)
+    print(f"{'stage':<14} {'rows':>12} {'seconds':>9} {'rows/s':>12} {'MB/s':>9} {'peak RSS MB':>12}")
+    for entry in report['stages']:
+        print(f"{entry['name']:<14} {entry['rows']:>12} {entry['seconds']:>9.2f} {entry['rows_per_s'] or 0:>12} "
+              f"{entry['mb_per_s'] or 0:>9.2f} {entry['peak_rss_mb']:>12.1f}")
+    print("=" * 78)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL layers on a synthetic Bronze tree")
+    parser.add_argument("--work-dir", help="Directory for the synthetic layers (default: a temporary directory)")
+    parser.add_argument("--granules", type=int, default=4, help="Granules per variable folder")
+    parser.add_argument("--ny", type=int, default=700, help="Grid rows")
+    parser.add_argument("--nx", type=int, default=900, help="Grid columns")
+    parser.add_argument("--fill-ratio", type=float, default=0.3, help="Fraction of missing (fill) pixels")
+    parser.add_argument("--two-d", action="store_true", help="Use 2-D lat/lon coordinate arrays")
+    parser.add_argument("--packed", action="store_true", help="Use int16 scaled granules kept packed through Silver")
+    parser.add_argument("--postgres", action="store_true", help="Load into the configured Postgres instead of SQLite")
+    parser.add_argument("--report-dir", default=RUN_REPORT_DIR, help="Where the JSON report is written")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='etl-benchmark-')
+
+    report = None
+    try:
+        report = run_benchmark(work_dir, args.granules, args.ny, args.nx, args.fill_ratio, args.two_d,
+                               postgres=args.postgres, seed=args.seed, packed=args.packed)
+    except Exception as e:
+        print(f"[ERROR] Benchmark failed: {str(e)}")
+        raise
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Only a finished benchmark is reported
+    if report is not None:
+        print_report(report)
+        os.makedirs(args.report_dir, exist_ok=True)
+        report_path = os.path.join(args.report_dir, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Benchmark report written to {report_path}")
@@ -0,0 +1,73 @@
+# Checkpoints
+
+# Append-only journals of finished work units, so an interrupted month resumes where it stopped.
+import os
+import json
+import hashlib
+from datetime import datetime
+
+CHECKPOINT_FILE = '.checkpoint.jsonl'
+
+def fingerprint(path=None, **params):
+    """Fingerprint of an input file (path, size, mtime) and the params its output depends on"""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode())
+    if path is not None:
+        stat = os.stat(path)
+        digest.update(f"|{path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def _load_records(path):
+    """{key: last record} of a journal; a line torn by a crash mid-write is ignored"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['key']] = record
+    return records
+
+class Checkpoint:
+    """Journal of the completed work units of one run, one JSON line per unit
+
+    A record is flushed and fsynced before its unit counts as done, so
+    after a crash or preemption the journal holds exactly the committed
+    units. With resume the existing records are loaded; otherwise the
+    journal starts empty. A record only matches while its fingerprint (the
+    unit's inputs and params) is unchanged.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.records = {}
+
+        if resume:
+            self.records = _load_records(path)
+            if self.records:
+                print(f"[INFO] Resuming from {len(self.records)} checkpoints in {path}")
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def get(self, key, fingerprint):
+        """The committed record of a unit, or None if it has to (re)run"""
+        record = self.records.get(key)
+        if record is None or record.get('fingerprint') != fingerprint:
+            return None
+        return record
+
+    def record(self, key, fingerprint, **fields):
+        """Commit a finished unit"""
+        record = dict(fields, key=key, fingerprint=fingerprint, at=datetime.now().isoformat(timespec='seconds'))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.records[key] = record
+        return record
@@ -0,0 +1,276 @@
+# Compaction
+
+# Merges small silver fragments and gold part files into right-sized files with sorted row groups.
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils_notebook import parse_month, build_input_path, read_parquet_file, write_parquet, ParquetBatchWriter
+from manifest import FRAGMENTS_DIR, load_manifest, save_manifest, fragment_name, silver_manifest_lock
+from gold_dataset import (load_partition_manifest, save_partition_manifest, manifest_lock, write_partition,
+                          _file_sha256, _swap_directory)
+
+from config import (SLIVER_CONFIG, SILVER_LAYER, GOLD_LAYER, GOLD_DATASET_NAME, SILVER_ROW_GROUP_SIZE,
+                    GOLD_ROW_GROUP_SIZE, COMPACTION_SMALL_BYTES, COMPACTION_TARGET_BYTES)
+
+COMPACT_PREFIX = 'compact-'
+# Manifest a silver compaction is about to commit, kept until it is saved (see recover_silver_compaction)
+COMPACT_JOURNAL = '.compact-journal.json'
+
+def plan_compaction(sizes, small_bytes=COMPACTION_SMALL_BYTES, target_bytes=COMPACTION_TARGET_BYTES):
+    """Groups of small files to merge, from {file name: bytes}
+
+    Files under small_bytes are packed in name order into groups of about
+    target_bytes; a group of a single file is left alone.
+    """
+    groups, group, group_bytes = [], [], 0
+    for name in sorted(sizes):
+        if sizes[name] >= small_bytes:
+            continue
+        group.append(name)
+        group_bytes += sizes[name]
+        if group_bytes >= target_bytes:
+            groups.append(group)
+            group, group_bytes = [], 0
+    groups.append(group)
+    return [group for group in groups if len(group) > 1]
+
+def _compacted_name(names):
+    """Deterministic name of the file replacing a group, distinct from the names it replaces"""
+    digest = hashlib.sha256('\n'.join(names).encode()).hexdigest()
+    return f"{COMPACT_PREFIX}{digest[:12]}.parquet"
+
+def _link_or_copy(source, target):
+    """Hard-link an untouched file into a staging directory (copy where links are unsupported)"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def _silver_staging_dir(output_path):
+    return os.path.join(output_path, f".{FRAGMENTS_DIR}-compact")
+
+def recover_silver_compaction(output_path):
+    """Finish a silver compaction interrupted after its journal was written, or drop a partial one
+
+    With a journal the staged fragments are complete: they are swapped in
+    (unless that already happened) and the journaled manifest saved.
+    Without one, a staging directory is an unfinished compaction and is
+    removed. Call under silver_manifest_lock.
+    """
+    staging_dir = _silver_staging_dir(output_path)
+    journal_path = os.path.join(output_path, COMPACT_JOURNAL)
+
+    if os.path.exists(journal_path):
+        with open(journal_path) as f:
+            manifest = json.load(f)
+        if os.path.isdir(staging_dir):
+            _swap_directory(staging_dir, os.path.join(output_path, FRAGMENTS_DIR))
+        save_manifest(output_path, manifest)
+        os.remove(journal_path)
+        print(f"[INFO] Finished an interrupted compaction of {output_path}")
+    else:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    shutil.rmtree(staging_dir + '.old', ignore_errors=True)
+
+def compact_silver_folder(output_path, small_bytes=COMPACTION_SMALL_BYTES, target_bytes=COMPACTION_TARGET_BYTES,
+                          row_group_size=SILVER_ROW_GROUP_SIZE):
+    """Merge the small incremental fragments of one variable folder; returns the fragments merged
+
+    Each granule stays one contiguous, lat/lon sorted run of rows in the
+    compacted file, and its manifest entry points there with a row
+    offset, so a granule that changes later can still be cut out (see
+    split_fragment). The new fragments directory is staged with hard links
+    for untouched files. The new manifest is then journaled, the directory
+    swapped in with renames and the manifest saved, so a crash anywhere
+    leaves either the old state or one recover_silver_compaction completes.
+    The folder is locked against incremental extraction throughout.
+    """
+    if not os.path.isdir(output_path):
+        return 0
+
+    with silver_manifest_lock(output_path):
+        recover_silver_compaction(output_path)
+        return _compact_silver_folder(output_path, small_bytes, target_bytes, row_group_size)
+
+def _compact_silver_folder(output_path, small_bytes, target_bytes, row_group_size):
+    fragments_path = os.path.join(output_path, FRAGMENTS_DIR)
+    if not os.path.isdir(fragments_path):
+        return 0
+
+    manifest = load_manifest(output_path)
+    by_fragment = {}
+    for entry in manifest.get('files', {}).values():
+        if entry.get('fragment'):
+            by_fragment.setdefault(os.path.basename(entry['fragment']), []).append(entry)
+
+    on_disk = {name for name in os.listdir(fragments_path) if name.endswith('.parquet') and not name.startswith('.')}
+    for name in sorted(on_disk - set(by_fragment)):
+        print(f"[WARN] Fragment {name} in {fragments_path} is not in the manifest, leaving it as is")
+
+    sizes = {name: os.path.getsize(os.path.join(fragments_path, name)) for name in by_fragment if name in on_disk}
+    groups = plan_compaction(sizes, small_bytes, target_bytes)
+    if not groups:
+        return 0
+
+    staging_dir = _silver_staging_dir(output_path)
+    os.makedirs(staging_dir)
+    merged = {name for group in groups for name in group}
+    for name in on_disk - merged:
+        _link_or_copy(os.path.join(fragments_path, name), os.path.join(staging_dir, name))
+
+    offsets = []
+    try:
+        for group in groups:
+            name = _compacted_name(group)
+            writer = ParquetBatchWriter(os.path.join(staging_dir, name), row_group_size)
+            offset = 0
+            try:
+                for fragment in group:
+                    df = read_parquet_file(os.path.join(fragments_path, fragment))
+                    for entry in sorted(by_fragment[fragment], key=lambda entry: entry.get('offset', 0)):
+                        start = entry.get('offset', 0)
+                        writer.write(df.iloc[start:start + entry['rows']].sort_values(['lat', 'lon'], kind='stable'))
+                        offsets.append((entry, f"{FRAGMENTS_DIR}/{name}", offset))
+                        offset += entry['rows']
+                    del df
+            except BaseException:
+                writer.abort()
+                raise
+            writer.close()
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    for entry, fragment, offset in offsets:
+        entry['fragment'], entry['offset'] = fragment, offset
+
+    journal_path = os.path.join(output_path, COMPACT_JOURNAL)
+    with open(journal_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(journal_path + '.tmp', journal_path)
+
+    _swap_directory(staging_dir, fragments_path)
+    save_manifest(output_path, manifest)
+    os.remove(journal_path)
+    print(f"[INFO] Compacted {len(merged)} fragments into {len(groups)} files in {fragments_path}")
+    return len(merged)
+
+def split_fragment(output_path, fragment, entries):
+    """Write each granule of a compacted fragment back to its own fragment
+
+    Used before another granule of the file is replaced or removed.
+    entries are the manifest entries stored in it, updated in place; the
+    caller saves the manifest and then deletes the compacted file.
+    """
+    df = read_parquet_file(os.path.join(output_path, fragment))
+    for entry in entries:
+        start = entry.pop('offset', 0)
+        entry['fragment'] = fragment_name(entry['path'], entry['sha256'], entry.get('params'))
+        write_parquet(df.iloc[start:start + entry['rows']], os.path.join(output_path, entry['fragment']))
+
+def compact_gold_partitions(dataset_path, keys=None, small_bytes=COMPACTION_SMALL_BYTES,
+                            target_bytes=COMPACTION_TARGET_BYTES, row_group_size=GOLD_ROW_GROUP_SIZE):
+    """Merge the small part files of gold partitions; returns the number of partitions compacted
+
+    keys selects partitions (all when None). Each group is sorted by
+    lat/lon and written as one file, so its row-group statistics prune
+    like a freshly written partition. The partition is staged beside the
+    original with hard links for untouched files and swapped in with
+    renames; its manifest entry is refreshed under manifest_lock, keeping
+    fields such as the enrichment fingerprint. Partitions whose files do
+    not match their manifest entry are skipped.
+    """
+    partitions = load_partition_manifest(dataset_path).get('partitions', {})
+    compacted = 0
+
+    for key in sorted(partitions if keys is None else keys):
+        partition_path = os.path.join(dataset_path, key)
+        files = sorted(partitions[key]['files'])
+        on_disk = sorted(name for name in os.listdir(partition_path)
+                         if name.endswith('.parquet') and not name.startswith('.')) if os.path.isdir(partition_path) else []
+        if on_disk != files:
+            print(f"[WARN] Skipping {key}: its files do not match the partition manifest")
+            continue
+
+        groups = plan_compaction({name: os.path.getsize(os.path.join(partition_path, name)) for name in files},
+                                 small_bytes, target_bytes)
+        if not groups:
+            continue
+
+        staging_dir = os.path.join(os.path.dirname(partition_path), f".compact-{os.path.basename(partition_path)}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        merged = {name for group in groups for name in group}
+        for name in set(files) - merged:
+            _link_or_copy(os.path.join(partition_path, name), os.path.join(staging_dir, name))
+
+        try:
+            for group in groups:
+                table = pa.concat_tables([pq.read_table(os.path.join(partition_path, name)) for name in group])
+                write_partition(table.sort_by([('lat', 'ascending'), ('lon', 'ascending')]), staging_dir,
+                                _compacted_name(group), row_group_size)
+                del table
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        new_files = sorted(os.listdir(staging_dir))
+        checksums = [_file_sha256(os.path.join(staging_dir, name)) for name in new_files]
+
+        # Re-read under the lock: other processes may have saved other months meanwhile
+        with manifest_lock(dataset_path):
+            _swap_directory(staging_dir, partition_path)
+            manifest = load_partition_manifest(dataset_path)
+            entry = manifest['partitions'][key]
+            entry['files'] = new_files
+            entry['bytes'] = sum(os.path.getsize(os.path.join(partition_path, name)) for name in new_files)
+            entry['sha256'] = checksums[0] if len(checksums) == 1 else hashlib.sha256(
+                ''.join(checksums).encode()).hexdigest()
+            save_partition_manifest(dataset_path, manifest)
+
+        print(f"[INFO] Compacted {len(merged)} files of {key} into {len(groups)}")
+        compacted += 1
+
+    return compacted
+
+def run_compaction(year=None, month=None, silver=True, gold=True):
+    """Compact the silver fragments and gold partitions of one month, or of every month"""
+    if silver:
+        if year is not None:
+            months = [(str(year), str(month).zfill(2))]
+        else:
+            months = [(y, m) for y in sorted(os.listdir(SILVER_LAYER)) if y.isdigit()
+                      for m in sorted(os.listdir(os.path.join(SILVER_LAYER, y))) if m.isdigit()] \
+                if os.path.isdir(SILVER_LAYER) else []
+        for y, m in months:
+            for folder_name in SLIVER_CONFIG:
+                compact_silver_folder(build_input_path(SILVER_LAYER, y, m, folder_name))
+
+    if gold:
+        dataset_path = os.path.join(GOLD_LAYER, GOLD_DATASET_NAME)
+        keys = None
+        if year is not None:
+            prefix = f"year={int(year)}/month={int(month)}/"
+            keys = [key for key in load_partition_manifest(dataset_path).get('partitions', {})
+                    if key.startswith(prefix)]
+        compact_gold_partitions(dataset_path, keys)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge small silver fragments and gold part files")
+    parser.add_argument("--month", help="Month to compact as YYYY-MM (default: every month)")
+    parser.add_argument("--silver-only", action="store_true", help="Only compact silver fragments")
+    parser.add_argument("--gold-only", action="store_true", help="Only compact gold partitions")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    year, month = parse_month(args.month) if args.month else (None, None)
+    run_compaction(year, month, silver=not args.gold_only, gold=not args.silver_only)
@@ -12,13 +12,139 @@ SLIVER_CONFIG = {
     'Kd490': 'Kd_490'
 }
 
+# Storage dtype of every column written or read by the pipeline layers
+COLUMN_SCHEMA = {
+    'cell_id': 'int64',
+    'lat': 'float32',
+    'lon': 'float32',
+    'year': 'int16',
+    'month': 'int16',
+    'day': 'int16',
+    'sst': 'float32',
+    'poc': 'float32',
+    'pic': 'float32',
+    'aot_862': 'float32',
+    'chlor_a': 'float32',
+    'Kd_490': 'float32',
+    'Country': 'category',
+    'EEZ': 'category',
+    'ocean_basin': 'category',
+}
+
 BRONZE_LAYER = os.path.join(PROJECT_ROOT, 'Bronze_Data')
 SILVER_LAYER = os.path.join(PROJECT_ROOT, 'Silver_Data')
 GOLD_LAYER = os.path.join(PROJECT_ROOT, 'Gold_Data')
 
+# Streaming NetCDF extraction: grid cells read per slice, rows per record batch
+NETCDF_CHUNK_SIZE = 1_000_000
+RECORD_BATCH_SIZE = 500_000
+
+# Open each granule once and extract every configured variable it holds in the same
+# pass, routing each variable to its own Silver folder (False: one pass per variable)
+SILVER_MULTI_VARIABLE = True
+
+# Variables stored in Bronze as scaled integers (scale_factor/add_offset) that stay
+# packed through Silver and are decoded only when gold aggregates them, e.g.
+# ['chlor_a', 'Kd_490']; variables that are not packed in a granule are unaffected
+SILVER_PACKED_VARIABLES = []
+
+# Record a checkpoint after every (variable, file) Silver part and every gold spill
+# bucket so an interrupted month can continue with --resume; Silver then writes
+# per-file parts that are merged per variable, even in serial runs
+PIPELINE_CHECKPOINTS = True
+
+# Silver parquet files are streamed batch by batch: rows per row group and codec
+SILVER_ROW_GROUP_SIZE = 500_000
+SILVER_COMPRESSION = 'zstd'
+
+# Optional region of interest for Bronze → Silver: one (lat_min, lat_max, lon_min, lon_max)
+# bbox or a list of them, e.g. [(-40.0, 30.0, 30.0, 120.0)] for the Indian Ocean. Only the
+# covering hyperslabs are read. Longitudes may be -180-180 or 0-360; lon_min > lon_max crosses
+# the antimeridian. None (the default) reads the whole globe.
+REGION_OF_INTEREST = None
+
+# Gold join grid: coordinates are quantized to cells of this size (degrees)
+GRID_RESOLUTION = 0.01
+
+# Partitioned gold output (year/month/lat_band Hive layout)
+GOLD_PARTITIONED = True
+GOLD_DATASET_NAME = 'merged_gold'
+GOLD_LAT_BAND_SIZE = 10
+GOLD_ROW_GROUP_SIZE = 100_000
+
+# Memory budget of the gold join (bytes). A month whose silver data would not fit
+# is hash-partitioned by grid cell into spill buckets on disk and joined bucket by
+# bucket, with the bucket count chosen from this budget; None always joins in memory
+GOLD_MEMORY_BUDGET = 4 * 2**30
+
+# Compaction (compaction.py): silver fragments and gold part files smaller than
+# COMPACTION_SMALL_BYTES are merged into files of about COMPACTION_TARGET_BYTES
+COMPACTION_SMALL_BYTES = 16 * 2**20
+COMPACTION_TARGET_BYTES = 128 * 2**20
+
+# Sharded runs (--shard i/N): seconds a shard's gold step waits for every shard's
+# Silver output to land before giving up
+SHARD_WAIT_TIMEOUT = 6 * 3600
+
+# Gold cube: dense float32 (time, lat, lon) arrays per variable for O(1) lookups
+GOLD_CUBE = True
+GOLD_CUBE_NAME = 'gold_cube'
+# Skip the cube when its grid would hold more than this many cells per gold row
+# (data too sparse or irregular for a dense array)
+GOLD_CUBE_MAX_CELLS_PER_ROW = 10
+
+# Aggregation pyramid: level name -> cell size in degrees (None = native gold cells)
+GOLD_PYRAMID = True
+GOLD_PYRAMID_NAME = 'pyramid'
+PYRAMID_LEVELS = {'native': None, '0.25': 0.25, '1': 1.0, '5': 5.0}
+PYRAMID_MAX_CELLS = 5000
+
+# Offline reverse geocoding: boundary layers rasterized at ENRICHMENT_RESOLUTION degrees.
+# Only ocean_basins.geojson is bundled, so gold rows get ocean_basin out of the box. Its
+# polygons are coarse open-ocean outlines kept clear of the coasts: land, enclosed and
+# marginal seas (Mediterranean, Baltic, South China Sea, ...) and coastal strips get null.
+# EEZ and Country are opt-in: place an EEZ GeoJSON (e.g. Marine Regions World EEZ,
+# which also supplies the sovereign country of each zone) in BOUNDARY_DIR and add
+# EEZ_LAYERS to ENRICHMENT_LAYERS.
+GOLD_ENRICH = True
+BOUNDARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'boundaries')
+ENRICHMENT_RESOLUTION = 0.05
+EEZ_LAYERS = [
+    {'column': 'EEZ', 'path': os.path.join(BOUNDARY_DIR, 'eez.geojson'), 'property': 'GEONAME'},
+    {'column': 'Country', 'path': os.path.join(BOUNDARY_DIR, 'eez.geojson'), 'property': 'SOVEREIGN1'},
+]
+ENRICHMENT_LAYERS = [
+    {'column': 'ocean_basin', 'path': os.path.join(BOUNDARY_DIR, 'ocean_basins.geojson'), 'property': 'name'},
+]
+
+# Named seas and basins rasterized onto the gold cube for region-scoped aggregates
+GOLD_REGION_INDEX = True
+MARINE_REGION_FILES = [
+    os.path.join(BOUNDARY_DIR, 'marine_regions.geojson'),
+    os.path.join(BOUNDARY_DIR, 'ocean_basins.geojson'),
+]
+
+# Argo float profiles: the measurements CSV is stored under GOLD_LAYER as contiguous
+# columnar arrays sorted by (float_key, time, pressure) with a profile offset index
+ARGO_MEASUREMENTS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Others',
+                                     'gold_fact_measurements.csv')
+ARGO_STORE_NAME = 'argo_profiles'
+ARGO_VARIABLES = ['pressure', 'temperature', 'salinity']
+
+# Pipeline DAG: per-stage input fingerprints and JSON run reports
+PIPELINE_STATE = os.path.join(PROJECT_ROOT, '_pipeline_state.json')
+RUN_REPORT_DIR = os.path.join(PROJECT_ROOT, 'run_reports')
+
 POSTGRES_USER = "postgres"
 POSTGRES_PASSWORD = "sama1234"
 POSTGRES_HOST = "localhost"
 POSTGRES_PORT = "5432"
 POSTGRES_DB = "SIH"
 TABLE_NAME = "agro_kpi"
+
+# Platinum load: rows per COPY batch and indexes built on the staging table
+PLATINUM_BATCH_SIZE = 200_000
+PLATINUM_INDEXES = [['year', 'month'], ['lat', 'lon'], ['cell_id']]
+# 'replace' swaps in a full copy; 'upsert' merges only gold partitions that changed
+PLATINUM_LOAD_MODE = 'upsert'
+PLATINUM_KEY = ['cell_id', 'year', 'month']
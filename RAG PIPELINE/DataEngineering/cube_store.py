@@ -0,0 +1,360 @@
+# Gold Cube Store
+
+# Dense (time, lat, lon) float32 arrays per variable on the native gold grid, memory-mapped from disk.
+import os
+import json
+import shutil
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from gold_dataset import load_partition_manifest, read_with_retry, _swap_directory
+
+from config import GOLD_CUBE_MAX_CELLS_PER_ROW
+
+CUBE_INDEX = 'index.json'
+# Month arrays a reader keeps memory-mapped at once
+CUBE_OPEN_MONTHS = 64
+EARTH_RADIUS_KM = 6371.0088
+
+def _periods(year, month):
+    return np.asarray(year, dtype=np.int64) * 12 + (np.asarray(month, dtype=np.int64) - 1)
+
+def _month_name(period):
+    return f"{int(period // 12)}-{int(period % 12 + 1):02d}"
+
+def _month_path(cube_path, variable, period):
+    return os.path.join(cube_path, variable, f"{_month_name(period)}.npy")
+
+def _month_filter(period):
+    return (ds.field('year') == int(period // 12)) & (ds.field('month') == int(period % 12 + 1))
+
+def native_axis(values, resolution):
+    """(origin, spacing, length) of the regular axis the unique coordinate values lie on
+
+    Gold coordinates are native pixel centres rounded to the join
+    resolution, so a 1/24 degree grid shows up as steps of 0.04 and 0.05.
+    Positions are counted in the typical step between neighbouring values
+    and the origin and spacing fitted to them by least squares; the fit
+    is kept if every value lies within one join cell of its position.
+    Otherwise the axis falls back to the coarsest multiple of the join
+    resolution that holds every value.
+    """
+    values = np.unique(np.asarray(values, dtype=np.float64))
+    if len(values) == 1:
+        return float(values[0]), float(resolution), 1
+
+    steps = np.diff(values)
+    step = steps[steps < 1.5 * np.median(steps)].mean()
+    positions = np.rint((values - values[0]) / step)
+    if len(np.unique(positions)) == len(values):
+        spacing, origin = np.polyfit(positions, values, 1)
+        if np.abs(values - origin - positions * spacing).max() <= resolution:
+            return float(origin), float(spacing), int(positions[-1]) + 1
+
+    cells = np.rint((values - values[0]) / resolution).astype(np.int64)
+    cell_step = max(int(np.gcd.reduce(cells)), 1)
+    return float(values[0]), float(cell_step * resolution), int(cells[-1] // cell_step) + 1
+
+def _axis_positions(values, axis, resolution):
+    """Position of each coordinate on an (origin, spacing, length) axis, or None if one is off the axis"""
+    origin, spacing, length = axis
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.rint((values - origin) / spacing).astype(np.int64)
+    if len(values) and (positions.min() < 0 or positions.max() >= length
+                        or np.abs(values - origin - positions * spacing).max() > resolution):
+        return None
+    return positions
+
+def _month_coordinates(dataset, period):
+    """Unique latitudes and longitudes of one gold month"""
+    table = dataset.to_table(columns=['lat', 'lon'], filter=_month_filter(period))
+    return (pc.unique(table['lat']).to_numpy().astype(np.float64),
+            pc.unique(table['lon']).to_numpy().astype(np.float64))
+
+def _load_index(cube_path):
+    """The cube's index, or None without a cube"""
+    if not os.path.exists(os.path.join(cube_path, CUBE_INDEX)):
+        return None
+    return _read_index(cube_path)
+
+def _read_index(cube_path):
+    with open(os.path.join(cube_path, CUBE_INDEX)) as f:
+        return json.load(f)
+
+def _save_index(cube_path, index):
+    """Write the cube index atomically"""
+    tmp_path = os.path.join(cube_path, f".{CUBE_INDEX}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, os.path.join(cube_path, CUBE_INDEX))
+
+def _write_month(dataset, cube_path, variables, period, lat_axis, lon_axis, resolution):
+    """Fill one month of every variable from the gold dataset into its .npy file
+
+    Each file is written under a hidden name and moved into place, so a
+    reader sees either the old or the new month.
+    """
+    df = dataset.to_table(columns=['lat', 'lon'] + variables, filter=_month_filter(period)).to_pandas()
+    r = _axis_positions(df['lat'].to_numpy(dtype=np.float64), lat_axis, resolution)
+    c = _axis_positions(df['lon'].to_numpy(dtype=np.float64), lon_axis, resolution)
+
+    for var in variables:
+        path = _month_path(cube_path, var, period)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(lat_axis[2], lon_axis[2]))
+        array[:] = np.nan
+        array[r, c] = df[var].to_numpy(dtype=np.float32)
+        array.flush()
+        del array
+        os.replace(tmp_path, path)
+
+def build_gold_cube(dataset_path, cube_path, variables, resolution, months=None,
+                    max_cells_per_row=GOLD_CUBE_MAX_CELLS_PER_ROW):
+    """Build or update the gold cube from the partitioned gold dataset
+
+    Each variable has one (lat, lon) float32 .npy file per month, on the
+    native grid of the gold rows (see native_axis), so a 1/24 degree
+    product is stored at 1/24 degree rather than at the join resolution.
+    months lists the (year, month) pairs whose gold partitions changed:
+    only those months are re-read and rewritten in place, provided the
+    cube holds the same variables and they fit its grid. Otherwise, and
+    with months None, the whole cube is rebuilt next to the old one and
+    swapped in by rename. The time axis and row counts come from the
+    partition manifest.
+
+    A cube with more than max_cells_per_row cells per gold row would be
+    mostly empty (data too sparse or irregular for a dense grid): it is
+    not built and an old one is removed, so readers fall back to the gold
+    dataset.
+    """
+    dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+    variables = [var for var in variables if var in dataset.schema.names]
+
+    rows = {}
+    for entry in load_partition_manifest(dataset_path).get('partitions', {}).values():
+        if entry['rows']:
+            period = int(_periods(entry['year'], entry['month']))
+            rows[period] = rows.get(period, 0) + entry['rows']
+
+    if not rows:
+        print("[WARN] Gold dataset is empty, cube not built")
+        return None
+
+    periods = sorted(rows)
+    index = _load_index(cube_path)
+    touched = set() if months is None else {int(_periods(year, month)) for year, month in months}
+    coordinates = {}
+    incremental = (months is not None and index is not None and index.get('variables') == variables
+                   and 'rows' in index)
+
+    if incremental:
+        lat_axis = (index['lat0'], index['lat_resolution'], index['n_lat'])
+        lon_axis = (index['lon0'], index['lon_resolution'], index['n_lon'])
+        stored = {int(_periods(year, month)) for year, month in index['times']}
+        touched &= set(periods) | stored
+        for period in sorted(touched & set(periods)):
+            coordinates[period] = _month_coordinates(dataset, period)
+            lats, lons = coordinates[period]
+            if _axis_positions(lats, lat_axis, resolution) is None or _axis_positions(lons, lon_axis, resolution) is None:
+                print(f"[INFO] {_month_name(period)} is off the gold cube grid, rebuilding the cube")
+                incremental = False
+                break
+        # Months the cube does not hold yet have to be read as well
+        incremental = incremental and set(periods) <= stored | touched
+
+    if not incremental:
+        for period in periods:
+            if period not in coordinates:
+                coordinates[period] = _month_coordinates(dataset, period)
+        lat_axis = native_axis(np.concatenate([lats for lats, _ in coordinates.values()]), resolution)
+        lon_axis = native_axis(np.concatenate([lons for _, lons in coordinates.values()]), resolution)
+
+    cells = len(periods) * lat_axis[2] * lon_axis[2]
+    if cells > max_cells_per_row * sum(rows.values()):
+        print(f"[WARN] Gold cube not built: {cells} cells for {sum(rows.values())} gold rows "
+              f"(limit {max_cells_per_row} per row), the data is too sparse or irregular for a dense grid")
+        shutil.rmtree(cube_path, ignore_errors=True)
+        return None
+
+    new_index = {
+        'lat_resolution': lat_axis[1],
+        'lon_resolution': lon_axis[1],
+        'lat0': lat_axis[0],
+        'lon0': lon_axis[0],
+        'n_lat': lat_axis[2],
+        'n_lon': lon_axis[2],
+        'times': [[int(p // 12), int(p % 12 + 1)] for p in periods],
+        'rows': [rows[p] for p in periods],
+        'variables': variables,
+    }
+
+    if incremental:
+        # New month files land before the index lists them; dropped months go after it stops listing them
+        for period in sorted(touched & set(periods)):
+            _write_month(dataset, cube_path, variables, period, lat_axis, lon_axis, resolution)
+        _save_index(cube_path, new_index)
+        for period in sorted(touched - set(periods)):
+            for var in variables:
+                path = _month_path(cube_path, var, period)
+                if os.path.exists(path):
+                    os.remove(path)
+        print(f"[INFO] Gold cube updated: {len(touched)} of {len(periods)} months rewritten")
+        return cube_path
+
+    staging_path = cube_path + '.staging'
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+    for period in periods:
+        _write_month(dataset, staging_path, variables, period, lat_axis, lon_axis, resolution)
+    _save_index(staging_path, new_index)
+    _swap_directory(staging_path, cube_path)
+
+    print(f"[INFO] Gold cube built: {len(periods)} months x {lat_axis[2]} x {lon_axis[2]} cells, "
+          f"{len(variables)} variables")
+    return cube_path
+
+class _MonthArrays:
+    """(time, lat, lon) view of one variable's month files, memory-mapping months as they are indexed
+
+    Indexing takes a month position, list or slice first, then the lat/lon
+    selection; at most CUBE_OPEN_MONTHS months stay mapped at once.
+    """
+
+    def __init__(self, cube_path, variable, periods, shape):
+        self.paths = [_month_path(cube_path, variable, period) for period in periods]
+        self.shape = (len(periods),) + tuple(shape)
+        self._open = {}
+
+    def _month(self, t):
+        array = self._open.pop(t, None)
+        if array is None:
+            array = read_with_retry(lambda: np.load(self.paths[t], mmap_mode='r'))
+            if len(self._open) >= CUBE_OPEN_MONTHS:
+                self._open.pop(next(iter(self._open)))
+        self._open[t] = array  # most recently used last
+        return array
+
+    def __getitem__(self, key):
+        t, cells = key[0], key[1:]
+        if isinstance(t, (int, np.integer)):
+            return self._month(int(t))[cells]
+
+        months = np.arange(self.shape[0])[t]
+        if len(months) == 0:
+            return np.empty((0,) + np.empty(self.shape[1:], dtype=np.float32)[cells].shape, dtype=np.float32)
+        return np.stack([self._month(int(i))[cells] for i in months])
+
+class GoldCube:
+    """Read-only view of a gold cube with O(1) cell lookups"""
+
+    def __init__(self, cube_path):
+        self.index = read_with_retry(lambda: _read_index(cube_path))
+
+        self.lat_resolution = self.index['lat_resolution']
+        self.lon_resolution = self.index['lon_resolution']
+        self.lat0 = self.index['lat0']
+        self.lon0 = self.index['lon0']
+        self.n_lat = self.index['n_lat']
+        self.n_lon = self.index['n_lon']
+        self.times = [tuple(t) for t in self.index['times']]
+        self.variables = self.index['variables']
+        periods = [int(_periods(year, month)) for year, month in self.times]
+        self.arrays = {var: _MonthArrays(cube_path, var, periods, (self.n_lat, self.n_lon)) for var in self.variables}
+
+    def cell_index(self, lat, lon):
+        """(row, col) of the cell containing lat/lon, or None outside the grid"""
+        row = int(round((lat - self.lat0) / self.lat_resolution))
+        col = int(round((lon - self.lon0) / self.lon_resolution))
+        if 0 <= row < self.n_lat and 0 <= col < self.n_lon:
+            return row, col
+        return None
+
+    def time_index(self, year, month):
+        """Position of (year, month) on the time axis, or None"""
+        try:
+            return self.times.index((int(year), int(month)))
+        except ValueError:
+            return None
+
+    def cell_coordinates(self, row, col):
+        return self.lat0 + row * self.lat_resolution, self.lon0 + col * self.lon_resolution
+
+    def lookup(self, lat, lon, year, month):
+        """Values of every variable at one cell and month (NaN where missing)"""
+        cell = self.cell_index(lat, lon)
+        t = self.time_index(year, month)
+        if cell is None or t is None:
+            return None
+        return {var: float(self.arrays[var][t, cell[0], cell[1]]) for var in self.variables}
+
+    def nearest(self, lat, lon, top_k=3, year=None, month=None):
+        """Top-k nearest (cell, month) records with data, searching outward from the query cell
+
+        Only a window around the query cell is read from the memory map. It
+        is doubled until it holds top_k valid records and no cell outside it
+        can be closer than the k-th of them, or until it covers the grid.
+        """
+        row = int(round((lat - self.lat0) / self.lat_resolution))
+        col = int(round((lon - self.lon0) / self.lon_resolution))
+        if year is None:
+            t_sel = slice(None)
+        elif self.time_index(year, month) is None:
+            return []
+        else:
+            t_sel = [self.time_index(year, month)]
+
+        radius = 1
+        while True:
+            r0, r1 = max(row - radius, 0), min(row + radius + 1, self.n_lat)
+            c0, c1 = max(col - radius, 0), min(col + radius + 1, self.n_lon)
+
+            results = []
+            if r0 < r1 and c0 < c1:
+                valid = None
+                for var in self.variables:
+                    has_value = ~np.isnan(self.arrays[var][t_sel, r0:r1, c0:c1])
+                    valid = has_value if valid is None else valid | has_value
+                results = self._rank(lat, lon, valid, t_sel, r0, c0, top_k)
+
+            # A window corner is farther than cells just outside it, so compare with the closest outside cell
+            outside = self._outside_distance(lat, row, col, radius)
+            if outside is None or (len(results) == top_k and results[-1]['distance'] <= outside):
+                return results
+
+            radius *= 2
+
+    def _outside_distance(self, lat, row, col, radius):
+        """Lower bound (km) on the distance from the query to any cell outside the window, None if there is none"""
+        bounds = []
+        if row - radius > 0 or row + radius + 1 < self.n_lat:
+            # The query lies within half a cell of its row and column
+            bounds.append(np.radians((radius + 0.5) * self.lat_resolution))
+        if col - radius > 0 or col + radius + 1 < self.n_lon:
+            # Longitudes wrap, so a cell far away on the axis can be near across the antimeridian
+            farthest = (max(col, self.n_lon - 1 - col) + 0.5) * self.lon_resolution
+            dlon = np.radians(max(min((radius + 0.5) * self.lon_resolution, 360.0 - farthest), 0.0))
+            # Distance to the meridian dlon away from the query
+            bounds.append(np.arcsin(np.cos(np.radians(lat)) * np.sin(min(dlon, np.pi / 2))))
+        return EARTH_RADIUS_KM * min(bounds) if bounds else None
+
+    def _rank(self, lat, lon, valid, t_sel, r0, c0, top_k):
+        t_idx, r_idx, c_idx = np.nonzero(valid)
+        t_ids = np.arange(len(self.times))[t_sel][t_idx]
+        cell_lat, cell_lon = self.cell_coordinates(r_idx + r0, c_idx + c0)
+
+        lat1, lon1, lat2, lon2 = map(np.radians, (lat, lon, cell_lat, cell_lon))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distance = EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+        results = []
+        for i in np.argsort(distance, kind='stable')[:top_k]:
+            year, month = self.times[t_ids[i]]
+            record = {'lat': float(cell_lat[i]), 'lon': float(cell_lon[i]), 'year': year, 'month': month}
+            for var in self.variables:
+                record[var] = float(self.arrays[var][t_ids[i], r_idx[i] + r0, c_idx[i] + c0])
+            record['distance'] = float(distance[i])
+            results.append(record)
+        return results
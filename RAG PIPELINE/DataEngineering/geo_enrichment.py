@@ -0,0 +1,158 @@
+# Geo Enrichment
+
+# Offline reverse geocoding of gold rows against rasterized boundary polygons.
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from gold_dataset import load_partition_manifest, rewrite_partitions
+from config import ENRICHMENT_LAYERS, ENRICHMENT_RESOLUTION
+
+_GRID_CACHE = {}
+
+def load_boundary_features(path, name_property):
+    """(names, polygons) from a GeoJSON file; each polygon is a list of (n, 2) lon/lat rings"""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    names, polygons = [], []
+    for feature in collection['features']:
+        geometry = feature.get('geometry') or {}
+        name = (feature.get('properties') or {}).get(name_property)
+        if name is None:
+            continue
+
+        if geometry.get('type') == 'Polygon':
+            parts = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            parts = geometry['coordinates']
+        else:
+            continue
+
+        for rings in parts:
+            names.append(str(name))
+            polygons.append([np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings])
+
+    return names, polygons
+
+def rasterize_polygon(raster, rings, value, lat0, lon0, lat_resolution, lon_resolution):
+    """Even-odd scanline fill of one polygon (holes included) into raster
+
+    Cell (i, j) of raster is centred on (lat0 + i * lat_resolution,
+    lon0 + j * lon_resolution); cells whose centre falls inside the polygon
+    are set to value. Parts of the polygon outside the raster are ignored.
+    """
+    n_lat, n_lon = raster.shape
+    edges = np.concatenate([np.stack([ring[:-1], ring[1:]], axis=1) if np.array_equal(ring[0], ring[-1])
+                            else np.stack([ring, np.roll(ring, -1, axis=0)], axis=1) for ring in rings])
+    (x0, y0), (x1, y1) = edges[:, 0].T, edges[:, 1].T
+
+    # An edge crosses the row centres in [ymin, ymax)
+    first_row = np.clip(np.ceil((np.minimum(y0, y1) - lat0) / lat_resolution).astype(np.int64), 0, n_lat)
+    end_row = np.clip(np.ceil((np.maximum(y0, y1) - lat0) / lat_resolution).astype(np.int64), 0, n_lat)
+    counts = end_row - first_row
+    if counts.sum() == 0:
+        return
+
+    edge = np.repeat(np.arange(len(edges)), counts)
+    rows = first_row[edge] + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    y = lat0 + rows * lat_resolution
+    x = x0[edge] + (y - y0[edge]) * (x1[edge] - x0[edge]) / (y1[edge] - y0[edge])
+
+    # A crossing toggles inside/outside for every cell centre to its right;
+    # only the polygon's bounding box of rows and columns is scanned
+    cols = np.clip(np.ceil((x - lon0) / lon_resolution).astype(np.int64), 0, n_lon)
+    row0, row1 = int(rows.min()), int(rows.max()) + 1
+    col0, col1 = int(cols.min()), int(cols.max())
+    width = col1 - col0 + 1
+    parity = np.zeros((row1 - row0, width), dtype=np.uint8)
+    np.bitwise_xor.at(parity, (rows - row0, cols - col0), 1)
+    np.bitwise_xor.accumulate(parity, axis=1, out=parity)
+
+    np.copyto(raster[row0:row1, col0:col1], value, where=parity[:, :col1 - col0].view(bool))
+
+class LookupGrid:
+    """Global raster of feature labels; lookups are one array gather per point"""
+
+    def __init__(self, names, polygons, resolution):
+        self.resolution = resolution
+        self.categories = sorted(set(names))
+        self.n_lat = int(round(180.0 / resolution))
+        self.n_lon = int(round(360.0 / resolution))
+        self.labels = np.full((self.n_lat, self.n_lon), -1, dtype=np.int16)
+
+        code = {name: i for i, name in enumerate(self.categories)}
+        half = resolution / 2.0
+        for name, rings in zip(names, polygons):
+            rasterize_polygon(self.labels, rings, code[name], half - 90.0, half - 180.0, resolution, resolution)
+
+    def codes(self, lat, lon):
+        """Category code of each point, -1 where no feature covers it"""
+        rows = np.clip(np.floor((np.asarray(lat, dtype=np.float64) + 90.0) / self.resolution), 0, self.n_lat - 1).astype(np.int64)
+        cols = np.floor((np.asarray(lon, dtype=np.float64) + 180.0) / self.resolution).astype(np.int64) % self.n_lon
+        return self.labels[rows, cols]
+
+    def lookup(self, lat, lon):
+        """Feature names as a pandas Categorical (NaN where no feature covers the point)"""
+        return pd.Categorical.from_codes(self.codes(lat, lon), categories=self.categories)
+
+def load_lookup_grid(path, name_property, resolution=ENRICHMENT_RESOLUTION):
+    """Rasterize a boundary file once per process"""
+    key = (os.path.abspath(path), name_property, resolution, os.path.getmtime(path))
+    if key not in _GRID_CACHE:
+        names, polygons = load_boundary_features(path, name_property)
+        _GRID_CACHE[key] = LookupGrid(names, polygons, resolution)
+    return _GRID_CACHE[key]
+
+def enrich_locations(df, layers=ENRICHMENT_LAYERS, resolution=ENRICHMENT_RESOLUTION, verbose=True):
+    """Add one categorical column per boundary layer (e.g. ocean_basin, EEZ, Country) to df
+
+    Columns are added in place and df is returned. Layers whose boundary
+    file is missing are skipped with a warning; by default only the
+    bundled ocean basins are configured (see EEZ_LAYERS in config).
+    Points outside every polygon of a layer get null, never the nearest
+    feature.
+    """
+    for layer in layers:
+        if not os.path.exists(layer['path']):
+            if verbose:
+                print(f"[WARN] Boundary file not found for {layer['column']}: {layer['path']}")
+            continue
+
+        grid = load_lookup_grid(layer['path'], layer['property'], resolution)
+        df[layer['column']] = grid.lookup(df['lat'].to_numpy(), df['lon'].to_numpy())
+
+        if verbose:
+            matched = float(df[layer['column']].notna().mean()) if len(df) else 0.0
+            print(f"[INFO] Enriched {layer['column']}: {matched:.1%} of rows matched")
+    return df
+
+def _layers_fingerprint(layers, resolution):
+    """Identity of the boundary layers in use; changes when a boundary file changes"""
+    parts = [resolution] + [[layer['column'], layer['property'],
+                             os.path.getmtime(layer['path']) if os.path.exists(layer['path']) else None]
+                            for layer in layers]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+def enrich_gold_dataset(dataset_path, layers=ENRICHMENT_LAYERS, resolution=ENRICHMENT_RESOLUTION):
+    """Add location columns to the partitions of a gold dataset, in place
+
+    Partitions already enriched with the current boundary layers (recorded
+    in the partition manifest) are left untouched.
+    """
+    for layer in layers:
+        if not os.path.exists(layer['path']):
+            print(f"[WARN] Boundary file not found for {layer['column']}: {layer['path']}")
+
+    fingerprint = _layers_fingerprint(layers, resolution)
+    partitions = load_partition_manifest(dataset_path).get('partitions', {})
+    keys = [key for key, entry in partitions.items() if entry.get('enrichment') != fingerprint]
+
+    if keys:
+        rewrite_partitions(dataset_path, lambda df: enrich_locations(df, layers, resolution, verbose=False),
+                           keys, extra={'enrichment': fingerprint})
+
+    print(f"[INFO] Enriched {len(keys)} of {len(partitions)} gold partitions")
+    return len(keys)
@@ -0,0 +1,341 @@
+# Gold Dataset
+
+# Hive-partitioned (year/month/lat_band) gold output with pruning reads.
+import os
+import json
+import time
+import shutil
+import hashlib
+from contextlib import contextmanager
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+
+from schema import enforce_schema
+
+PARTITION_MANIFEST = '_partitions.json'
+MANIFEST_LOCK = '_partitions.lock'
+
+# Readers retry this many times, backing off from SWAP_RETRY_SECONDS, when they land
+# in the moment a directory is being swapped (see _swap_directory)
+SWAP_RETRIES = 5
+SWAP_RETRY_SECONDS = 0.1
+
+def lat_bands(lat, band_size):
+    """Latitude band (lower edge, degrees) for each latitude"""
+    return (np.floor(np.asarray(lat, dtype=np.float64) / band_size) * band_size).astype(np.int16)
+
+def _partition_dir(year, month, lat_band):
+    return f"year={int(year)}/month={int(month)}/lat_band={int(lat_band)}"
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_partition_manifest(dataset_path):
+    """Load the partition manifest of a gold dataset, or an empty one"""
+    manifest_path = os.path.join(dataset_path, PARTITION_MANIFEST)
+
+    if not os.path.exists(manifest_path):
+        return {'partitions': {}}
+
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_partition_manifest(dataset_path, manifest):
+    """Write the partition manifest atomically"""
+    manifest_path = os.path.join(dataset_path, PARTITION_MANIFEST)
+    tmp_path = manifest_path + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+@contextmanager
+def manifest_lock(dataset_path, timeout=600, poll=0.05, lock_name=MANIFEST_LOCK):
+    """Exclusive lock on a dataset's partition manifest across processes
+
+    The lock is a file created with O_EXCL, which is atomic on local
+    filesystems on every platform, so concurrent writers of different
+    months serialize their manifest read-modify-write. lock_name lets
+    other manifests (e.g. a silver folder's) use the same mechanism.
+    """
+    os.makedirs(dataset_path, exist_ok=True)
+    lock_path = os.path.join(dataset_path, lock_name)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Partition manifest is locked: {lock_path}")
+            time.sleep(poll)
+
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        os.remove(lock_path)
+
+def write_partition(table, partition_path, file_name='part-0.parquet', row_group_size=100_000, compression='zstd'):
+    """Write one sorted partition file with row-group min/max statistics"""
+    os.makedirs(partition_path, exist_ok=True)
+    file_path = os.path.join(partition_path, file_name)
+    pq.write_table(table, file_path, row_group_size=row_group_size,
+                   compression=compression, write_statistics=True)
+    return file_path
+
+def _write_month_parts(staging_dir, df_month, part, entries, row_group_size, compression):
+    """Write one frame of a month into its lat_band directories as part-{part}.parquet"""
+    for lat_band, df_part in df_month.groupby('lat_band', sort=True):
+        table = pa.Table.from_pandas(df_part.drop(columns=['year', 'month', 'lat_band']), preserve_index=False)
+        file_name = f"part-{part}.parquet"
+        file_path = write_partition(table, os.path.join(staging_dir, f"lat_band={int(lat_band)}"), file_name,
+                                    row_group_size=row_group_size, compression=compression)
+
+        year, month = int(df_part['year'].iloc[0]), int(df_part['month'].iloc[0])
+        entry = entries.setdefault(_partition_dir(year, month, lat_band), {
+            'year': year, 'month': month, 'lat_band': int(lat_band), 'rows': 0, 'bytes': 0, 'files': [],
+            'file_sha256': [],
+        })
+        entry['rows'] += len(df_part)
+        entry['bytes'] += os.path.getsize(file_path)
+        entry['files'].append(file_name)
+        entry['file_sha256'].append(_file_sha256(file_path))
+
+def _finish_entries(entries):
+    """Partition checksums: the file's own for single-file partitions, else a digest of the file checksums"""
+    for entry in entries.values():
+        checksums = entry.pop('file_sha256')
+        entry['sha256'] = checksums[0] if len(checksums) == 1 else hashlib.sha256(
+            ''.join(checksums).encode()).hexdigest()
+    return entries
+
+def _update_manifest(dataset_path, written, lat_band_size):
+    """Replace the manifest entries of the written months"""
+    # Re-read under the lock: other processes may have saved other months meanwhile
+    with manifest_lock(dataset_path):
+        manifest = load_partition_manifest(dataset_path)
+        partitions = manifest.setdefault('partitions', {})
+        for month_dir, new_entries in written.items():
+            for key in [key for key in partitions if key.startswith(month_dir + '/')]:
+                del partitions[key]
+            partitions.update(new_entries)
+
+        manifest['lat_band_size'] = lat_band_size
+        save_partition_manifest(dataset_path, manifest)
+
+def _prepare_gold(df, lat_band_size):
+    """Storage dtypes, lat_band column and the year/month/lat_band/lat/lon sort order of gold files"""
+    df = enforce_schema(df).assign(lat_band=lat_bands(df['lat'], lat_band_size))
+    return df.sort_values(['year', 'month', 'lat_band', 'lat', 'lon'], kind='stable')
+
+def save_partitioned_dataset(df, output_path, name, lat_band_size=10, row_group_size=100_000, compression='zstd'):
+    """Save a gold frame as a year/month/lat_band Hive dataset
+
+    Only the (year, month) partitions present in df are replaced. Each month
+    is written to a hidden staging directory and swapped in with renames, so
+    readers never see a half-written month (they retry over the instant it
+    is missing, see _swap_directory); the manifest update is done under
+    manifest_lock so several months can be saved concurrently. Rows are
+    sorted by lat/lon so the row-group statistics are tight enough to prune on.
+    """
+    dataset_path = os.path.join(output_path, name)
+    os.makedirs(dataset_path, exist_ok=True)
+    written = {}
+
+    df = _prepare_gold(df, lat_band_size)
+
+    for (year, month), df_month in df.groupby(['year', 'month'], sort=True):
+        month_dir = f"year={int(year)}/month={int(month)}"
+        staging_dir = os.path.join(dataset_path, f".staging-{int(year)}-{int(month)}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+        new_entries = {}
+        _write_month_parts(staging_dir, df_month, 0, new_entries, row_group_size, compression)
+
+        _swap_directory(staging_dir, os.path.join(dataset_path, month_dir))
+        written[month_dir] = _finish_entries(new_entries)
+
+        print(f"[INFO] Saved {len(df_month)} records to {month_dir} ({len(new_entries)} lat bands)")
+
+    _update_manifest(dataset_path, written, lat_band_size)
+    return dataset_path
+
+def write_month_frames(frames, staging_dir, year, month, lat_band_size=10, row_group_size=100_000,
+                       compression='zstd', part_prefix='', first_part=0):
+    """Write frames of one month into lat_band directories under staging_dir
+
+    Each frame becomes one sorted part-{part_prefix}{N}.parquet file in
+    every lat_band it touches, N counting from first_part. Returns
+    (manifest entries, rows written).
+    """
+    entries = {}
+    rows = 0
+    for part, df in enumerate(frames, first_part):
+        if df.empty:
+            continue
+        df = _prepare_gold(df, lat_band_size)
+        if ((df['year'] != year) | (df['month'] != month)).any():
+            raise ValueError(f"Frame {part} holds rows outside {year}-{int(month):02d}")
+        _write_month_parts(staging_dir, df, f"{part_prefix}{part}", entries, row_group_size, compression)
+        rows += len(df)
+    return _finish_entries(entries), rows
+
+def scan_month_entries(month_path, year, month):
+    """Manifest entries of a month directory's lat_band partitions, from the files on disk"""
+    entries = {}
+    for band_dir in sorted(os.listdir(month_path)):
+        if not band_dir.startswith('lat_band='):
+            continue
+        lat_band = int(band_dir.split('=', 1)[1])
+        partition_path = os.path.join(month_path, band_dir)
+        files = sorted(name for name in os.listdir(partition_path)
+                       if name.endswith('.parquet') and not name.startswith('.'))
+
+        entries[_partition_dir(year, month, lat_band)] = {
+            'year': int(year), 'month': int(month), 'lat_band': lat_band,
+            'rows': sum(pq.ParquetFile(os.path.join(partition_path, name)).metadata.num_rows for name in files),
+            'bytes': sum(os.path.getsize(os.path.join(partition_path, name)) for name in files),
+            'files': files,
+            'file_sha256': [_file_sha256(os.path.join(partition_path, name)) for name in files],
+        }
+    return _finish_entries(entries)
+
+def commit_month(dataset_path, staging_dir, year, month, entries, lat_band_size=10):
+    """Swap a staged month into the dataset and replace its manifest entries"""
+    month_dir = f"year={int(year)}/month={int(month)}"
+    _swap_directory(staging_dir, os.path.join(dataset_path, month_dir))
+    _update_manifest(dataset_path, {month_dir: entries}, lat_band_size)
+
+def rewrite_partitions(dataset_path, transform, keys=None, extra=None, row_group_size=100_000, compression='zstd'):
+    """Apply transform(df) to partition files in place and refresh their manifest entries
+
+    keys selects partitions (all when None); extra is merged into each
+    rewritten entry. Every file is written under a hidden name and then
+    replaced with os.replace, so readers see either the old or the new file.
+    """
+    manifest = load_partition_manifest(dataset_path)
+    partitions = manifest.get('partitions', {})
+
+    for key in sorted(partitions if keys is None else keys):
+        entry = partitions[key]
+        if not entry['files']:
+            entry.update(extra or {})
+            continue
+
+        partition_path = os.path.join(dataset_path, key)
+        digest = hashlib.sha256()
+        size = 0
+
+        for file_name in entry['files']:
+            df = transform(pq.read_table(os.path.join(partition_path, file_name)).to_pandas())
+            tmp_path = write_partition(pa.Table.from_pandas(df, preserve_index=False), partition_path,
+                                       f".{file_name}.tmp", row_group_size, compression)
+            file_path = os.path.join(partition_path, file_name)
+            os.replace(tmp_path, file_path)
+
+            digest.update(_file_sha256(file_path).encode())
+            size += os.path.getsize(file_path)
+
+        # Single-file partitions keep the plain file checksum
+        entry['sha256'] = _file_sha256(file_path) if len(entry['files']) == 1 else digest.hexdigest()
+        entry['bytes'] = size
+        entry.update(extra or {})
+
+    save_partition_manifest(dataset_path, manifest)
+    return len(partitions) if keys is None else len(keys)
+
+def _swap_directory(staging_dir, target_dir):
+    """Replace target_dir with staging_dir using renames
+
+    A directory cannot be replaced atomically: between the two renames
+    target_dir does not exist for an instant. Readers that may run
+    concurrently go through read_with_retry, which reads again when they
+    land in that window.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target_dir)), exist_ok=True)
+    retired_dir = staging_dir + '.old'
+
+    if os.path.exists(target_dir):
+        os.rename(target_dir, retired_dir)
+    os.rename(staging_dir, target_dir)
+    shutil.rmtree(retired_dir, ignore_errors=True)
+
+def read_with_retry(read, retries=SWAP_RETRIES, delay=SWAP_RETRY_SECONDS):
+    """Call read(), reading again when it hit a directory in the middle of a swap
+
+    read() should raise FileNotFoundError for a missing directory or file;
+    the last failure is re-raised.
+    """
+    for attempt in range(retries):
+        try:
+            return read()
+        except FileNotFoundError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+def gold_filter(lat_range=None, lon_range=None, time_range=None, lat_band_size=10):
+    """Build a pyarrow filter expression that prunes partitions and row groups
+
+    lat_range/lon_range are (min, max) in degrees; time_range is
+    ((start_year, start_month), (end_year, end_month)), inclusive. Pass
+    lat_band_size=None for datasets that are not partitioned by lat_band.
+    """
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if lat_range is not None:
+        lat_min, lat_max = lat_range
+        if lat_band_size:
+            band_min, band_max = lat_bands([lat_min, lat_max], lat_band_size)
+            # lat_band terms let the dataset skip whole partition directories
+            expr = _and((ds.field('lat_band') >= int(band_min)) & (ds.field('lat_band') <= int(band_max)))
+        expr = _and((ds.field('lat') >= lat_min) & (ds.field('lat') <= lat_max))
+
+    if lon_range is not None:
+        lon_min, lon_max = lon_range
+        expr = _and((ds.field('lon') >= lon_min) & (ds.field('lon') <= lon_max))
+
+    if time_range is not None:
+        (start_year, start_month), (end_year, end_month) = time_range
+        year, month = ds.field('year'), ds.field('month')
+        expr = _and((year > start_year) | ((year == start_year) & (month >= start_month)))
+        expr = _and((year < end_year) | ((year == end_year) & (month <= end_month)))
+
+    return expr
+
+def read_gold_dataset(dataset_path, lat_range=None, lon_range=None, time_range=None, columns=None):
+    """Read a partitioned gold dataset, touching only matching partitions and row groups
+
+    A month of the manifest with no files on disk is being swapped, so
+    the read is retried (see read_with_retry).
+    """
+    def read():
+        manifest = load_partition_manifest(dataset_path)
+        lat_band_size = manifest.get('lat_band_size', 10)
+
+        dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+        listed = {os.path.relpath(os.path.dirname(path), dataset_path).replace(os.sep, '/').rsplit('/', 1)[0]
+                  for path in dataset.files}
+        missing = {key.rsplit('/', 1)[0] for key, entry in manifest.get('partitions', {}).items()
+                   if entry['files']} - listed
+        if missing:
+            raise FileNotFoundError(f"Gold months missing from {dataset_path}: {', '.join(sorted(missing))}")
+
+        return dataset.to_table(columns=columns, filter=gold_filter(lat_range, lon_range, time_range, lat_band_size))
+
+    df = read_with_retry(read).to_pandas()
+
+    if columns is None and 'lat_band' in df.columns:
+        df = df.drop(columns=['lat_band'])
+    return enforce_schema(df)
@@ -3,46 +3,258 @@
 # Silver to Gold merge pipeline.
 import os
 import sys
+import shutil
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-import pandas as pd
+from utils_notebook import get_current_date_parts, build_input_path, save_dataframe, read_silver_dataframe, silver_files, silver_row_count, iter_silver_batches
+from join_engine import join_on_grid, bucket_count, spill_to_buckets, join_bucket
+from schema import decode_packed
+from gold_dataset import save_partitioned_dataset, write_month_frames, scan_month_entries, commit_month
+from checkpoint import Checkpoint, fingerprint
+from pipeline_dag import path_stats
+from cube_store import build_gold_cube
+from pyramid import build_pyramid
+from geo_enrichment import enrich_locations
+from region_index import build_region_index, RegionIndex
 
-from utils_notebook import get_current_date_parts, save_dataframe
+from config import SLIVER_CONFIG, SILVER_LAYER, GOLD_LAYER, GRID_RESOLUTION, GOLD_PARTITIONED, GOLD_DATASET_NAME, GOLD_LAT_BAND_SIZE, GOLD_ROW_GROUP_SIZE, GOLD_MEMORY_BUDGET, RECORD_BATCH_SIZE, GOLD_CUBE, GOLD_CUBE_NAME, GOLD_PYRAMID, GOLD_PYRAMID_NAME, PYRAMID_LEVELS, GOLD_ENRICH, GOLD_REGION_INDEX, MARINE_REGION_FILES, PIPELINE_CHECKPOINTS
 
-from config import SLIVER_CONFIG, SILVER_LAYER, GOLD_LAYER
-
-def merge_silver_to_gold(silver_layer, config, gold_layer, file_format='parquet'):
+def merge_silver_to_gold(silver_layer, config, gold_layer, file_format='parquet', engine='grid', resolution=GRID_RESOLUTION,
+                         partitioned=GOLD_PARTITIONED, cube=GOLD_CUBE, pyramid=GOLD_PYRAMID, enrich=GOLD_ENRICH,
+                         region_index=GOLD_REGION_INDEX, year=None, month=None, memory_budget=GOLD_MEMORY_BUDGET,
+                         checkpoints=PIPELINE_CHECKPOINTS, resume=False):
     os.makedirs(gold_layer, exist_ok=True)
 
-    df_main = None
+    # year/month select the Silver partition (default: the current month)
+    if year is None or month is None:
+        year, month, day = get_current_date_parts()
+
+    n_buckets = 1
+    if engine == 'grid' and partitioned and file_format == 'parquet':
+        n_buckets = _plan_buckets(silver_layer, config, year, month, memory_budget)
+
+    # Checkpoints of the partitioned dataset: every joined spill bucket and the committed month
+    journal, plan = None, None
+    if checkpoints and partitioned and file_format == 'parquet':
+        journal = Checkpoint(gold_checkpoint_path(gold_layer, year, month), resume)
+        silver_dirs = [build_input_path(silver_layer, year, month, folder) for folder in config]
+        plan = fingerprint(silver=path_stats(silver_dirs)[0], config=config, engine=engine, resolution=resolution,
+                           n_buckets=n_buckets, enrich=enrich)
+
+        if journal.get('committed', plan):
+            print(f"[INFO] Gold {year}-{int(month):02d} already merged (checkpoint), skipping the join")
+            _build_gold_views(os.path.join(gold_layer, GOLD_DATASET_NAME), gold_layer, config, resolution, cube,
+                              pyramid, region_index, [(year, month)])
+            return
+
+    if n_buckets > 1:
+        dataset_path, rows = _merge_out_of_core(silver_layer, config, gold_layer, year, month, resolution,
+                                                n_buckets, enrich, journal, plan)
+        if dataset_path is None:
+            print("[ERROR] No data found to merge")
+            return
+        if journal is not None:
+            journal.record('committed', plan, rows=rows)
+        _build_gold_views(dataset_path, gold_layer, config, resolution, cube, pyramid, region_index,
+                          [(year, month)])
+        print(f"[SUCCESS] Gold layer created with {rows} records")
+        return
+
+    if engine == 'grid':
+        df_final = _merge_on_grid(silver_layer, config, year, month, resolution)
+    elif engine == 'pandas':
+        df_final = _merge_with_pandas(silver_layer, config, year, month)
+    else:
+        raise ValueError(f"Unsupported merge engine: {engine}")
+
+    if df_final is not None:
+        if enrich:
+            df_final = enrich_locations(df_final)
+
+        if partitioned and file_format == 'parquet':
+            dataset_path = save_partitioned_dataset(df_final, gold_layer, GOLD_DATASET_NAME,
+                                                    GOLD_LAT_BAND_SIZE, GOLD_ROW_GROUP_SIZE)
+            if journal is not None:
+                journal.record('committed', plan, rows=len(df_final))
+            _build_gold_views(dataset_path, gold_layer, config, resolution, cube, pyramid, region_index,
+                              [(year, month)])
+        else:
+            save_dataframe(df_final, gold_layer, "merged_gold", file_format)
+        print(f"[SUCCESS] Gold layer created with {len(df_final)} records")
+    else:
+        print("[ERROR] No data found to merge")
+
+def gold_checkpoint_path(gold_layer, year, month):
+    """Checkpoint journal of a month's gold merge"""
+    return os.path.join(gold_layer, f".checkpoint-{year}-{int(month):02d}.jsonl")
+
+def _build_gold_views(dataset_path, gold_layer, config, resolution, cube, pyramid, region_index, months=None):
+    """Cube, region index and pyramid derived from the partitioned gold dataset
 
-    year, month, day = get_current_date_parts()
+    months lists the (year, month) pairs whose partitions changed; the
+    cube and pyramid rewrite only those when they can (None rebuilds
+    them). The region index depends only on the cube grid, so it is built
+    again only when the cube was rebuilt without it.
+    """
+    if cube:
+        cube_path = build_gold_cube(dataset_path, os.path.join(gold_layer, GOLD_CUBE_NAME),
+                                    list(config.values()), resolution, months)
+        if cube_path and region_index and (months is None or not RegionIndex.exists(cube_path)):
+            build_region_index(cube_path, MARINE_REGION_FILES)
+    if pyramid:
+        build_pyramid(dataset_path, os.path.join(gold_layer, GOLD_PYRAMID_NAME),
+                      list(config.values()), PYRAMID_LEVELS, resolution, months)
 
+def _plan_buckets(silver_layer, config, year, month, memory_budget):
+    """Spill buckets for the month's join under memory_budget, from the silver parquet footers"""
+    rows = sum(silver_row_count(silver_layer, year, month, folder) for folder in config)
+    n_buckets = bucket_count(rows, memory_budget)
+
+    if n_buckets > 1:
+        print(f"[INFO] {rows} silver rows exceed the {memory_budget / 2**20:.0f} MB join budget, "
+              f"joining out of core in {n_buckets} buckets")
+    return n_buckets
+
+def _iter_silver_batches(silver_layer, config, year, month):
+    """Yield (variable, record batches) for each variable with silver data"""
     for folder, var in config.items():
-        parquet_path = os.path.join(silver_layer, str(year), str(month).zfill(2), folder, f"cleaned_{folder}.parquet")
+        if not silver_files(silver_layer, year, month, folder):
+            print(f"[WARN] Missing Silver data for {folder}")
+            continue
+
+        print(f"[INFO] Spilling Silver data for {folder}")
+        yield var, iter_silver_batches(silver_layer, year, month, folder, ['lat','lon','year','month',var],
+                                       RECORD_BATCH_SIZE)
+
+def _merge_out_of_core(silver_layer, config, gold_layer, year, month, resolution, n_buckets, enrich, journal=None,
+                       plan=None):
+    """Hash-partition the month's silver data by grid cell into spill buckets and join them one at a time
 
-        if not os.path.exists(parquet_path):
-            print(f"[WARN] Missing {parquet_path}")
+    Each bucket's join is written as its own part file of the staged gold
+    month, so neither the silver inputs nor the gold output are ever in
+    memory at once. With a checkpoint journal the spill and every written
+    bucket are recorded and kept on failure, so a resumed run only joins
+    the remaining buckets. Returns (dataset path, rows), or (None, 0)
+    without silver data.
+    """
+    spill_dir = os.path.join(gold_layer, f".spill-{year}-{int(month):02d}")
+    dataset_path = os.path.join(gold_layer, GOLD_DATASET_NAME)
+    staging_dir = os.path.join(dataset_path, f".staging-{int(year)}-{int(month)}")
+    filled_total, cells_total, rows = {}, 0, 0
+
+    try:
+        spill = journal.get('spill', plan) if journal is not None else None
+        if spill is not None and os.path.isdir(spill_dir) and os.path.isdir(staging_dir):
+            print(f"[INFO] Reusing the spill buckets of {', '.join(spill['variables'])} (checkpoint)")
+        else:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            os.makedirs(staging_dir)
+            variables = spill_to_buckets(_iter_silver_batches(silver_layer, config, year, month), resolution,
+                                         spill_dir, n_buckets)
+            # Bucket checkpoints belong to this spill only
+            spill = {'variables': variables, 'spill_id': os.urandom(8).hex()}
+            if journal is not None:
+                journal.record('spill', plan, **spill)
+
+        variables = spill['variables']
+        if not variables:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return None, 0
+
+        bucket_plan = fingerprint(plan=plan, spill_id=spill['spill_id'])
+        for bucket in range(n_buckets):
+            key = f"bucket-{bucket:04d}"
+            done = journal.get(key, bucket_plan) if journal is not None else None
+
+            if done is None:
+                _remove_bucket_parts(staging_dir, bucket)  # written before an interruption, not recorded
+                df, filled, n_out = join_bucket(spill_dir, variables, bucket, resolution)
+                bucket_rows = 0
+                if df is not None:
+                    if enrich:
+                        df = enrich_locations(df, verbose=False)
+                    _, bucket_rows = write_month_frames([df], staging_dir, year, month, GOLD_LAT_BAND_SIZE,
+                                                        GOLD_ROW_GROUP_SIZE, first_part=bucket)
+                    del df
+                done = {'rows': bucket_rows, 'filled': filled, 'cells': n_out}
+                if journal is not None:
+                    journal.record(key, bucket_plan, **done)
+
+            rows += done['rows']
+            cells_total += done['cells']
+            for var in variables:
+                filled_total[var] = filled_total.get(var, 0) + done['filled'][var]
+
+        entries = scan_month_entries(staging_dir, year, month)
+        if entries:
+            commit_month(dataset_path, staging_dir, year, month, entries, GOLD_LAT_BAND_SIZE)
+            print(f"[INFO] Saved {rows} records to year={int(year)}/month={int(month)} ({len(entries)} lat bands)")
+        else:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    except BaseException:
+        # Without checkpoints nothing can pick the spill up again
+        if journal is None:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    for var in variables:
+        print(f"[INFO] Coverage of {var}: {filled_total[var] / cells_total if cells_total else 0.0:.1%} of grid cells")
+    return dataset_path, rows
+
+def _remove_bucket_parts(staging_dir, bucket):
+    """Delete the part files a bucket wrote into the staged month"""
+    for band_dir in os.listdir(staging_dir):
+        part_path = os.path.join(staging_dir, band_dir, f"part-{bucket}.parquet")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+def _iter_silver_frames(silver_layer, config, year, month):
+    """Yield (variable, df) for each variable with silver data"""
+    for folder, var in config.items():
+        df_temp = read_silver_dataframe(silver_layer, year, month, folder, ['lat','lon','year','month',var])
+
+        if df_temp is None:
+            print(f"[WARN] Missing Silver data for {folder}")
             continue
 
         print(f"[INFO] Reading Silver data for {folder}")
+        yield var, df_temp
+
+def _merge_on_grid(silver_layer, config, year, month, resolution):
+    """Single-pass grid-keyed join of all variables"""
+    df_final, coverage = join_on_grid(_iter_silver_frames(silver_layer, config, year, month), resolution)
+
+    if not coverage:
+        return None
 
-        df_temp = pd.read_parquet(parquet_path)[['lat','lon','year','month',var]]
+    for var, fraction in coverage.items():
+        print(f"[INFO] Coverage of {var}: {fraction:.1%} of grid cells")
 
+    print(f"[INFO] Final data shape after inner join: {df_final.shape}")
+    return df_final
+
+def _merge_with_pandas(silver_layer, config, year, month):
+    """Chained pandas outer merges on float coordinates (legacy engine)"""
+    df_main = None
+
+    for var, df_temp in _iter_silver_frames(silver_layer, config, year, month):
+        df_temp = decode_packed(df_temp)
         df_main = df_temp if df_main is None else df_main.merge(df_temp, on=['lat','lon','year','month'], how='outer')
 
         print(f"[INFO] Current data shape: {df_main.shape}")
 
-    if df_main is not None:
-        required_cols = list(config.values())
-        df_final = df_main.dropna(subset=required_cols)
+    if df_main is None:
+        return None
 
-        print(f"[INFO] Final data shape after dropping NaNs: {df_final.shape}")
+    required_cols = [var for var in config.values() if var in df_main.columns]
+    df_final = df_main.dropna(subset=required_cols)
 
-        save_dataframe(df_final, gold_layer, "merged_gold", file_format)
-        print(f"[SUCCESS] Gold layer created with {len(df_final)} records")
-    else:
-        print("[ERROR] No data found to merge")
+    print(f"[INFO] Final data shape after dropping NaNs: {df_final.shape}")
+    return df_final
 
 # Uncomment to run the pipeline
 # merge_silver_to_gold(SILVER_LAYER, SLIVER_CONFIG, GOLD_LAYER, 'parquet')
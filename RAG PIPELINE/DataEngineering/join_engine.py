@@ -0,0 +1,244 @@
+# Grid Join Engine
+
+# Combines silver variables on integer grid-cell keys in a single sort pass.
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from schema import enforce_schema, column_values
+from config import COLUMN_SCHEMA
+
+# Peak bytes the in-memory gold merge needs per silver row (frames, keys, values,
+# sort and inverse arrays; about 70-80 measured on synthetic months), used to size
+# spill buckets
+JOIN_BYTES_PER_ROW = 80
+
+def grid_shape(resolution):
+    """Number of latitude rows (pole to pole) and longitude columns on the global grid"""
+    n_lat = int(round(180.0 / resolution)) + 1
+    n_lon = int(round(360.0 / resolution))
+    return n_lat, n_lon
+
+def grid_cell_ids(lat, lon, resolution):
+    """Quantize coordinates to integer grid-cell IDs (row-major from -90, -180)
+
+    Cells are centred on multiples of the resolution, so grid-aligned
+    coordinates land in the same cell whether they were stored as float32
+    or float64.
+    """
+    n_lat, n_lon = grid_shape(resolution)
+    lat_idx = np.clip(np.rint((np.asarray(lat, dtype=np.float64) + 90.0) / resolution), 0, n_lat - 1).astype(np.int64)
+    lon_idx = np.rint((np.asarray(lon, dtype=np.float64) + 180.0) / resolution).astype(np.int64) % n_lon
+    return lat_idx * n_lon + lon_idx
+
+def cell_centers(cell_ids, resolution):
+    """Centre latitude/longitude of grid cells"""
+    _, n_lon = grid_shape(resolution)
+    lat = (cell_ids // n_lon) * resolution - 90.0
+    lon = (cell_ids % n_lon) * resolution - 180.0
+    return lat, lon
+
+def _join_keys(cell_ids, year, month, n_cells):
+    """Pack (year, month, cell) into one int64 key that sorts chronologically"""
+    period = np.asarray(year, dtype=np.int64) * 12 + (np.asarray(month, dtype=np.int64) - 1)
+    return period * n_cells + cell_ids
+
+def _frame_keys(df, variable, resolution, n_cells):
+    """(int64 join keys, float64 values) of a silver frame; packed columns are decoded here"""
+    cell_ids = grid_cell_ids(df['lat'].to_numpy(), df['lon'].to_numpy(), resolution)
+    keys = _join_keys(cell_ids, df['year'].to_numpy(), df['month'].to_numpy(), n_cells)
+    return keys, column_values(df, variable)
+
+def _combine(variables, keys, values, how):
+    """Average the values of every variable per key in one np.unique sort pass
+
+    Returns (unique keys, {variable: column}, {variable: cells filled},
+    cells before the inner filter).
+    """
+    sizes = [len(k) for k in keys]
+    unique_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    del keys
+
+    n_out = len(unique_keys)
+    columns = {}
+    present = np.ones(n_out, dtype=bool)
+    filled = {}
+    offset = 0
+
+    for variable, var_values, size in zip(variables, values, sizes):
+        idx = inverse[offset:offset + size]
+        offset += size
+
+        counts = np.bincount(idx, minlength=n_out)
+        sums = np.bincount(idx, weights=var_values, minlength=n_out)
+
+        has_value = counts > 0
+        column = np.full(n_out, np.nan)
+        np.divide(sums, counts, out=column, where=has_value)
+
+        columns[variable] = column
+        filled[variable] = int(has_value.sum())
+        present &= has_value
+
+    del inverse, values
+
+    if how == 'inner':
+        unique_keys = unique_keys[present]
+        columns = {variable: column[present] for variable, column in columns.items()}
+    elif how != 'outer':
+        raise ValueError(f"Unsupported join type: {how}")
+
+    return unique_keys, columns, filled, n_out
+
+def _grid_frame(unique_keys, columns, resolution, n_cells):
+    """Wide gold frame from joined keys and value columns"""
+    period, cell_ids = np.divmod(unique_keys, n_cells)
+    lat, lon = cell_centers(cell_ids, resolution)
+
+    df = enforce_schema(pd.DataFrame({
+        'cell_id': cell_ids,
+        'lat': lat,
+        'lon': lon,
+        'year': period // 12,
+        'month': period % 12 + 1,
+    }))
+    for variable, column in columns.items():
+        df[variable] = column.astype(COLUMN_SCHEMA.get(variable, column.dtype))
+    return df
+
+def join_on_grid(frames, resolution, how='inner'):
+    """Join per-variable silver frames into one wide table keyed by grid cell
+
+    frames yields (variable, df) pairs with lat/lon/year/month and the
+    variable column. Only the int64 keys and float64 values of each frame
+    are kept (packed integer columns are decoded at this point), all keys
+    are combined in one np.unique sort pass, and repeated observations of
+    a cell are averaged. Returns (df, coverage) where coverage maps each
+    variable to the fraction of output cells it fills before the inner
+    filter is applied.
+    """
+    n_lat, n_lon = grid_shape(resolution)
+    n_cells = n_lat * n_lon
+
+    variables, keys, values = [], [], []
+    for variable, df in frames:
+        frame_keys, frame_values = _frame_keys(df, variable, resolution, n_cells)
+        keys.append(frame_keys)
+        values.append(frame_values)
+        variables.append(variable)
+
+    if not variables:
+        return pd.DataFrame(), {}
+
+    unique_keys, columns, filled, n_out = _combine(variables, keys, values, how)
+    coverage = {variable: filled[variable] / n_out if n_out else 0.0 for variable in variables}
+    return _grid_frame(unique_keys, columns, resolution, n_cells), coverage
+
+def estimate_join_bytes(rows):
+    """Peak memory of join_on_grid for this many silver rows (all variables together)"""
+    return int(rows * JOIN_BYTES_PER_ROW)
+
+def bucket_count(rows, memory_budget):
+    """Spill buckets needed so that each bucket's join fits in memory_budget bytes (1: join in memory)"""
+    if not memory_budget:
+        return 1
+    return max(1, -(-estimate_join_bytes(rows) // int(memory_budget)))
+
+def cell_hash(cell_ids):
+    """Well-mixed uint64 hash of cell ids (Fibonacci hashing)
+
+    Regular grids give cell ids with fixed strides, which alias with a
+    plain cell_id mod n and pile every cell into a few buckets.
+    """
+    return (np.asarray(cell_ids).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+
+def spill_to_buckets(variable_batches, resolution, spill_dir, n_buckets, shard=None):
+    """Hash-partition silver batches by grid cell into n_buckets spill files per variable
+
+    variable_batches yields (variable, batches) pairs, each batches an
+    iterable of silver frames. Every batch is reduced to its int64 join
+    keys and float64 values and split on a hash of the cell id, so all
+    observations of a cell, from every variable, land in the same bucket.
+    With shard=(index, count) only cells whose hash mod count == index are
+    kept and they are bucketed on (hash // count) mod n_buckets.
+    Buckets are Arrow IPC files under spill_dir/bucket-NNNN/. Returns the
+    variables spilled, in order.
+    """
+    n_lat, n_lon = grid_shape(resolution)
+    n_cells = n_lat * n_lon
+    schema = pa.schema([('key', pa.int64()), ('value', pa.float64())])
+    variables = []
+
+    for variable, batches in variable_batches:
+        writers = []
+        try:
+            for bucket in range(n_buckets):
+                bucket_dir = os.path.join(spill_dir, f"bucket-{bucket:04d}")
+                os.makedirs(bucket_dir, exist_ok=True)
+                writers.append(pa.ipc.new_file(os.path.join(bucket_dir, f"{variable}.arrow"), schema))
+
+            for df in batches:
+                if df.empty:
+                    continue
+                keys, values = _frame_keys(df, variable, resolution, n_cells)
+                hashes = cell_hash(keys % n_cells)
+                if shard is not None:
+                    keep = hashes % np.uint64(shard[1]) == shard[0]
+                    keys, values, hashes = keys[keep], values[keep], hashes[keep] // np.uint64(shard[1])
+                buckets = (hashes % np.uint64(n_buckets)).astype(np.int64)
+                order = np.argsort(buckets, kind='stable')
+                bounds = np.concatenate([[0], np.cumsum(np.bincount(buckets, minlength=n_buckets))])
+                keys, values = keys[order], values[order]
+
+                for bucket in np.flatnonzero(np.diff(bounds)):
+                    lo, hi = bounds[bucket], bounds[bucket + 1]
+                    writers[bucket].write_batch(pa.record_batch([keys[lo:hi], values[lo:hi]], schema=schema))
+        finally:
+            for writer in writers:
+                writer.close()
+        variables.append(variable)
+
+    return variables
+
+def join_bucket(spill_dir, variables, bucket, resolution, how='inner'):
+    """Join one spilled bucket: (wide gold frame or None if empty, {variable: filled cells}, cells)"""
+    n_lat, n_lon = grid_shape(resolution)
+    n_cells = n_lat * n_lon
+    bucket_dir = os.path.join(spill_dir, f"bucket-{bucket:04d}")
+    keys, values = [], []
+
+    for variable in variables:
+        with pa.memory_map(os.path.join(bucket_dir, f"{variable}.arrow")) as source:
+            table = pa.ipc.open_file(source).read_all()
+        keys.append(table.column('key').to_numpy())
+        values.append(table.column('value').to_numpy())
+        del table
+
+    unique_keys, columns, filled, n_out = _combine(variables, keys, values, how)
+    del keys, values
+    df = _grid_frame(unique_keys, columns, resolution, n_cells) if len(unique_keys) else None
+    return df, filled, n_out
+
+def join_buckets(spill_dir, variables, n_buckets, resolution, how='inner', coverage=None):
+    """Join spilled buckets one at a time, yielding one wide gold frame per bucket
+
+    Only one bucket's keys and values are in memory at once. When given,
+    coverage is filled in with the same fractions join_on_grid reports once
+    the last bucket has been joined.
+    """
+    filled_total = dict.fromkeys(variables, 0)
+    cells_total = 0
+
+    for bucket in range(n_buckets):
+        df, filled, n_out = join_bucket(spill_dir, variables, bucket, resolution, how)
+        cells_total += n_out
+        for variable in variables:
+            filled_total[variable] += filled[variable]
+
+        if df is not None:
+            yield df
+
+    if coverage is not None:
+        coverage.update({variable: filled_total[variable] / cells_total if cells_total else 0.0
+                         for variable in variables})
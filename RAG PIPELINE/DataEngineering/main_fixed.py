@@ -1,16 +1,27 @@
 # Main Pipeline Runner
 
-# Pipeline runner for Bronze → Silver → Gold.
+# Pipeline runner for Bronze → Silver → Gold → Enrichment → Platinum.
 import os
 import sys
+import argparse
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from utils_notebook import get_current_date_parts, parse_month, build_input_path, list_netcdf_files
 from silver_layer_fixed import process_and_save_netcdf
 from gold_layer_fixed import merge_silver_to_gold
+from geo_enrichment import enrich_gold_dataset
+from platinum_loader import load_platinum
+from argo_store import build_argo_store
+from pipeline_dag import Stage, run_dag
+from sharding import parse_shard, run_shard, finalize_shards, run_local_shards
 
 # Configuration with fallback
 try:
-    from config import SLIVER_CONFIG, BRONZE_LAYER, SILVER_LAYER, GOLD_LAYER
+    from config import (SLIVER_CONFIG, BRONZE_LAYER, SILVER_LAYER, GOLD_LAYER, REGION_OF_INTEREST,
+                        SILVER_PACKED_VARIABLES, GRID_RESOLUTION, GOLD_DATASET_NAME, GOLD_CUBE, GOLD_CUBE_NAME,
+                        GOLD_PYRAMID, GOLD_PYRAMID_NAME, ENRICHMENT_LAYERS, ENRICHMENT_RESOLUTION,
+                        PLATINUM_LOAD_MODE, TABLE_NAME, PIPELINE_STATE, RUN_REPORT_DIR, ARGO_MEASUREMENTS_CSV,
+                        ARGO_STORE_NAME, ARGO_VARIABLES)
 except ImportError:
     # Fallback configuration if config.ipynb can't be imported
     SLIVER_CONFIG = {
@@ -27,25 +38,144 @@ except ImportError:
     SILVER_LAYER = os.path.join(PROJECT_ROOT, 'Silver_Data')
     GOLD_LAYER = os.path.join(PROJECT_ROOT, 'Gold_Data')
 
-def run_pipeline():
+    REGION_OF_INTEREST = None
+    SILVER_PACKED_VARIABLES = []
+    GRID_RESOLUTION = 0.01
+    GOLD_DATASET_NAME = 'merged_gold'
+    GOLD_CUBE, GOLD_CUBE_NAME = True, 'gold_cube'
+    GOLD_PYRAMID, GOLD_PYRAMID_NAME = True, 'pyramid'
+    ENRICHMENT_LAYERS = []
+    ENRICHMENT_RESOLUTION = 0.05
+    PLATINUM_LOAD_MODE = 'upsert'
+    TABLE_NAME = "agro_kpi"
+    PIPELINE_STATE = os.path.join(PROJECT_ROOT, '_pipeline_state.json')
+    RUN_REPORT_DIR = os.path.join(PROJECT_ROOT, 'run_reports')
+    ARGO_MEASUREMENTS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Others',
+                                         'gold_fact_measurements.csv')
+    ARGO_STORE_NAME = 'argo_profiles'
+    ARGO_VARIABLES = ['pressure', 'temperature', 'salinity']
+
+def check_bronze(bronze_dirs):
+    """Fail early when no granules have landed in Bronze for the month"""
+    total = 0
+    for path in bronze_dirs:
+        count = len(list_netcdf_files(path)) if os.path.isdir(path) else 0
+        if count == 0:
+            print(f"[WARN] No NetCDF granules in {path}")
+        total += count
+
+    if total == 0:
+        raise FileNotFoundError("No Bronze granules found for this month")
+    print(f"[INFO] {total} Bronze granules ready")
+
+def build_stages(year, month, workers=1, incremental=False, platinum=False, resume=False, argo=False):
+    """Stage graph for one month of data; with resume Silver and gold continue from their checkpoints
+
+    The platinum (Postgres) load is only added with platinum=True, and the
+    Argo profile store (rebuilt from the measurements CSV, independent of
+    the month) only with argo=True.
+    """
+    bronze_dirs = [build_input_path(BRONZE_LAYER, year, month, folder) for folder in SLIVER_CONFIG]
+    silver_dirs = [build_input_path(SILVER_LAYER, year, month, folder) for folder in SLIVER_CONFIG]
+    dataset_path = os.path.join(GOLD_LAYER, GOLD_DATASET_NAME)
+    gold_outputs = [dataset_path]
+    if GOLD_CUBE:
+        gold_outputs.append(os.path.join(GOLD_LAYER, GOLD_CUBE_NAME))
+    if GOLD_PYRAMID:
+        gold_outputs.append(os.path.join(GOLD_LAYER, GOLD_PYRAMID_NAME))
+
+    stages = [
+        Stage('bronze', lambda: check_bronze(bronze_dirs), inputs=bronze_dirs),
+        Stage('silver',
+              lambda: process_and_save_netcdf(BRONZE_LAYER, SLIVER_CONFIG, SILVER_LAYER, 'parquet',
+                                              workers=workers, incremental=incremental, year=year, month=month,
+                                              resume=resume),
+              inputs=bronze_dirs, outputs=silver_dirs, depends_on=['bronze'],
+              params={'config': SLIVER_CONFIG, 'regions': REGION_OF_INTEREST, 'packed': SILVER_PACKED_VARIABLES}),
+        Stage('gold',
+              lambda: merge_silver_to_gold(SILVER_LAYER, SLIVER_CONFIG, GOLD_LAYER, 'parquet', enrich=False,
+                                           year=year, month=month, resume=resume),
+              inputs=silver_dirs, outputs=gold_outputs, depends_on=['silver'],
+              params={'resolution': GRID_RESOLUTION, 'cube': GOLD_CUBE, 'pyramid': GOLD_PYRAMID}),
+        Stage('enrichment', lambda: enrich_gold_dataset(dataset_path),
+              inputs=[dataset_path] + [layer['path'] for layer in ENRICHMENT_LAYERS], outputs=[dataset_path],
+              depends_on=['gold'], params={'resolution': ENRICHMENT_RESOLUTION}, rewrites_inputs=True),
+    ]
+    if argo:
+        argo_path = os.path.join(GOLD_LAYER, ARGO_STORE_NAME)
+        stages.append(Stage('argo', lambda: build_argo_store(ARGO_MEASUREMENTS_CSV, argo_path),
+                            inputs=[ARGO_MEASUREMENTS_CSV], outputs=[argo_path], params={'variables': ARGO_VARIABLES}))
+    if platinum:
+        stages.append(Stage('platinum', lambda: load_platinum(dataset_path), inputs=[dataset_path],
+                            depends_on=['enrichment'], params={'table': TABLE_NAME, 'mode': PLATINUM_LOAD_MODE}))
+    return stages
+
+def run_pipeline(workers=1, incremental=False, platinum=False, force=False, year=None, month=None, resume=False,
+                 argo=False):
     print("Starting Data Engineering Pipeline...")
     print("=" * 50)
 
-    try:
-        print("Step 1: Bronze → Silver...")
-        process_and_save_netcdf(BRONZE_LAYER, SLIVER_CONFIG, SILVER_LAYER, 'parquet')
-        print("Bronze → Silver completed successfully.\n")
+    if year is None or month is None:
+        year, month, day = get_current_date_parts()
 
-        print("Step 2: Silver → Gold...")
-        merge_silver_to_gold(SILVER_LAYER, SLIVER_CONFIG, GOLD_LAYER, 'parquet')
-        print("Silver → Gold completed successfully.\n")
+    try:
+        report = run_dag(build_stages(year, month, workers, incremental, platinum, resume, argo),
+                         PIPELINE_STATE, RUN_REPORT_DIR, force=force)
 
         print("=" * 50)
+        for entry in report['stages']:
+            print(f"{entry['name']:<12} {entry['status']:<8} {entry.get('wall_seconds', 0):>8.1f}s")
         print("Pipeline completed successfully!")
+        return report
 
     except Exception as e:
         print(f"[ERROR] Pipeline failed: {str(e)}")
         raise
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Bronze → Silver → Gold → Enrichment → Platinum pipeline")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Process-pool size for Bronze → Silver (1 = serial)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only extract new or changed granules, tracked by the Silver manifest")
+    parser.add_argument("--platinum", action="store_true",
+                        help="Also load the gold dataset into Postgres after enrichment")
+    parser.add_argument("--argo", action="store_true",
+                        help="Also rebuild the Argo profile store when the measurements CSV changed")
+    parser.add_argument("--force", action="store_true",
+                        help="Run every stage even when its inputs are unchanged")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run from its last checkpoints instead of starting over")
+    parser.add_argument("--month", help="Month to process as YYYY-MM (default: the current month); "
+                                        "see backfill.py for ranges")
+    shards = parser.add_mutually_exclusive_group()
+    shards.add_argument("--shard", metavar="I/N",
+                        help="Run only shard I of N (0-based): its (variable, file) pairs for Silver and its "
+                             "grid cells for Gold; finish with --finalize-shards N")
+    shards.add_argument("--finalize-shards", type=int, metavar="N",
+                        help="Stitch the outputs of N finished shards and run enrichment (and platinum with --platinum)")
+    shards.add_argument("--local-shards", type=int, metavar="N",
+                        help="Run N shards as local processes, then finalize")
+    args = parser.parse_args()
+    if args.incremental and (args.shard or args.finalize_shards or args.local_shards):
+        parser.error("--incremental cannot be combined with sharded runs")
+    return args
+
 if __name__ == "__main__":
-    run_pipeline()
+    args = parse_args()
+    year, month = parse_month(args.month) if args.month else (None, None)
+    if year is None:
+        year, month, day = get_current_date_parts()
+
+    # Shards share the layers but not the stage state, so they bypass the DAG
+    if args.shard:
+        index, count = parse_shard(args.shard)
+        run_shard(index, count, year, month, workers=args.workers)
+    elif args.finalize_shards:
+        finalize_shards(args.finalize_shards, year, month, platinum=args.platinum)
+    elif args.local_shards:
+        run_local_shards(args.local_shards, year, month, workers=args.workers, platinum=args.platinum)
+    else:
+        run_pipeline(workers=args.workers, incremental=args.incremental,
+                     platinum=args.platinum, force=args.force, year=year, month=month, resume=args.resume,
+                     argo=args.argo)
@@ -0,0 +1,95 @@
+# Processed-file manifest
+
+# Tracks which Bronze granules have already been extracted into Silver fragments.
+import os
+import json
+import hashlib
+from datetime import datetime
+
+from gold_dataset import manifest_lock
+
+MANIFEST_FILE = '_manifest.json'
+MANIFEST_LOCK = '_manifest.lock'
+FRAGMENTS_DIR = 'fragments'
+
+def content_hash(path, block_size=1 << 20):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(output_path):
+    """Load the manifest stored next to a silver output, or an empty one"""
+    manifest_path = os.path.join(output_path, MANIFEST_FILE)
+
+    if not os.path.exists(manifest_path):
+        return {'files': {}}
+
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(output_path, manifest):
+    """Write the manifest atomically so a crash never leaves it half-written"""
+    os.makedirs(output_path, exist_ok=True)
+    manifest_path = os.path.join(output_path, MANIFEST_FILE)
+    tmp_path = manifest_path + '.tmp'
+
+    manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def silver_manifest_lock(output_path):
+    """Exclusive lock on a silver folder's manifest and fragments
+
+    Held by incremental extraction and by compaction for their whole run,
+    so neither works from a manifest the other is rewriting.
+    """
+    return manifest_lock(output_path, lock_name=MANIFEST_LOCK)
+
+def plan_incremental(nc_files, input_path, manifest, params=None):
+    """Split granules into (changed, unchanged, removed) against the manifest
+
+    changed is a list of (relative path, fingerprint) for new or modified
+    files. Size and mtime are checked first; the content hash is only
+    computed when they differ, so untouched granules are never re-read.
+    params is the fingerprint of the extraction settings (variable,
+    regions, packing): an entry extracted with other settings counts as
+    changed whatever its file.
+    """
+    entries = manifest.get('files', {})
+    changed, unchanged = [], []
+    seen = set()
+
+    for nc_file in nc_files:
+        rel_path = os.path.relpath(nc_file, input_path).replace(os.sep, '/')
+        seen.add(rel_path)
+        stat = os.stat(nc_file)
+        entry = entries.get(rel_path)
+
+        if entry and entry.get('params') != params:
+            entry = None  # extracted with other settings, its fragment is replaced
+
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            unchanged.append(rel_path)
+            continue
+
+        sha256 = content_hash(nc_file)
+        if entry and entry['sha256'] == sha256:
+            # Touched but identical: refresh the stat fields only
+            entry['mtime'] = stat.st_mtime
+            unchanged.append(rel_path)
+            continue
+
+        changed.append((rel_path, {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256, 'params': params}))
+
+    removed = sorted(set(entries) - seen)
+    return changed, unchanged, removed
+
+def fragment_name(rel_path, sha256, params=None):
+    """Fragment file name for a granule version and its extraction settings"""
+    stem = os.path.splitext(rel_path.replace('/', '__'))[0]
+    suffix = f"-{params[:8]}" if params else ''
+    return f"{FRAGMENTS_DIR}/{stem}-{sha256[:12]}{suffix}.parquet"
@@ -0,0 +1,211 @@
+# Pipeline DAG
+
+# Small stage graph runner with input fingerprints, skip caching and a JSON run report.
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pyarrow.parquet as pq
+
+class Stage:
+    """One pipeline step: run() reads inputs and writes outputs (files or directories)"""
+
+    def __init__(self, name, run, inputs=(), outputs=(), depends_on=(), params=None, rewrites_inputs=False):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends_on = list(depends_on)
+        self.params = params or {}
+        # The stage writes to its own inputs (e.g. enrichment), so they are fingerprinted again after a run
+        self.rewrites_inputs = rewrites_inputs
+
+def _walk_files(paths):
+    """Every file under paths, skipping hidden staging files and directories"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if not name.startswith('.'):
+                        yield os.path.join(root, name)
+
+def path_stats(paths):
+    """(fingerprint, bytes, parquet rows) of a set of files/directories
+
+    The fingerprint covers the path, size and mtime of every file, so
+    it is cheap (stat only) and changes whenever a file is added, removed
+    or rewritten. Rows are read from parquet footers; None if there are no
+    parquet files.
+    """
+    digest = hashlib.sha256()
+    total_bytes, rows = 0, None
+
+    for file_path in _walk_files(paths):
+        stat = os.stat(file_path)
+        digest.update(f"{file_path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+        total_bytes += stat.st_size
+
+        if file_path.endswith('.parquet'):
+            try:
+                rows = (rows or 0) + pq.ParquetFile(file_path).metadata.num_rows
+            except Exception:
+                pass
+
+    return digest.hexdigest(), total_bytes, rows
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark for this process (Linux >= 4.0)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_bytes():
+    """Peak RSS since the last reset (VmHWM), or since process start as a fallback"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _children_peak_rss_bytes():
+    """Largest peak RSS among finished child processes (e.g. pool workers)"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+def _ordered(stages):
+    """Stages in dependency order (stable for independent stages)"""
+    by_name = {stage.name: stage for stage in stages}
+    ordered, done = [], set()
+
+    def visit(stage, trail):
+        if stage.name in done:
+            return
+        if stage.name in trail:
+            raise ValueError(f"Dependency cycle at stage {stage.name}")
+        for dep in stage.depends_on:
+            visit(by_name[dep], trail | {stage.name})
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage, set())
+    return ordered
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {'stages': {}}
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_state(state_path, state):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+def run_dag(stages, state_path, report_dir, force=False):
+    """Run stages in dependency order, skipping those whose inputs are unchanged
+
+    A stage is skipped when the fingerprint of its inputs and params matches
+    the one recorded for its last successful run and all its outputs still
+    exist. The fingerprint is taken before the run, so inputs that change
+    while a stage runs trigger it again next time. Stages that declare
+    rewrites_inputs (e.g. enrichment) are fingerprinted again after their
+    run, or they would never be skipped.
+    Downstream stages of a failed stage are marked blocked. A report with
+    wall time, rows, bytes and peak RSS per stage is written to report_dir;
+    the first error is re-raised after the report is saved.
+    """
+    state = load_state(state_path)
+    os.makedirs(report_dir, exist_ok=True)
+    started = datetime.now()
+    report = {'started_at': started.isoformat(timespec='seconds'), 'stages': []}
+    status = {}
+    first_error = None
+
+    for stage in _ordered(stages):
+        params_key = json.dumps(stage.params, sort_keys=True, default=str)
+        entry = {'name': stage.name}
+
+        if any(status.get(dep) in ('failed', 'blocked') for dep in stage.depends_on):
+            status[stage.name] = entry['status'] = 'blocked'
+            report['stages'].append(entry)
+            print(f"[WARN] Stage {stage.name} blocked by a failed dependency")
+            continue
+
+        fingerprint, bytes_in, rows_in = path_stats(stage.inputs)
+        fingerprint = hashlib.sha256((fingerprint + params_key).encode()).hexdigest()
+        recorded = state['stages'].get(stage.name, {})
+        outputs_exist = all(os.path.exists(path) for path in stage.outputs)
+
+        if not force and recorded.get('fingerprint') == fingerprint and outputs_exist:
+            status[stage.name] = entry['status'] = 'skipped'
+            report['stages'].append(entry)
+            print(f"[INFO] Stage {stage.name} skipped (inputs unchanged)")
+            continue
+
+        print(f"[INFO] Stage {stage.name} running...")
+        rss_reset = reset_peak_rss()
+        children_before = _children_peak_rss_bytes()
+        t0 = time.perf_counter()
+
+        try:
+            stage.run()
+            status[stage.name] = entry['status'] = 'ran'
+        except Exception as e:
+            status[stage.name] = entry['status'] = 'failed'
+            entry['error'] = str(e)
+            first_error = first_error or e
+            print(f"[ERROR] Stage {stage.name} failed: {str(e)}")
+
+        entry['wall_seconds'] = round(time.perf_counter() - t0, 3)
+        entry['peak_rss_mb'] = round(peak_rss_bytes() / 2**20, 1)
+        entry['peak_rss_scope'] = 'stage' if rss_reset else 'process'
+        children_peak = _children_peak_rss_bytes()
+        if children_peak > children_before:
+            entry['children_peak_rss_mb'] = round(children_peak / 2**20, 1)
+
+        _, bytes_out, rows_out = path_stats(stage.outputs)
+        entry.update({'rows_in': rows_in, 'rows_out': rows_out, 'bytes_in': bytes_in, 'bytes_out': bytes_out})
+        report['stages'].append(entry)
+
+        if entry['status'] == 'ran':
+            if stage.rewrites_inputs:
+                fingerprint, _, _ = path_stats(stage.inputs)
+                fingerprint = hashlib.sha256((fingerprint + params_key).encode()).hexdigest()
+            state['stages'][stage.name] = {
+                'fingerprint': fingerprint,
+                'finished_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            save_state(state_path, state)
+            print(f"[INFO] Stage {stage.name} finished in {entry['wall_seconds']:.1f}s, "
+                  f"peak RSS {entry['peak_rss_mb']} MB")
+
+    report['wall_seconds'] = round((datetime.now() - started).total_seconds(), 3)
+    report_path = os.path.join(report_dir, f"run-{started.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Run report written to {report_path}")
+
+    if first_error is not None:
+        raise first_error
+    return report
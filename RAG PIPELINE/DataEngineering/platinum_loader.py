@@ -0,0 +1,332 @@
+# Platinum Loader
+
+# Bulk gold → database loader: stream into a staging table, index it, swap it in.
+import io
+import os
+import sys
+import time
+import sqlite3
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+from config import POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, PLATINUM_INDEXES, PLATINUM_BATCH_SIZE, PLATINUM_KEY, PLATINUM_LOAD_MODE, TABLE_NAME
+from gold_dataset import load_partition_manifest
+
+LEDGER_SUFFIX = '__load_ledger'
+
+SQL_TYPES = {
+    'int8': 'SMALLINT',
+    'int16': 'SMALLINT',
+    'int32': 'INTEGER',
+    'int64': 'BIGINT',
+    'float': 'REAL',
+    'double': 'DOUBLE PRECISION',
+    'bool': 'BOOLEAN',
+    'string': 'TEXT',
+    'large_string': 'TEXT',
+}
+
+def _plain_type(arrow_type):
+    """Storage type used on the wire (categoricals travel as text)"""
+    return pa.string() if pa.types.is_dictionary(arrow_type) else arrow_type
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _column_list(names):
+    return ', '.join(_quote(name) for name in names)
+
+def _sql_type(arrow_type):
+    if pa.types.is_timestamp(arrow_type):
+        return 'TIMESTAMP'
+    return SQL_TYPES.get(str(_plain_type(arrow_type)), 'TEXT')
+
+def open_gold_source(source, batch_size=PLATINUM_BATCH_SIZE, filter=None):
+    """(schema, record batch iterator) for a parquet file, gold dataset dir or DataFrame"""
+    if isinstance(source, (str, os.PathLike)):
+        dataset = ds.dataset(source, format='parquet', partitioning='hive')
+        schema, batches = dataset.schema, dataset.to_batches(batch_size=batch_size, filter=filter)
+    else:
+        table = pa.Table.from_pandas(source, preserve_index=False)
+        schema, batches = table.schema, table.to_batches(max_chunksize=batch_size)
+
+    plain_schema = pa.schema([pa.field(f.name, _plain_type(f.type)) for f in schema])
+    return plain_schema, (batch.cast(plain_schema) for batch in batches)
+
+class PostgresBackend:
+    """COPY FROM STDIN into a staging table, then a transactional rename swap"""
+
+    placeholder = '%s'
+    distinct = 'IS DISTINCT FROM'
+
+    def __init__(self, url=None):
+        import psycopg2
+
+        if url is None:
+            url = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+        # Accept SQLAlchemy-style URLs as well as plain libpq ones
+        self.conn = psycopg2.connect(url.replace('postgresql+psycopg2://', 'postgresql://'))
+
+    @contextmanager
+    def transaction(self):
+        cur = self.conn.cursor()
+        try:
+            yield cur
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def table_exists(self, table_name):
+        with self.transaction() as cur:
+            cur.execute('SELECT to_regclass(%s)', (_quote(table_name),))
+            return cur.fetchone()[0] is not None
+
+    def table_columns(self, table_name):
+        with self.transaction() as cur:
+            cur.execute('SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() '
+                        'AND table_name = %s ORDER BY ordinal_position', (table_name,))
+            return [row[0] for row in cur.fetchall()]
+
+    def copy_batches(self, table_name, schema, batches):
+        columns = _column_list(schema.names)
+        rows = 0
+        with self.transaction() as cur:
+            for batch in batches:
+                buffer = io.BytesIO()
+                pacsv.write_csv(batch, buffer, pacsv.WriteOptions(include_header=False))
+                buffer.seek(0)
+                cur.copy_expert(f'COPY {_quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+                rows += batch.num_rows
+        return rows
+
+    def analyze(self, table_name):
+        with self.transaction() as cur:
+            cur.execute(f'ANALYZE {_quote(table_name)}')
+
+    def close(self):
+        self.conn.close()
+
+class SQLiteBackend:
+    """Local backend with the same staging/swap protocol, for tests and laptops"""
+
+    placeholder = '?'
+    distinct = 'IS NOT'
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        # WAL keeps readers on the previous snapshot while the load runs
+        self.conn.execute('PRAGMA journal_mode=WAL')
+
+    @contextmanager
+    def transaction(self):
+        cur = self.conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            yield cur
+            cur.execute('COMMIT')
+        except Exception:
+            cur.execute('ROLLBACK')
+            raise
+        finally:
+            cur.close()
+
+    def table_exists(self, table_name):
+        row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+        return row is not None
+
+    def table_columns(self, table_name):
+        return [row[1] for row in self.conn.execute(f'PRAGMA table_info({_quote(table_name)})')]
+
+    def copy_batches(self, table_name, schema, batches):
+        placeholders = ', '.join('?' for _ in schema)
+        rows = 0
+        with self.transaction() as cur:
+            for batch in batches:
+                columns = [column.to_numpy(zero_copy_only=False).tolist() for column in batch.columns]
+                cur.executemany(f'INSERT INTO {_quote(table_name)} VALUES ({placeholders})', zip(*columns))
+                rows += batch.num_rows
+        return rows
+
+    def analyze(self, table_name):
+        self.conn.execute(f'ANALYZE {_quote(table_name)}')
+
+    def close(self):
+        self.conn.close()
+
+def _create_table(backend, table_name, schema, temporary=False):
+    columns = ', '.join(f'{_quote(f.name)} {_sql_type(f.type)}' for f in schema)
+    with backend.transaction() as cur:
+        cur.execute(f'DROP TABLE IF EXISTS {_quote(table_name)}')
+        cur.execute(f'CREATE {"TEMPORARY " if temporary else ""}TABLE {_quote(table_name)} ({columns})')
+
+def _create_index(backend, table_name, index_name, columns, unique=False):
+    with backend.transaction() as cur:
+        cur.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {_quote(index_name)} '
+                    f'ON {_quote(table_name)} ({_column_list(columns)})')
+
+def _swap_table(backend, staging_name, table_name):
+    retired_name = f"{table_name}__old"
+    replacing = backend.table_exists(table_name)
+    with backend.transaction() as cur:
+        # DDL is transactional: readers see either the old or the new table
+        if replacing:
+            cur.execute(f'DROP TABLE IF EXISTS {_quote(retired_name)}')
+            cur.execute(f'ALTER TABLE {_quote(table_name)} RENAME TO {_quote(retired_name)}')
+        cur.execute(f'ALTER TABLE {_quote(staging_name)} RENAME TO {_quote(table_name)}')
+        if replacing:
+            cur.execute(f'DROP TABLE {_quote(retired_name)}')
+
+def load_table(source, table_name, backend, index_columns=PLATINUM_INDEXES, batch_size=PLATINUM_BATCH_SIZE):
+    """Replace table_name with the gold data in source without read downtime
+
+    Rows are streamed batch by batch into <table>__staging, indexes are
+    built there, and the staging table is renamed over the live one in a
+    single transaction. Index names carry a load id so they never clash
+    with the indexes of the table being replaced.
+    """
+    start = time.time()
+    staging_name = f"{table_name}__staging"
+    load_id = format(time.time_ns() // 1_000_000, 'x')
+
+    schema, batches = open_gold_source(source, batch_size)
+    _create_table(backend, staging_name, schema)
+    rows = backend.copy_batches(staging_name, schema, batches)
+    print(f"[INFO] Copied {rows} rows into {staging_name} in {time.time() - start:.1f}s")
+
+    for columns in index_columns:
+        if all(col in schema.names for col in columns):
+            _create_index(backend, staging_name, f"{table_name}_{'_'.join(columns)}_{load_id}", columns)
+    backend.analyze(staging_name)
+
+    _swap_table(backend, staging_name, table_name)
+    print(f"[SUCCESS] Loaded {rows} rows into {table_name} in {time.time() - start:.1f}s")
+    return rows
+
+def _ensure_ledger(backend, ledger_name):
+    with backend.transaction() as cur:
+        cur.execute(f'CREATE TABLE IF NOT EXISTS {_quote(ledger_name)} '
+                    '(partition_key TEXT PRIMARY KEY, sha256 TEXT, rows BIGINT, loaded_at TEXT)')
+
+def _record_partition(backend, cur, ledger_name, key, entry):
+    p = backend.placeholder
+    cur.execute(f'DELETE FROM {_quote(ledger_name)} WHERE partition_key = {p}', (key,))
+    cur.execute(f'INSERT INTO {_quote(ledger_name)} VALUES ({p}, {p}, {p}, {p})',
+                (key, entry['sha256'], entry['rows'], time.strftime('%Y-%m-%dT%H:%M:%S')))
+
+def _merge_partition(backend, cur, table_name, delta_name, entry, columns, key_columns):
+    """Delete rows gone from the partition, then upsert the delta; returns rows written"""
+    p = backend.placeholder
+    table, delta = _quote(table_name), _quote(delta_name)
+
+    matches_key = ' AND '.join(f'{delta}.{_quote(c)} = {table}.{_quote(c)}' for c in key_columns)
+    cur.execute(f'DELETE FROM {table} WHERE "year" = {p} AND "month" = {p} AND "lat_band" = {p} '
+                f'AND NOT EXISTS (SELECT 1 FROM {delta} WHERE {matches_key})',
+                (entry['year'], entry['month'], entry['lat_band']))
+    deleted = cur.rowcount
+
+    values = [c for c in columns if c not in key_columns]
+    assignments = ', '.join(f'{_quote(c)} = excluded.{_quote(c)}' for c in values)
+    # Unchanged rows are skipped so their tuples (and cached pages) stay untouched
+    changed = ' OR '.join(f'{table}.{_quote(c)} {backend.distinct} excluded.{_quote(c)}' for c in values)
+    cur.execute(f'INSERT INTO {table} ({_column_list(columns)}) SELECT {_column_list(columns)} FROM {delta} WHERE 1 = 1 '
+                f'ON CONFLICT ({_column_list(key_columns)}) DO UPDATE SET {assignments} WHERE {changed}')
+    return deleted, cur.rowcount
+
+def upsert_gold_dataset(dataset_path, table_name, backend, key_columns=PLATINUM_KEY, batch_size=PLATINUM_BATCH_SIZE):
+    """Bring table_name up to date with the gold dataset, touching only changed partitions
+
+    A ledger table (<table>__load_ledger) remembers the sha256 of every
+    year/month/lat_band partition last loaded. Partitions whose checksum in
+    the gold partition manifest differs are merged on key_columns in one
+    transaction each; partitions no longer in the manifest are deleted.
+    The first run (no table yet) and a change of the gold columns (e.g.
+    new enrichment layers) fall back to a full load_table and a fresh
+    ledger, since the merge statements follow the table's columns.
+    """
+    start = time.time()
+    partitions = load_partition_manifest(dataset_path).get('partitions', {})
+    ledger_name = table_name + LEDGER_SUFFIX
+    _ensure_ledger(backend, ledger_name)
+
+    full_load = not backend.table_exists(table_name)
+    if full_load:
+        print(f"[INFO] {table_name} does not exist yet, running a full load")
+    elif partitions:
+        schema, _ = open_gold_source(dataset_path, batch_size)
+        table_columns = backend.table_columns(table_name)
+        if set(schema.names) != set(table_columns):
+            added = sorted(set(schema.names) - set(table_columns))
+            dropped = sorted(set(table_columns) - set(schema.names))
+            print(f"[INFO] Gold columns changed (added {added}, dropped {dropped}), reloading {table_name} in full")
+            full_load = True
+
+    if full_load:
+        load_table(dataset_path, table_name, backend, batch_size=batch_size)
+        _create_index(backend, table_name, f"{table_name}_upsert_key", key_columns, unique=True)
+        with backend.transaction() as cur:
+            cur.execute(f'DELETE FROM {_quote(ledger_name)}')
+            for key, entry in sorted(partitions.items()):
+                _record_partition(backend, cur, ledger_name, key, entry)
+        return {'changed': len(partitions), 'removed': 0, 'rows_written': sum(e['rows'] for e in partitions.values())}
+
+    # ON CONFLICT needs a unique index on the merge key
+    _create_index(backend, table_name, f"{table_name}_upsert_key", key_columns, unique=True)
+
+    with backend.transaction() as cur:
+        cur.execute(f'SELECT partition_key, sha256 FROM {_quote(ledger_name)}')
+        ledger = dict(cur.fetchall())
+
+    changed = [key for key in sorted(partitions) if ledger.get(key) != partitions[key]['sha256']]
+    removed = sorted(set(ledger) - set(partitions))
+    delta_name = f"{table_name}__delta"
+    rows_written = 0
+
+    for key in changed:
+        entry = partitions[key]
+        part_filter = ((ds.field('year') == entry['year']) & (ds.field('month') == entry['month'])
+                       & (ds.field('lat_band') == entry['lat_band']))
+        schema, batches = open_gold_source(dataset_path, batch_size, filter=part_filter)
+
+        _create_table(backend, delta_name, schema, temporary=True)
+        backend.copy_batches(delta_name, schema, batches)
+        _create_index(backend, delta_name, f"{delta_name}_key", key_columns)
+        with backend.transaction() as cur:
+            deleted, written = _merge_partition(backend, cur, table_name, delta_name, entry, schema.names, key_columns)
+            _record_partition(backend, cur, ledger_name, key, entry)
+            cur.execute(f'DROP TABLE {_quote(delta_name)}')
+
+        rows_written += written
+        print(f"[INFO] Merged {key}: {written} rows written, {deleted} rows deleted")
+
+    for key in removed:
+        year, month, lat_band = (int(part.split('=')[1]) for part in key.split('/'))
+        p = backend.placeholder
+        with backend.transaction() as cur:
+            cur.execute(f'DELETE FROM {_quote(table_name)} WHERE "year" = {p} AND "month" = {p} AND "lat_band" = {p}',
+                        (year, month, lat_band))
+            cur.execute(f'DELETE FROM {_quote(ledger_name)} WHERE partition_key = {p}', (key,))
+        print(f"[INFO] Removed partition {key}")
+
+    if changed or removed:
+        backend.analyze(table_name)
+
+    print(f"[SUCCESS] Upserted {table_name}: {len(changed)} changed, {len(removed)} removed, "
+          f"{len(partitions) - len(changed)} unchanged partitions in {time.time() - start:.1f}s")
+    return {'changed': len(changed), 'removed': len(removed), 'rows_written': rows_written}
+
+def load_platinum(dataset_path, table_name=TABLE_NAME, mode=PLATINUM_LOAD_MODE):
+    """Load the gold dataset into Postgres with the configured mode ('upsert' or 'replace')"""
+    backend = PostgresBackend()
+    try:
+        if mode == 'upsert':
+            return upsert_gold_dataset(dataset_path, table_name, backend)
+        return load_table(dataset_path, table_name, backend)
+    finally:
+        backend.close()
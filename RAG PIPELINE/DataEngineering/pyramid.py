@@ -0,0 +1,173 @@
+# Aggregation Pyramid
+
+# Per-month mean/min/max/count of each variable at several grid resolutions.
+import os
+import json
+import shutil
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from gold_dataset import (write_partition, gold_filter, read_gold_dataset, load_partition_manifest,
+                          read_with_retry, _swap_directory)
+
+PYRAMID_INDEX = 'index.json'
+AGGREGATES = ['mean', 'min', 'max', 'count']
+
+def aggregate_level(df, variables, resolution):
+    """Aggregate one month of gold rows onto cells of the given size (degrees)"""
+    cell_lat = (np.floor(df['lat'].to_numpy(dtype=np.float64) / resolution) + 0.5) * resolution
+    cell_lon = (np.floor(df['lon'].to_numpy(dtype=np.float64) / resolution) + 0.5) * resolution
+
+    grouped = df[variables].groupby([cell_lat, cell_lon], sort=True).agg(AGGREGATES)
+    grouped.columns = [f"{var}_{agg}" for var, agg in grouped.columns]
+    grouped.index.names = ['lat', 'lon']
+
+    out = grouped.reset_index()
+    for col in out.columns:
+        if col.endswith('_count'):
+            out[col] = out[col].astype(np.int32)
+        else:
+            out[col] = out[col].astype(np.float32)
+    return out
+
+def _month_levels(dataset, variables, levels, year, month):
+    """(level name, aggregated cells) of one gold month for every non-native level"""
+    month_filter = (ds.field('year') == int(year)) & (ds.field('month') == int(month))
+    df = dataset.to_table(columns=['lat', 'lon'] + variables, filter=month_filter).to_pandas()
+
+    for name, resolution in levels.items():
+        if resolution is not None:
+            yield name, pa.Table.from_pandas(aggregate_level(df, variables, resolution), preserve_index=False)
+
+def _month_partition(pyramid_path, name, year, month):
+    return os.path.join(pyramid_path, f"level={name}", f"year={int(year)}", f"month={int(month)}")
+
+def build_pyramid(dataset_path, pyramid_path, variables, levels, native_resolution, months=None):
+    """Build or update aggregate levels from the partitioned gold dataset, one month at a time
+
+    levels maps a level name to its cell size in degrees. The native level
+    is not copied: it is served from the gold dataset itself. months lists
+    the (year, month) pairs whose gold partitions changed: if the pyramid
+    already has the same levels and variables, only those month
+    partitions are rebuilt, each swapped in by rename (or removed when
+    the month is now empty). Otherwise, and with months None, the whole
+    pyramid is rebuilt next to the old one and swapped in.
+    """
+    dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+    variables = [var for var in variables if var in dataset.schema.names]
+    present = sorted({(entry['year'], entry['month'])
+                      for entry in load_partition_manifest(dataset_path).get('partitions', {}).values()
+                      if entry['rows']})
+
+    index = {
+        'levels': {name: (native_resolution if resolution is None else resolution)
+                   for name, resolution in levels.items()},
+        'native_level': next((name for name, resolution in levels.items() if resolution is None), None),
+        'variables': variables,
+    }
+    # Round-trip through JSON so tuples and floats compare like the stored index
+    index = json.loads(json.dumps(index))
+
+    if months is not None:
+        months = sorted({(int(year), int(month)) for year, month in months})
+
+    if months is not None and os.path.exists(os.path.join(pyramid_path, PYRAMID_INDEX)) \
+            and load_pyramid_index(pyramid_path) == index:
+        for year, month in months:
+            if (year, month) not in present:
+                for name, resolution in levels.items():
+                    shutil.rmtree(_month_partition(pyramid_path, name, year, month), ignore_errors=True)
+                continue
+            for name, table in _month_levels(dataset, variables, levels, year, month):
+                partition = _month_partition(pyramid_path, name, year, month)
+                # Hidden staging name, so dataset discovery skips it
+                staging = os.path.join(os.path.dirname(partition), f".staging-month={int(month)}")
+                shutil.rmtree(staging, ignore_errors=True)
+                write_partition(table, staging)
+                _swap_directory(staging, partition)
+
+        print(f"[INFO] Aggregation pyramid updated: {len(months)} of {len(present)} months rebuilt")
+        return pyramid_path
+
+    staging_path = pyramid_path + '.staging'
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+
+    for year, month in present:
+        for name, table in _month_levels(dataset, variables, levels, year, month):
+            write_partition(table, _month_partition(staging_path, name, year, month))
+
+    with open(os.path.join(staging_path, PYRAMID_INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+    _swap_directory(staging_path, pyramid_path)
+
+    print(f"[INFO] Aggregation pyramid built: {len(present)} months, levels {list(levels)}")
+    return pyramid_path
+
+def _read_index(pyramid_path):
+    with open(os.path.join(pyramid_path, PYRAMID_INDEX)) as f:
+        return json.load(f)
+
+def load_pyramid_index(pyramid_path):
+    return read_with_retry(lambda: _read_index(pyramid_path))
+
+def select_pyramid_level(index, lat_range=None, lon_range=None, max_cells=5000):
+    """Finest level whose per-month cell count over the extent stays under max_cells"""
+    lat_span = (lat_range[1] - lat_range[0]) if lat_range else 180.0
+    lon_span = (lon_range[1] - lon_range[0]) if lon_range else 360.0
+
+    levels = sorted(index['levels'].items(), key=lambda item: item[1])
+    for name, resolution in levels:
+        cells = max(lat_span / resolution, 1) * max(lon_span / resolution, 1)
+        if cells <= max_cells:
+            return name
+
+    return levels[-1][0]
+
+def load_pyramid_level(pyramid_path, gold_dataset_path, level, lat_range=None, lon_range=None, time_range=None):
+    """Aggregated cells of one level, filtered by extent and (year, month) range"""
+    index = load_pyramid_index(pyramid_path)
+
+    if level == index['native_level']:
+        # Native cells are gold rows: mean = min = max = value, count = 1
+        df = read_gold_dataset(gold_dataset_path, lat_range, lon_range, time_range,
+                               columns=['lat', 'lon', 'year', 'month'] + index['variables'])
+        for var in index['variables']:
+            values = df.pop(var)
+            df[f"{var}_mean"] = values
+            df[f"{var}_min"] = values
+            df[f"{var}_max"] = values
+            df[f"{var}_count"] = np.int32(1)
+        return df
+
+    expr = gold_filter(lat_range, lon_range, time_range, lat_band_size=None)
+    # A month partition being swapped in can vanish between listing and reading
+    return read_with_retry(lambda: ds.dataset(os.path.join(pyramid_path, f"level={level}"), format='parquet',
+                                              partitioning='hive').to_table(filter=expr).to_pandas())
+
+def load_map_cells(pyramid_path, gold_dataset_path, lat_range=None, lon_range=None, time_range=None, max_cells=5000):
+    """Pick the level for the requested extent and load its cells
+
+    Returns (df, level name) with one row per cell and month; see
+    collapse_months for one row per cell.
+    """
+    level = select_pyramid_level(load_pyramid_index(pyramid_path), lat_range, lon_range, max_cells)
+    return load_pyramid_level(pyramid_path, gold_dataset_path, level, lat_range, lon_range, time_range), level
+
+def collapse_months(cells, variables):
+    """Merge the months of a level into one row per cell (count-weighted means)"""
+    weighted = cells[['lat', 'lon']].copy()
+    for var in variables:
+        weighted[f"{var}_sum"] = cells[f"{var}_mean"].astype(np.float64) * cells[f"{var}_count"]
+        weighted[f"{var}_min"] = cells[f"{var}_min"]
+        weighted[f"{var}_max"] = cells[f"{var}_max"]
+        weighted[f"{var}_count"] = cells[f"{var}_count"]
+
+    grouped = weighted.groupby(['lat', 'lon'], sort=True)
+    out = grouped[[f"{var}_count" for var in variables] + [f"{var}_sum" for var in variables]].sum()
+    for var in variables:
+        out[f"{var}_min"] = grouped[f"{var}_min"].min()
+        out[f"{var}_max"] = grouped[f"{var}_max"].max()
+        out[f"{var}_mean"] = (out.pop(f"{var}_sum") / out[f"{var}_count"]).astype(np.float32)
+    return out.reset_index()
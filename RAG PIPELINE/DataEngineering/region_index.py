@@ -0,0 +1,134 @@
+# Marine Region Index
+
+# Named seas and basins rasterized onto the gold cube grid for region-scoped aggregates.
+import os
+import re
+import json
+import numpy as np
+
+from geo_enrichment import rasterize_polygon
+
+REGION_INDEX = 'regions.json'
+REGION_CELLS = 'regions.npz'
+
+def _load_region_polygons(path, name_property='name'):
+    """{name: (aliases, [polygon rings, ...])} from a GeoJSON file"""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    regions = {}
+    for feature in collection['features']:
+        properties = feature.get('properties') or {}
+        geometry = feature.get('geometry') or {}
+        name = properties.get(name_property)
+        if name is None or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            continue
+
+        parts = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        aliases, polygons = regions.setdefault(name, (set(), []))
+        aliases.update(properties.get('aliases') or [])
+        polygons.extend([np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings] for rings in parts)
+
+    return regions
+
+def build_region_index(cube_path, region_files):
+    """Rasterize named regions onto the cube grid and store their cell sets in the cube
+
+    Each region is kept as the sorted flat cell ids (row * n_lon + col) of
+    the cube cells whose centre lies inside it, plus its row/column bounding
+    box, so aggregates only read that window of the cube arrays.
+    """
+    with open(os.path.join(cube_path, 'index.json')) as f:
+        cube_index = json.load(f)
+    n_lat, n_lon = cube_index['n_lat'], cube_index['n_lon']
+
+    regions = {}
+    for path in region_files:
+        regions.update(_load_region_polygons(path))
+
+    index, cells = {}, {}
+    for name, (aliases, polygons) in sorted(regions.items()):
+        mask = np.zeros((n_lat, n_lon), dtype=bool)
+        for rings in polygons:
+            rasterize_polygon(mask, rings, True, cube_index['lat0'], cube_index['lon0'],
+                              cube_index['lat_resolution'], cube_index['lon_resolution'])
+
+        rows, cols = np.nonzero(mask)
+        if len(rows) == 0:
+            continue
+
+        cells[name] = (rows * n_lon + cols).astype(np.int64)
+        index[name] = {
+            'aliases': sorted(aliases),
+            'cells': int(len(rows)),
+            'bbox': [int(rows.min()), int(rows.max()) + 1, int(cols.min()), int(cols.max()) + 1],
+        }
+
+    np.savez(os.path.join(cube_path, REGION_CELLS), **cells)
+    with open(os.path.join(cube_path, REGION_INDEX), 'w') as f:
+        json.dump({'regions': index}, f, indent=2)
+
+    print(f"[INFO] Region index built: {len(index)} regions on the gold cube grid")
+    return index
+
+class RegionIndex:
+    """Named region lookups and masked aggregates over a GoldCube"""
+
+    def __init__(self, cube_path):
+        with open(os.path.join(cube_path, REGION_INDEX)) as f:
+            self.regions = json.load(f)['regions']
+        with np.load(os.path.join(cube_path, REGION_CELLS)) as data:
+            self.cells = {name: data[name] for name in data.files}
+
+        # Longest names first so "Arabian Sea" wins over a shorter overlapping alias
+        names = {name.lower(): name for name in self.regions}
+        for name, entry in self.regions.items():
+            names.update({alias.lower(): name for alias in entry['aliases']})
+        self._patterns = [(re.compile(r'\b' + re.escape(key) + r'\b'), name)
+                          for key, name in sorted(names.items(), key=lambda item: -len(item[0]))]
+
+    @staticmethod
+    def exists(cube_path):
+        return os.path.exists(os.path.join(cube_path, REGION_INDEX))
+
+    def resolve(self, text):
+        """Region named in free text (name or alias, case-insensitive), or None"""
+        text = text.lower()
+        for pattern, name in self._patterns:
+            if pattern.search(text):
+                return name
+        return None
+
+    def aggregate(self, cube, region, variables=None, time_range=None):
+        """Mean/min/max/count of each variable over a region's cells
+
+        time_range is ((start_year, start_month), (end_year, end_month)),
+        inclusive, or None for every month in the cube. Only the region's
+        bounding-box window of the selected months is read from the cube.
+        """
+        variables = variables or cube.variables
+        if time_range is None:
+            t_idx = list(range(len(cube.times)))
+        else:
+            start, end = (tuple(t) for t in time_range)
+            t_idx = [i for i, t in enumerate(cube.times) if start <= t <= end]
+
+        r0, r1, c0, c1 = self.regions[region]['bbox']
+        rows, cols = np.divmod(self.cells[region], cube.n_lon)
+        rows, cols = rows - r0, cols - c0
+
+        result = {'region': region, 'cells': self.regions[region]['cells'],
+                  'months': [cube.times[i] for i in t_idx], 'variables': {}}
+        for var in variables:
+            if not t_idx:
+                break
+            values = cube.arrays[var][t_idx, r0:r1, c0:c1][:, rows, cols]
+            valid = ~np.isnan(values)
+            count = int(valid.sum())
+            result['variables'][var] = {
+                'mean': float(np.nanmean(values)) if count else None,
+                'min': float(np.nanmin(values)) if count else None,
+                'max': float(np.nanmax(values)) if count else None,
+                'count': count,
+            }
+        return result
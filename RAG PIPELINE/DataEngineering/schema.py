@@ -0,0 +1,126 @@
+# Schema Registry
+
+# Enforces config.COLUMN_SCHEMA storage dtypes on pipeline frames.
+import os
+import sys
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from config import COLUMN_SCHEMA
+
+# Packed columns keep the raw integers of a scale_factor/add_offset encoded NetCDF
+# variable; their encodings travel in df.attrs and in the parquet schema metadata
+PACKED_ATTR = 'packed'
+PACKING_METADATA_KEY = b'silver_packing'
+
+def packed_encodings(df):
+    """{column: encoding} of the packed integer columns of a frame"""
+    packed = df.attrs.get(PACKED_ATTR) or {}
+    return {col: encoding for col, encoding in packed.items() if col in df.columns}
+
+def enforce_schema(df, schema=COLUMN_SCHEMA):
+    """Cast registered columns to their storage dtype; other columns and packed columns pass through"""
+    if df is None:
+        return df
+
+    packed = packed_encodings(df)
+    casts = {col: dtype for col, dtype in schema.items()
+             if col in df.columns and col not in packed and str(df[col].dtype) != dtype}
+
+    return df.astype(casts) if casts else df
+
+def pack_values(values, encoding):
+    """Encode float values as the integers of an encoding, rounded and clipped to the integer range"""
+    dtype = np.dtype(encoding['dtype'])
+    info = np.iinfo(dtype)
+    packed = np.rint((np.asarray(values, dtype=np.float64) - encoding['add_offset']) / encoding['scale_factor'])
+    return np.clip(packed, info.min, info.max).astype(dtype)
+
+def unpack_values(values, encoding, dtype=np.float64):
+    """Decode packed integers: value * scale_factor + add_offset"""
+    decoded = np.asarray(values, dtype=np.float64) * encoding['scale_factor'] + encoding['add_offset']
+    return decoded if decoded.dtype == np.dtype(dtype) else decoded.astype(dtype)
+
+def column_values(df, column, dtype=np.float64):
+    """Values of a column as floats, decoding it if it is packed"""
+    encoding = packed_encodings(df).get(column)
+    if encoding is None:
+        return df[column].to_numpy(dtype=dtype)
+    return unpack_values(df[column].to_numpy(), encoding, dtype)
+
+def decode_packed(df, columns=None):
+    """Replace packed columns (all, or those in columns) by their decoded values in the storage dtype"""
+    packed = packed_encodings(df)
+    remaining = {}
+
+    for col, encoding in packed.items():
+        if columns is not None and col not in columns:
+            remaining[col] = encoding
+            continue
+        df[col] = unpack_values(df[col].to_numpy(), encoding, COLUMN_SCHEMA.get(col, 'float32'))
+
+    df.attrs[PACKED_ATTR] = remaining
+    return df
+
+def align_packing(df, reference):
+    """Bring a frame's columns to the reference encodings
+
+    Columns packed differently (or stored as floats) are re-packed to
+    their reference encoding; packed columns without one are decoded.
+    """
+    encodings = packed_encodings(df)
+    changes = {}
+
+    for col in df.columns:
+        encoding, target = encodings.get(col), reference.get(col)
+        if encoding == target:
+            continue
+        if target is None:
+            changes[col] = unpack_values(df[col].to_numpy(), encoding, COLUMN_SCHEMA.get(col, 'float32'))
+        else:
+            print(f"[WARN] Re-packing {col} to scale_factor={target['scale_factor']}, "
+                  f"add_offset={target['add_offset']}")
+            changes[col] = pack_values(column_values(df, col), target)
+
+    if not changes:
+        return df
+    df = df.assign(**changes)
+    df.attrs[PACKED_ATTR] = {col: encoding for col, encoding in reference.items() if col in df.columns}
+    return df
+
+def concat_frames(frames):
+    """pd.concat that keeps packed columns packed
+
+    The first frame holding a packed column fixes its encoding; frames
+    packed differently (or stored as floats) are re-packed to it, so every
+    row of the result shares one scale_factor/add_offset.
+    """
+    reference = {}
+    for df in frames:
+        for col, encoding in packed_encodings(df).items():
+            reference.setdefault(col, encoding)
+
+    result = pd.concat([align_packing(df, reference) for df in frames], ignore_index=True)
+    result.attrs[PACKED_ATTR] = reference
+    return result
+
+def to_arrow_table(df):
+    """Arrow table of a frame, with the encodings of its packed columns in the schema metadata"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    packed = packed_encodings(df)
+    if packed:
+        metadata = dict(table.schema.metadata or {})
+        metadata[PACKING_METADATA_KEY] = json.dumps(packed).encode()
+        table = table.replace_schema_metadata(metadata)
+    return table
+
+def read_packing(schema):
+    """Packed-column encodings recorded in a parquet/arrow schema"""
+    metadata = schema.metadata or {}
+    if PACKING_METADATA_KEY not in metadata:
+        return {}
+    return json.loads(metadata[PACKING_METADATA_KEY])
@@ -0,0 +1,277 @@
+# Sharded Runs
+
+# Splits one month's Bronze → Silver → Gold run over N processes or machines sharing the data layers.
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import subprocess
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pyarrow.parquet as pq
+
+from utils_notebook import month_date_parts, build_input_path, build_output_path, list_netcdf_files, iter_parquet_batches
+from silver_layer_fixed import PARTS_DIR, _run_file_tasks, _merge_parts
+from join_engine import bucket_count, spill_to_buckets, join_buckets
+from gold_dataset import write_month_frames, scan_month_entries, commit_month
+from backfill import finalize_backfill
+
+from config import (SLIVER_CONFIG, BRONZE_LAYER, SILVER_LAYER, GOLD_LAYER, NETCDF_CHUNK_SIZE, RECORD_BATCH_SIZE,
+                    REGION_OF_INTEREST, SILVER_PACKED_VARIABLES, GRID_RESOLUTION, GOLD_PARTITIONED, GOLD_DATASET_NAME,
+                    GOLD_LAT_BAND_SIZE, GOLD_ROW_GROUP_SIZE, GOLD_MEMORY_BUDGET, SHARD_WAIT_TIMEOUT)
+
+SHARDS_DIR = '_shards'
+POLL_SECONDS = 10
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main_fixed.py')
+
+def parse_shard(text):
+    """(index, count) from an 'i/N' string, with 0 <= i < N"""
+    try:
+        index, count = (int(part) for part in str(text).split('/'))
+    except ValueError:
+        raise ValueError(f"Expected a shard as i/N, got {text!r}")
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index out of range in {text!r} (0 <= i < N)")
+    return index, count
+
+def shard_of(key, count):
+    """Shard owning a work key; stable across processes and machines (unlike hash())"""
+    return zlib.crc32(key.encode()) % count
+
+def plan_silver_tasks(date_parts, config=SLIVER_CONFIG, chunk_size=NETCDF_CHUNK_SIZE, batch_size=RECORD_BATCH_SIZE,
+                      regions=REGION_OF_INTEREST, packed=SILVER_PACKED_VARIABLES):
+    """(key, task) for every (variable, file) pair of the month
+
+    Tasks and part paths are those of a process-pool Silver run, so every
+    shard writes its parts to the same _parts directories and the merge
+    keeps the sorted file order. Keys are "folder/file name".
+    """
+    year, month = date_parts['year'], date_parts['month']
+    tasks = []
+
+    for folder_name, variable in config.items():
+        input_path = build_input_path(BRONZE_LAYER, year, month, folder_name)
+        parts_dir = os.path.join(SILVER_LAYER, str(year), str(month).zfill(2), folder_name, PARTS_DIR)
+
+        for index, nc_file in enumerate(list_netcdf_files(input_path)):
+            part_path = os.path.join(parts_dir, f"{index:05d}_{nc_file.stem}.parquet")
+            tasks.append((f"{folder_name}/{nc_file.name}",
+                          (str(nc_file), variable, date_parts, part_path, chunk_size, batch_size, regions, packed)))
+    return tasks
+
+def plan_fingerprint(tasks, count):
+    """Fingerprint of a shard plan: the shard count and the key, size and mtime of every granule
+
+    Shards only stitch together outputs made from the same Bronze files
+    split the same way.
+    """
+    digest = hashlib.sha256(f"{count}\n".encode())
+    for key, task in tasks:
+        stat = os.stat(task[0])
+        digest.update(f"{key}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def _markers_dir(year, month):
+    return os.path.join(SILVER_LAYER, str(year), str(month).zfill(2), SHARDS_DIR)
+
+def _marker_path(step, index, count, year, month):
+    return os.path.join(_markers_dir(year, month), f"{step}-{index:03d}-of-{count:03d}.json")
+
+def _write_marker(step, index, count, year, month, record):
+    """Record a finished shard step; written last so its presence means the outputs are complete"""
+    path = _marker_path(step, index, count, year, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(dict(record, step=step, shard=index, shards=count), f, indent=2)
+    os.replace(tmp_path, path)
+
+def _read_markers(step, count, year, month, plan):
+    """{index: record} of the shards whose step finished for this plan"""
+    markers = {}
+    for index in range(count):
+        path = _marker_path(step, index, count, year, month)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            record = json.load(f)
+        if record.get('plan') == plan:
+            markers[index] = record
+    return markers
+
+def wait_for_shards(step, count, year, month, plan, timeout=SHARD_WAIT_TIMEOUT):
+    """Poll the shared markers until every shard finished step; returns {index: record}"""
+    deadline = time.monotonic() + (timeout or 0)
+    while True:
+        markers = _read_markers(step, count, year, month, plan)
+        if len(markers) == count:
+            return markers
+        if time.monotonic() >= deadline:
+            missing = [index for index in range(count) if index not in markers]
+            raise TimeoutError(f"{step} output of shards {missing} (of {count}) not ready for "
+                               f"{year}-{int(month):02d}")
+        time.sleep(POLL_SECONDS)
+
+def _gold_shards_dir(year, month):
+    return os.path.join(GOLD_LAYER, GOLD_DATASET_NAME, f".shards-{int(year)}-{int(month)}")
+
+def run_silver_shard(index, count, year, month, workers=1):
+    """Extract this shard's (variable, file) pairs into Silver parts; returns rows written
+
+    Pairs are assigned by a hash of their key, so every process computes
+    the same split without talking to the others. Failed files are
+    reported and recorded in the shard's marker, as a pool run would.
+    """
+    date_parts = month_date_parts(year, month)
+    tasks = plan_silver_tasks(date_parts)
+    plan = plan_fingerprint(tasks, count)
+    mine = [task for key, task in tasks if shard_of(key, count) == index]
+
+    marker_path = _marker_path('silver', index, count, year, month)
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+
+    # Only this shard's own stale parts are removed; the directory is shared
+    for task in mine:
+        os.makedirs(os.path.dirname(task[3]), exist_ok=True)
+        if os.path.exists(task[3]):
+            os.remove(task[3])
+
+    print(f"[INFO] Shard {index}/{count}: {len(mine)} of {len(tasks)} (variable, file) pairs")
+    results = _run_file_tasks(mine, workers)
+    rows = sum(results.values())
+    failed = [task[0] for task in mine if task[3] not in results]
+
+    _write_marker('silver', index, count, year, month, {'plan': plan, 'rows': rows, 'files': len(mine),
+                                                         'failed': failed})
+    print(f"[INFO] Shard {index}/{count}: {rows} Silver rows from {len(mine) - len(failed)} files")
+    return rows
+
+def run_gold_shard(index, count, year, month, memory_budget=GOLD_MEMORY_BUDGET, timeout=SHARD_WAIT_TIMEOUT):
+    """Join this shard's grid cells from every shard's Silver parts; returns gold rows written
+
+    Waits until all shards have extracted their Silver parts, then keeps
+    the cells whose hash mod count == index, spilling them into buckets
+    sized for memory_budget. The joined buckets are written as part files
+    under the dataset's .shards-YYYY-M directory for finalize_shards.
+    """
+    date_parts = month_date_parts(year, month)
+    tasks = plan_silver_tasks(date_parts)
+    plan = plan_fingerprint(tasks, count)
+    wait_for_shards('silver', count, year, month, plan, timeout)
+
+    parts = {}
+    for key, task in tasks:
+        if os.path.exists(task[3]):
+            parts.setdefault(task[1], []).append(task[3])
+
+    marker_path = _marker_path('gold', index, count, year, month)
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+
+    rows = sum(pq.ParquetFile(path).metadata.num_rows for paths in parts.values() for path in paths)
+    n_buckets = bucket_count(rows // count, memory_budget)
+    spill_dir = os.path.join(GOLD_LAYER, f".spill-{year}-{int(month):02d}-shard-{index:03d}")
+    shard_dir = os.path.join(_gold_shards_dir(year, month), f"shard-{index:03d}")
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+
+    variable_batches = ((variable, iter_parquet_batches(sorted(paths), ['lat', 'lon', 'year', 'month', variable],
+                                                        RECORD_BATCH_SIZE))
+                        for variable, paths in parts.items())
+    try:
+        variables = spill_to_buckets(variable_batches, GRID_RESOLUTION, spill_dir, n_buckets, shard=(index, count))
+        frames = join_buckets(spill_dir, variables, n_buckets, GRID_RESOLUTION) if variables else []
+        entries, gold_rows = write_month_frames(frames, shard_dir, year, month, GOLD_LAT_BAND_SIZE,
+                                                GOLD_ROW_GROUP_SIZE, part_prefix=f"{index:03d}-")
+    except BaseException:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    _write_marker('gold', index, count, year, month, {'plan': plan, 'rows': gold_rows, 'buckets': n_buckets})
+    print(f"[INFO] Shard {index}/{count}: {gold_rows} gold rows in {len(entries)} lat bands ({n_buckets} buckets)")
+    return gold_rows
+
+def run_shard(index, count, year, month, workers=1, memory_budget=GOLD_MEMORY_BUDGET, timeout=SHARD_WAIT_TIMEOUT):
+    """Silver then gold work of one shard of a month"""
+    if not GOLD_PARTITIONED:
+        raise ValueError("Sharded runs need the partitioned gold dataset (GOLD_PARTITIONED = True)")
+
+    run_silver_shard(index, count, year, month, workers)
+    return run_gold_shard(index, count, year, month, memory_budget, timeout)
+
+def finalize_shards(count, year, month, platinum=False, timeout=0):
+    """Stitch every shard's output into the month's Silver files and gold partitions
+
+    Each variable's Silver parts are merged into its cleaned_ file and the
+    shards' gold part files are moved into one staged month that is swapped
+    in with a fresh manifest entry per lat_band. Enrichment, cube, region
+    index, pyramid and (with platinum) the Postgres load then run once, as
+    after a backfill.
+    """
+    date_parts = month_date_parts(year, month)
+    tasks = plan_silver_tasks(date_parts)
+    plan = plan_fingerprint(tasks, count)
+    silver = wait_for_shards('silver', count, year, month, plan, timeout)
+    gold = wait_for_shards('gold', count, year, month, plan, timeout)
+
+    for record in silver.values():
+        for nc_file in record['failed']:
+            print(f"[WARN] Shard {record['shard']}/{count} failed to extract {nc_file}")
+
+    dataset_path = os.path.join(GOLD_LAYER, GOLD_DATASET_NAME)
+    shards_dir = _gold_shards_dir(year, month)
+    staging_dir = os.path.join(dataset_path, f".staging-{int(year)}-{int(month)}")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    for index in range(count):
+        shard_dir = os.path.join(shards_dir, f"shard-{index:03d}")
+        if not os.path.isdir(shard_dir):
+            continue
+        for band_dir in os.listdir(shard_dir):
+            os.makedirs(os.path.join(staging_dir, band_dir), exist_ok=True)
+            for name in os.listdir(os.path.join(shard_dir, band_dir)):
+                os.replace(os.path.join(shard_dir, band_dir, name), os.path.join(staging_dir, band_dir, name))
+
+    entries = scan_month_entries(staging_dir, year, month) if os.path.isdir(staging_dir) else {}
+    if entries:
+        commit_month(dataset_path, staging_dir, year, month, entries, GOLD_LAT_BAND_SIZE)
+        print(f"[INFO] Saved {sum(entry['rows'] for entry in entries.values())} records from {count} shards "
+              f"to year={int(year)}/month={int(month)} ({len(entries)} lat bands)")
+    else:
+        print(f"[WARN] No gold rows from {count} shards for {year}-{int(month):02d}")
+
+    for folder_name in SLIVER_CONFIG:
+        build_output_path(SILVER_LAYER, year, month, folder_name)
+        _merge_parts([task[3] for key, task in tasks if key.startswith(folder_name + '/')],
+                     SILVER_LAYER, year, month, folder_name, 'parquet')
+
+    shutil.rmtree(shards_dir, ignore_errors=True)
+    shutil.rmtree(_markers_dir(year, month), ignore_errors=True)
+
+    if entries:
+        finalize_backfill(platinum, [(year, month)])
+    return {'silver_rows': sum(record['rows'] for record in silver.values()),
+            'gold_rows': sum(record['rows'] for record in gold.values())}
+
+def run_local_shards(count, year, month, workers=1, platinum=False):
+    """Run count shards as local processes of main_fixed.py --shard, then finalize
+
+    Exercises the multi-node path on one machine: the processes only share
+    the data layers, exactly like shards on separate hosts.
+    """
+    month_text = f"{year}-{int(month):02d}"
+    processes = [subprocess.Popen([sys.executable, MAIN_SCRIPT, '--month', month_text, '--shard', f"{index}/{count}",
+                                   '--workers', str(workers)])
+                 for index in range(count)]
+
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Shards {failed} (of {count}) failed for {month_text}")
+
+    return finalize_shards(count, year, month, platinum)
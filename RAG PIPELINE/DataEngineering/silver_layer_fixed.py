@@ -3,28 +3,386 @@
 # Bronze to Silver ETL pipeline.
 import os
 import sys
+import shutil
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from utils_notebook import get_current_date_parts, build_input_path, build_output_path, save_dataframe, process_internal_folder
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from config import SLIVER_CONFIG, BRONZE_LAYER, SILVER_LAYER
+from utils_notebook import month_date_parts, build_input_path, build_output_path, save_dataframe, process_internal_folder, save_internal_folder, list_netcdf_files, iter_netcdf_batches, iter_netcdf_variable_batches, read_parquet_file, write_parquet_batches, merge_parquet_parts, ParquetBatchWriter
+from schema import concat_frames
+from manifest import (MANIFEST_FILE, FRAGMENTS_DIR, load_manifest, save_manifest, plan_incremental, fragment_name,
+                      silver_manifest_lock)
+from checkpoint import CHECKPOINT_FILE, Checkpoint, fingerprint
+from compaction import split_fragment, recover_silver_compaction
 
-def process_and_save_netcdf(base_folder, config, final_output_path, file_format='parquet'):
-    year, month, day = get_current_date_parts()
+from config import SLIVER_CONFIG, BRONZE_LAYER, SILVER_LAYER, NETCDF_CHUNK_SIZE, RECORD_BATCH_SIZE, REGION_OF_INTEREST, SILVER_MULTI_VARIABLE, SILVER_PACKED_VARIABLES, PIPELINE_CHECKPOINTS
 
-    date_parts = {'year': year, 'month': month, 'day': day}
+PARTS_DIR = '_parts'
+
+def process_and_save_netcdf(base_folder, config, final_output_path, file_format='parquet',
+                            chunk_size=NETCDF_CHUNK_SIZE, batch_size=RECORD_BATCH_SIZE, workers=1,
+                            incremental=False, regions=REGION_OF_INTEREST, year=None, month=None,
+                            multi_variable=SILVER_MULTI_VARIABLE, packed=SILVER_PACKED_VARIABLES,
+                            checkpoints=PIPELINE_CHECKPOINTS, resume=False):
+    # year/month select the Bronze partition (default: the current month)
+    date_parts = month_date_parts(year, month)
+    year, month = date_parts['year'], date_parts['month']
+
+    # Incremental runs resume by themselves: the manifest is saved after every granule
+    if incremental:
+        for folder_name, variable in config.items():
+            _process_incremental(base_folder, folder_name, variable, final_output_path,
+                                 date_parts, chunk_size, batch_size, workers, regions, packed)
+        return
+
+    # Checkpointed runs write one part per (variable, file), even serially, so --resume can skip finished ones
+    journal = None
+    if checkpoints and file_format == 'parquet':
+        journal = Checkpoint(silver_checkpoint_path(final_output_path, year, month), resume)
+
+    if multi_variable:
+        _process_multi_variable(base_folder, config, final_output_path, file_format,
+                                date_parts, chunk_size, workers, regions, packed, journal)
+        return
+
+    if (workers and workers > 1) or journal is not None:
+        _process_parallel(base_folder, config, final_output_path, file_format,
+                          date_parts, chunk_size, batch_size, workers, regions, packed, journal)
+        return
 
     for folder_name, variable in config.items():
         input_path = build_input_path(base_folder, year, month, folder_name)
+        output_path = os.path.join(final_output_path, str(year), str(month).zfill(2), folder_name)
+
+        # Parquet output is streamed batch by batch; other formats need the whole frame
+        if file_format == 'parquet':
+            rows = save_internal_folder(input_path, variable, date_parts, output_path, folder_name,
+                                        chunk_size, batch_size, regions, packed)
+            if rows:
+                _clear_fragments(output_path)
+            else:
+                print(f"[INFO] No data for {folder_name}")
+            continue
 
-        df = process_internal_folder(input_path, variable, date_parts, folder_name)
+        df = process_internal_folder(input_path, variable, date_parts, folder_name, chunk_size, batch_size, regions, packed)
 
         if not df.empty:
             output_path = build_output_path(final_output_path, year, month, folder_name)
 
+            _clear_fragments(output_path)
             save_dataframe(df, output_path, folder_name, file_format)
         else:
             print(f"[INFO] No data for {folder_name}")
 
+def silver_checkpoint_path(final_output_path, year, month):
+    """Checkpoint journal of a month's Silver run"""
+    return os.path.join(final_output_path, str(year), str(month).zfill(2), CHECKPOINT_FILE)
+
+def _process_file_task(nc_file, variable, date_parts, part_path, chunk_size, batch_size, regions=None, packed=()):
+    """Worker: stream one (variable, file) pair into a partial parquet file"""
+    batches = iter_netcdf_batches(nc_file, variable, date_parts, chunk_size or sys.maxsize, batch_size, regions, packed)
+    return write_parquet_batches(batches, part_path)
+
+def _process_granule_task(nc_file, variables, date_parts, key, part_paths, chunk_size, regions=None, packed=()):
+    """Worker: stream every configured variable of one file into per-variable partial parquet files"""
+    writers = {}
+    try:
+        for variable, batch in iter_netcdf_variable_batches(nc_file, variables, date_parts, chunk_size or sys.maxsize,
+                                                            regions, packed):
+            writers.setdefault(variable, ParquetBatchWriter(part_paths[variable])).write(batch)
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        raise
+    return sum(writer.close() for writer in writers.values())
+
+def _run_file_tasks(tasks, workers, task_func=_process_file_task, on_done=None):
+    """Run extraction tasks, returning {task[3]: rows} for those that succeeded
+
+    on_done(task, rows) is called in this process as each task succeeds,
+    e.g. to checkpoint it.
+    """
+    results = {}
+    if workers and workers > 1:
+        try:
+            return _run_file_tasks_pool(tasks, workers, task_func, on_done, results)
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            print(f"[WARN] Process pool unavailable ({str(e)}), falling back to serial processing")
+
+    for task in tasks:
+        if task[3] in results:
+            continue  # finished in the pool before it broke
+        try:
+            results[task[3]] = task_func(*task)
+        except Exception as e:
+            print(f"[ERROR] Error processing {task[0]}: {str(e)}")
+            continue
+        if on_done is not None:
+            on_done(task, results[task[3]])
+    return results
+
+def _run_file_tasks_pool(tasks, workers, task_func=_process_file_task, on_done=None, results=None):
+    """Fan extraction tasks out over a process pool"""
+    results = {} if results is None else results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(executor.submit(task_func, *task), task) for task in tasks]
+
+        for future, task in futures:
+            try:
+                results[task[3]] = future.result()
+                print(f"[INFO] Processed {task[0]}: {results[task[3]]} records")
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Error processing {task[0]}: {str(e)}")
+                continue
+            if on_done is not None:
+                on_done(task, results[task[3]])
+
+    return results
+
+def _process_parallel(base_folder, config, final_output_path, file_format, date_parts, chunk_size, batch_size, workers, regions,
+                      packed=(), journal=None):
+    """Fan out per (variable, file) over a process pool, then merge per variable
+
+    With a checkpoint journal every finished part is recorded, and a
+    resumed run skips the parts (and merged variables) already recorded.
+    """
+    year, month = date_parts['year'], date_parts['month']
+    parts = {}
+    merged = {}
+    tasks = []
+    checkpoints = {}
+
+    for folder_name, variable in config.items():
+        input_path = build_input_path(base_folder, year, month, folder_name)
+        nc_files = list_netcdf_files(input_path)
+
+        if not nc_files:
+            print(f"[WARN] No NetCDF files found in {input_path}")
+            continue
+
+        output_path = build_output_path(final_output_path, year, month, folder_name)
+        parts_dir = os.path.join(output_path, PARTS_DIR)
+
+        # Part names follow the sorted file order so the merge is deterministic
+        parts[folder_name] = []
+        folder_tasks = []
+        for index, nc_file in enumerate(nc_files):
+            part_path = os.path.join(parts_dir, f"{index:05d}_{nc_file.stem}.parquet")
+            folder_tasks.append((str(nc_file), variable, date_parts, part_path, chunk_size, batch_size, regions, packed))
+            parts[folder_name].append(part_path)
+
+        if journal is None:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+            os.makedirs(parts_dir)
+            tasks.extend(folder_tasks)
+            continue
+
+        keys = {task[3]: (f"{folder_name}/{os.path.basename(task[3])}",
+                          fingerprint(task[0], variable=variable, regions=regions, packed=packed))
+                for task in folder_tasks}
+        merged[folder_name] = fingerprint(parts=sorted(keys.values()), file_format=file_format)
+        if journal.get(f"{folder_name}/merged", merged[folder_name]):
+            print(f"[INFO] {folder_name} already extracted (checkpoint), skipping")
+            del parts[folder_name]
+            continue
+
+        os.makedirs(parts_dir, exist_ok=True)
+        for task in folder_tasks:
+            if not _checkpointed(journal, *keys[task[3]]):
+                _remove_files([task[3]])  # an unrecorded part may be stale
+                tasks.append(task)
+                checkpoints[task[3]] = keys[task[3]]
+
+    def record_part(task, rows):
+        key, task_fingerprint = checkpoints[task[3]]
+        journal.record(key, task_fingerprint, rows=rows, files=[task[3]] if os.path.exists(task[3]) else [])
+
+    _run_file_tasks(tasks, workers, on_done=record_part if journal is not None else None)
+
+    for folder_name, part_paths in parts.items():
+        _merge_parts(part_paths, final_output_path, year, month, folder_name, file_format)
+        if journal is not None:
+            journal.record(f"{folder_name}/merged", merged[folder_name])
+
+def _checkpointed(journal, key, task_fingerprint):
+    """Whether a part is recorded as finished and its files are still on disk"""
+    record = journal.get(key, task_fingerprint)
+    return record is not None and all(os.path.exists(path) for path in record['files'])
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _process_multi_variable(base_folder, config, final_output_path, file_format, date_parts, chunk_size, workers, regions,
+                            packed=(), journal=None):
+    """Open every granule once, extract all configured variables it holds and route each to its folder
+
+    Granules are gathered from all variable folders (a file reached through
+    several folders is read once) and each variable found goes to the
+    silver output of its own folder, whichever folder the file came from.
+    Each granule writes per-variable parts, kept only if the whole granule
+    was read, that are streamed into the silver files afterwards; with a
+    journal finished granules are checkpointed.
+    """
+    year, month = date_parts['year'], date_parts['month']
+    variables = list(config.values())
+    nc_files = {}
+
+    for folder_name in config:
+        input_path = build_input_path(base_folder, year, month, folder_name)
+        found = list_netcdf_files(input_path)
+        if not found:
+            print(f"[WARN] No NetCDF files found in {input_path}")
+        for nc_file in found:
+            nc_files.setdefault(os.path.realpath(nc_file), nc_file)
+    nc_files = sorted(nc_files.values())
+
+    parts_dirs = {}
+    for folder_name, variable in config.items():
+        parts_dirs[variable] = os.path.join(build_output_path(final_output_path, year, month, folder_name), PARTS_DIR)
+        if journal is None:
+            shutil.rmtree(parts_dirs[variable], ignore_errors=True)
+        os.makedirs(parts_dirs[variable], exist_ok=True)
+
+    # Part names follow the sorted file order so the merge is deterministic
+    tasks = []
+    for index, nc_file in enumerate(nc_files):
+        key = f"{index:05d}_{nc_file.stem}"
+        part_paths = {variable: os.path.join(parts_dirs[variable], f"{key}.parquet") for variable in variables}
+        tasks.append((str(nc_file), variables, date_parts, key, part_paths, chunk_size, regions, packed))
+
+    pending = tasks
+    if journal is not None:
+        checkpoints = {task[3]: (f"granules/{task[3]}", fingerprint(task[0], variables=variables, regions=regions,
+                                                                    packed=packed))
+                       for task in tasks}
+        merged = fingerprint(parts=sorted(checkpoints.values()), config=config, file_format=file_format)
+        if journal.get('granules/merged', merged):
+            print("[INFO] Granules already extracted (checkpoint), skipping")
+            return
+        pending = [task for task in tasks if not _checkpointed(journal, *checkpoints[task[3]])]
+        for task in pending:
+            _remove_files(task[4].values())  # unrecorded parts may be stale
+
+    def record_granule(task, rows):
+        key, task_fingerprint = checkpoints[task[3]]
+        journal.record(key, task_fingerprint, rows=rows,
+                       files=[path for path in task[4].values() if os.path.exists(path)])
+
+    _run_file_tasks(pending, workers, _process_granule_task, on_done=record_granule if journal is not None else None)
+
+    for folder_name, variable in config.items():
+        _merge_parts([task[4][variable] for task in tasks], final_output_path, year, month, folder_name, file_format)
+    if journal is not None:
+        journal.record('granules/merged', merged)
+
+def _merge_parts(part_paths, final_output_path, year, month, folder_name, file_format):
+    """Merge per-file partial outputs into the variable's silver file"""
+    output_path = build_output_path(final_output_path, year, month, folder_name)
+    existing = [path for path in part_paths if os.path.exists(path)]
+
+    if existing and file_format == 'parquet':
+        # Streamed one record batch at a time
+        rows = merge_parquet_parts(existing, os.path.join(output_path, f"cleaned_{folder_name}.parquet"))
+        _clear_fragments(output_path)
+        print(f"[INFO] Saved {rows} records to {output_path}")
+    elif existing:
+        df = concat_frames([read_parquet_file(path) for path in existing])
+        _clear_fragments(output_path)
+        save_dataframe(df, output_path, folder_name, file_format)
+    else:
+        print(f"[INFO] No data for {folder_name}")
+
+    shutil.rmtree(os.path.join(output_path, PARTS_DIR), ignore_errors=True)
+
+def _process_incremental(base_folder, folder_name, variable, final_output_path, date_parts, chunk_size, batch_size, workers, regions,
+                         packed=()):
+    """Extract only new or changed granules into per-file silver fragments
+
+    The folder's manifest lock is held for the whole run, so compaction
+    cannot swap the fragments underneath it.
+    """
+    year, month = date_parts['year'], date_parts['month']
+    input_path = build_input_path(base_folder, year, month, folder_name)
+    output_path = build_output_path(final_output_path, year, month, folder_name)
+    os.makedirs(os.path.join(output_path, FRAGMENTS_DIR), exist_ok=True)
+
+    with silver_manifest_lock(output_path):
+        recover_silver_compaction(output_path)
+
+        manifest = load_manifest(output_path)
+        entries = manifest.setdefault('files', {})
+        # Fragments depend on the extraction settings as well as the granule
+        params = fingerprint(variable=variable, regions=regions, packed=packed)
+        changed, unchanged, removed = plan_incremental(list_netcdf_files(input_path), input_path, manifest, params)
+
+        print(f"[INFO] {folder_name}: {len(changed)} new/changed, {len(unchanged)} unchanged, {len(removed)} removed granules")
+
+        for rel_path in removed:
+            _remove_fragment(output_path, entries.pop(rel_path), manifest)
+        if removed:
+            save_manifest(output_path, manifest)
+
+        tasks = []
+        changes = {}
+        for rel_path, file_fingerprint in changed:
+            part_path = os.path.join(output_path, fragment_name(rel_path, file_fingerprint['sha256'], params))
+            tasks.append((os.path.join(input_path, rel_path), variable, date_parts, part_path, chunk_size, batch_size, regions,
+                          packed))
+            changes[part_path] = (rel_path, file_fingerprint)
+
+        # The manifest is saved after every granule, so an interrupted run only redoes unfinished ones;
+        # failed granules stay out of it and are retried next run
+        def record_fragment(task, rows):
+            rel_path, file_fingerprint = changes[task[3]]
+            if rel_path in entries:
+                _remove_fragment(output_path, entries[rel_path], manifest)
+
+            entries[rel_path] = dict(file_fingerprint, path=rel_path, rows=rows,
+                                     fragment=fragment_name(rel_path, file_fingerprint['sha256'], params) if rows else None)
+            save_manifest(output_path, manifest)
+
+        _run_file_tasks(tasks, workers, on_done=record_fragment)
+        save_manifest(output_path, manifest)
+
+        # Fragments now hold the full month, so a stale single-file output must go
+        stale_path = os.path.join(output_path, f"cleaned_{folder_name}.parquet")
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+def _remove_fragment(output_path, entry, manifest=None):
+    """Delete the fragment a manifest entry points at, if any
+
+    Other granules sharing a compacted fragment are first written back to
+    their own fragments and the manifest saved, so only this granule's
+    rows go.
+    """
+    if not entry.get('fragment'):
+        return
+
+    shared = [other for other in (manifest or {}).get('files', {}).values()
+              if other is not entry and other.get('fragment') == entry['fragment']]
+    if shared:
+        split_fragment(output_path, entry['fragment'], shared)
+        save_manifest(output_path, manifest)
+
+    fragment_path = os.path.join(output_path, entry['fragment'])
+    if os.path.exists(fragment_path):
+        os.remove(fragment_path)
+
+def _clear_fragments(output_path):
+    """A full rebuild supersedes any incremental fragments and manifest"""
+    with silver_manifest_lock(output_path):
+        recover_silver_compaction(output_path)
+        shutil.rmtree(os.path.join(output_path, FRAGMENTS_DIR), ignore_errors=True)
+        manifest_path = os.path.join(output_path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
 # Uncomment to run the pipeline
 # process_and_save_netcdf(BRONZE_LAYER, SLIVER_CONFIG, SILVER_LAYER, 'parquet')
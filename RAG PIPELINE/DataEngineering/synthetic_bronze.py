@@ -0,0 +1,225 @@
+# Synthetic Bronze Data
+
+# Writes realistic synthetic NetCDF granules in the Bronze layout for benchmarks and tests.
+import os
+import sys
+import argparse
+import calendar
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import netCDF4 as nc
+
+from config import SLIVER_CONFIG, BRONZE_LAYER, GRID_RESOLUTION
+
+SYNTHETIC_BBOX = (-30.0, 25.0, 40.0, 110.0)  # Indian Ocean
+TIME_UNITS = 'seconds since 1981-01-01 00:00:00'
+FILL_VALUE = -32767.0
+
+# (units, long name) of the variables in SLIVER_CONFIG
+VARIABLE_ATTRS = {
+    'sst': ('degree_C', 'Sea Surface Temperature'),
+    'poc': ('mg m^-3', 'Particulate Organic Carbon'),
+    'pic': ('mol m^-3', 'Calcite Concentration'),
+    'aot_862': ('1', 'Aerosol Optical Thickness at 862 nm'),
+    'chlor_a': ('mg m^-3', 'Chlorophyll Concentration, OCI Algorithm'),
+    'Kd_490': ('m^-1', 'Diffuse attenuation coefficient at 490 nm'),
+}
+
+# (scale_factor, add_offset) of int16 packed granules, covering each variable's range
+PACKED_ENCODINGS = {
+    'sst': (0.005, 0.0),
+    'poc': (0.05, 1600.0),
+    'pic': (1e-6, 0.032),
+    'aot_862': (1e-4, 3.2),
+    'chlor_a': (0.002, 64.0),
+    'Kd_490': (2e-4, 6.4),
+}
+
+def synthetic_values(variable, lat, lon, rng):
+    """Plausible values of a variable on a lat/lon block (latitude gradients plus noise)"""
+    shape = np.broadcast(lat, lon).shape
+    lat = np.broadcast_to(lat, shape)
+    chl = np.exp(rng.normal(np.log(0.15) + 0.02 * np.abs(lat), 0.6, shape))
+
+    if variable == 'sst':
+        return 29.0 - 0.25 * np.abs(lat) + rng.normal(0.0, 0.8, shape)
+    if variable == 'chlor_a':
+        return chl
+    if variable == 'Kd_490':
+        return 0.0166 + 0.0773 * chl ** 0.6715
+    if variable == 'poc':
+        return 203.2 * chl ** 0.757
+    if variable == 'pic':
+        return np.exp(rng.normal(np.log(1e-4), 1.0, shape))
+    if variable == 'aot_862':
+        return np.exp(rng.normal(np.log(0.08), 0.5, shape))
+    return rng.normal(0.0, 1.0, shape)
+
+def cloud_mask(ny, nx, fill_ratio, rng, cell=16):
+    """Spatially coherent missing-pixel mask covering about fill_ratio of the grid
+
+    A coarse random field is upsampled in blocks of `cell` pixels and
+    thresholded, so gaps come in patches like cloud cover rather than as
+    scattered single pixels.
+    """
+    if fill_ratio <= 0:
+        return np.zeros((ny, nx), dtype=bool)
+    if fill_ratio >= 1:
+        return np.ones((ny, nx), dtype=bool)
+
+    coarse = rng.random((-(-ny // cell) + 1, -(-nx // cell) + 1))
+    rows = np.arange(ny) / cell
+    cols = np.arange(nx) / cell
+    r0, c0 = rows.astype(np.int64), cols.astype(np.int64)
+    fr, fc = (rows - r0)[:, None], (cols - c0)[None, :]
+
+    # Bilinear upsampling keeps the patches smooth
+    field = (coarse[r0][:, c0] * (1 - fr) * (1 - fc) + coarse[r0 + 1][:, c0] * fr * (1 - fc)
+             + coarse[r0][:, c0 + 1] * (1 - fr) * fc + coarse[r0 + 1][:, c0 + 1] * fr * fc)
+    field += rng.normal(0.0, 0.02, field.shape)
+    return field < np.quantile(field, fill_ratio)
+
+def grid_axes(ny, nx, bbox=SYNTHETIC_BBOX, resolution=GRID_RESOLUTION):
+    """1-D lat/lon axes of ny x nx points spanning bbox, aligned to the join grid"""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    lat_step = max(round((lat_max - lat_min) / ny / resolution), 1) * resolution
+    lon_step = max(round((lon_max - lon_min) / nx / resolution), 1) * resolution
+    lat = np.round(lat_min + lat_step * np.arange(ny), 6)
+    lon = np.round(lon_min + lon_step * np.arange(nx), 6)
+    return lat, lon
+
+def write_synthetic_granule(path, variable, lat, lon, observed_at, fill_ratio=0.3, two_d=False,
+                            seed=0, compress=True, rows_per_block=512, time_steps=1, packed=False):
+    """Write one L3-style granule of a variable on the given axes
+
+    With two_d the coordinates are stored as (rows, cols) lat/lon arrays
+    like swath or projected products; otherwise as 1-D axes. With
+    time_steps > 1 the variable is (time, lat, lon) with one daily step
+    each, like multi-day composites. With packed the variable is int16
+    with scale_factor/add_offset, as many ocean-colour products ship.
+    Values are written in row blocks so large grids never sit in memory at
+    once.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    ny, nx = len(lat), len(lon)
+    units, long_name = VARIABLE_ATTRS.get(variable, ('1', variable))
+    missing = np.stack([cloud_mask(ny, nx, fill_ratio, rng) for _ in range(time_steps)])
+    times = [observed_at + timedelta(days=step) for step in range(time_steps)]
+
+    with nc.Dataset(path, 'w', format='NETCDF4') as dataset:
+        dataset.title = f"Synthetic Level-3 {long_name}"
+        dataset.source = 'synthetic_bronze.py'
+        dataset.time_coverage_start = times[0].strftime('%Y-%m-%dT%H:%M:%SZ')
+        dataset.time_coverage_end = times[-1].strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        dataset.createDimension('time', time_steps)
+        time_var = dataset.createVariable('time', 'f8', ('time',))
+        time_var.units = TIME_UNITS
+        time_var.standard_name = 'time'
+        time_var[:] = nc.date2num(times, TIME_UNITS)
+
+        if two_d:
+            dataset.createDimension('number_of_lines', ny)
+            dataset.createDimension('pixels_per_line', nx)
+            dims = ('number_of_lines', 'pixels_per_line')
+            lat_var = dataset.createVariable('lat', 'f4', dims, zlib=compress)
+            lon_var = dataset.createVariable('lon', 'f4', dims, zlib=compress)
+        else:
+            dataset.createDimension('lat', ny)
+            dataset.createDimension('lon', nx)
+            dims = ('lat', 'lon')
+            lat_var = dataset.createVariable('lat', 'f4', ('lat',))
+            lon_var = dataset.createVariable('lon', 'f4', ('lon',))
+            lat_var[:] = lat
+            lon_var[:] = lon
+        lat_var.units, lon_var.units = 'degrees_north', 'degrees_east'
+
+        var_dims = dims if time_steps == 1 else ('time',) + dims
+        chunks = (min(rows_per_block, ny), nx) if time_steps == 1 else (1, min(rows_per_block, ny), nx)
+        if packed:
+            scale, offset = PACKED_ENCODINGS.get(variable, (1e-3, 0.0))
+            var = dataset.createVariable(variable, 'i2', var_dims, zlib=compress, fill_value=np.int16(FILL_VALUE),
+                                         chunksizes=chunks if compress else None)
+            var.scale_factor, var.add_offset = np.float32(scale), np.float32(offset)
+            value_range = (offset + scale * (FILL_VALUE + 1), offset + scale * -FILL_VALUE)
+        else:
+            var = dataset.createVariable(variable, 'f4', var_dims, zlib=compress, fill_value=np.float32(FILL_VALUE),
+                                         chunksizes=chunks if compress else None)
+        var.units = units
+        var.long_name = long_name
+
+        for start in range(0, ny, rows_per_block):
+            stop = min(start + rows_per_block, ny)
+            lat_block = lat[start:stop, None]
+            for step in range(time_steps):
+                values = synthetic_values(variable, lat_block, lon[None, :], rng).astype(np.float32)
+                if packed:
+                    # netCDF4 packs on write and stores masked pixels as the fill value
+                    values = np.ma.masked_array(np.clip(values, *value_range), missing[step, start:stop])
+                else:
+                    values[missing[step, start:stop]] = FILL_VALUE
+                if time_steps == 1:
+                    var[start:stop, :] = values
+                else:
+                    var[step, start:stop, :] = values
+
+            if two_d:
+                lat_var[start:stop, :] = np.broadcast_to(lat_block, values.shape)
+                lon_var[start:stop, :] = np.broadcast_to(lon[None, :], values.shape)
+
+def generate_bronze_tree(bronze_layer, year, month, config=SLIVER_CONFIG, granules=4, ny=700, nx=900,
+                         fill_ratio=0.3, two_d=False, bbox=SYNTHETIC_BBOX, seed=0, compress=True, time_steps=1,
+                         packed=False):
+    """Write `granules` granules per variable folder for one month
+
+    Granules are spread over the days of the month and share one grid, as
+    daily Level-3 products do, with a different cloud pattern each day;
+    time_steps > 1 writes multi-day (time, lat, lon) granules instead and
+    packed writes int16 scaled variables. Returns the list of written paths.
+    """
+    lat, lon = grid_axes(ny, nx, bbox)
+    days = calendar.monthrange(year, month)[1]
+    paths = []
+
+    for v, (folder_name, variable) in enumerate(config.items()):
+        folder = os.path.join(bronze_layer, str(year), str(month).zfill(2), folder_name)
+        for g in range(granules):
+            day = 1 + (g * days) // max(granules, 1)
+            observed_at = datetime(year, month, day, 12)
+            path = os.path.join(folder, f"SYN.{observed_at.strftime('%Y%m%d')}.{g:04d}.L3m.{variable}.nc")
+            write_synthetic_granule(path, variable, lat, lon, observed_at, fill_ratio, two_d,
+                                    seed=seed + 1000 * v + g, compress=compress,
+                                    time_steps=max(1, min(time_steps, days - day + 1)), packed=packed)
+            paths.append(path)
+
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    print(f"[INFO] Wrote {len(paths)} {'packed ' if packed else ''}synthetic granules ({ny} x {nx}, "
+          f"{'2-D' if two_d else '1-D'} coordinates, "
+          f"{fill_ratio:.0%} missing) totalling {total_bytes / 2**20:.1f} MB under {bronze_layer}")
+    return paths
+
+def parse_args():
+    now = datetime.now()
+    parser = argparse.ArgumentParser(description="Write a synthetic Bronze tree of NetCDF granules")
+    parser.add_argument("--output", default=BRONZE_LAYER, help="Bronze root directory")
+    parser.add_argument("--year", type=int, default=now.year)
+    parser.add_argument("--month", type=int, default=now.month)
+    parser.add_argument("--granules", type=int, default=4, help="Granules per variable folder")
+    parser.add_argument("--ny", type=int, default=700, help="Grid rows")
+    parser.add_argument("--nx", type=int, default=900, help="Grid columns")
+    parser.add_argument("--fill-ratio", type=float, default=0.3, help="Fraction of missing (fill) pixels")
+    parser.add_argument("--two-d", action="store_true", help="Store 2-D lat/lon arrays instead of 1-D axes")
+    parser.add_argument("--time-steps", type=int, default=1, help="Daily steps per granule (> 1: 3-D variables)")
+    parser.add_argument("--packed", action="store_true", help="Write int16 variables with scale_factor/add_offset")
+    parser.add_argument("--no-compress", action="store_true", help="Write uncompressed variables")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    generate_bronze_tree(args.output, args.year, args.month, granules=args.granules, ny=args.ny, nx=args.nx,
+                         fill_ratio=args.fill_ratio, two_d=args.two_d, seed=args.seed,
+                         compress=not args.no_compress, time_steps=args.time_steps, packed=args.packed)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """An empty working directory: the layer paths in config are relative to it"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,56 @@
+# Argo profile store: profile and float slices against the measurements CSV.
+import numpy as np
+import pandas as pd
+
+from argo_store import build_argo_store, ArgoStore
+
+def _measurements(seed=0):
+    """Three floats with a few profiles each, rows shuffled as in an export"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for float_key in (7, 3, 11):
+        for cycle in range(3):
+            time = pd.Timestamp('2024-03-01') + pd.Timedelta(days=10 * cycle + float_key)
+            for pressure in rng.choice(np.arange(5, 2000, 5), size=rng.integers(2, 6), replace=False):
+                rows.append({'float_key': float_key, 'measurement_time': time.isoformat(), 'lat': -10.0 + float_key,
+                             'lon': 70.0 + cycle, 'pressure': float(pressure), 'temperature': rng.uniform(2, 30),
+                             'salinity': rng.uniform(33, 36)})
+    df = pd.DataFrame(rows).sample(frac=1, random_state=seed).reset_index(drop=True)
+    df.insert(0, 'measurement_key', np.arange(len(df)) + 100)
+    return df
+
+def test_profiles_and_histories_are_contiguous_slices(workdir):
+    df = _measurements()
+    df.to_csv('measurements.csv', index=False)
+    store = ArgoStore(build_argo_store('measurements.csv', 'argo_profiles'))
+
+    df['measurement_time'] = pd.to_datetime(df['measurement_time'])
+    assert store.n_profiles == 9
+    assert list(store.float_keys) == [3, 7, 11]
+
+    for float_key, history in df.groupby('float_key'):
+        expected = history.sort_values(['measurement_time', 'pressure']).reset_index(drop=True)
+        got = store.float_history(float_key)
+        np.testing.assert_array_equal(got['measurement_key'], expected['measurement_key'])
+        np.testing.assert_allclose(got['temperature'], expected['temperature'], rtol=1e-6)
+
+        for time, profile in expected.groupby('measurement_time'):
+            levels = store.profile(store.find_profile(float_key, time))
+            np.testing.assert_array_equal(levels['pressure'], profile['pressure'].to_numpy(dtype=np.float32))
+
+    catalogue = store.profiles(7)
+    assert len(catalogue) == 3 and catalogue['levels'].sum() == (df['float_key'] == 7).sum()
+    assert store.float_history(5) is None
+    assert store.find_profile(7, '2030-01-01') is None
+
+def test_rebuild_replaces_the_store(workdir):
+    _measurements(0).to_csv('measurements.csv', index=False)
+    build_argo_store('measurements.csv', 'argo_profiles')
+
+    df = _measurements(1)
+    df = df[df['float_key'] != 11]
+    df.to_csv('measurements.csv', index=False)
+    store = ArgoStore(build_argo_store('measurements.csv', 'argo_profiles'))
+
+    assert list(store.float_keys) == [3, 7]
+    assert store.index['n_levels'] == len(df)
@@ -0,0 +1,109 @@
+# Checkpoint resume: an interrupted Silver or Gold run picks up where it stopped and matches a clean run.
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import gold_layer_fixed
+import utils_notebook
+from gold_dataset import read_gold_dataset
+from gold_layer_fixed import merge_silver_to_gold
+from join_engine import join_bucket
+from silver_layer_fixed import process_and_save_netcdf
+from synthetic_bronze import generate_bronze_tree
+from utils_notebook import read_silver_dataframe
+
+YEAR, MONTH = 2024, 3
+CONFIG = {'sst': 'sst', 'Chlorophyll': 'chlor_a'}
+
+class Killed(BaseException):
+    """Stands in for a preemption: not an Exception, so no task handler swallows it"""
+
+def _silver_run(silver_layer='Silver_Data', checkpoints=True, resume=False):
+    process_and_save_netcdf('Bronze_Data', CONFIG, silver_layer, regions=None, year=YEAR, month=MONTH,
+                            multi_variable=False, checkpoints=checkpoints, resume=resume)
+
+def _silver(silver_layer, folder_name):
+    df = read_silver_dataframe(silver_layer, YEAR, MONTH, folder_name)
+    return df.sort_values(['day', 'lat', 'lon']).reset_index(drop=True)
+
+def _gold_run(gold_layer, checkpoints=True, resume=False):
+    merge_silver_to_gold('Silver_Data', CONFIG, gold_layer, cube=False, pyramid=False, enrich=False,
+                         region_index=False, year=YEAR, month=MONTH, memory_budget=64 * 1024,
+                         checkpoints=checkpoints, resume=resume)
+
+def _gold(gold_layer):
+    df = read_gold_dataset(os.path.join(gold_layer, 'merged_gold'))
+    df = df[['lat', 'lon'] + list(CONFIG.values())].astype(np.float64)
+    return df.sort_values(['lat', 'lon']).reset_index(drop=True)
+
+def _patch_extraction(monkeypatch, fail=None):
+    """Record the granules extracted; killing the run on the one named fail"""
+    opened = []
+    iter_netcdf_batches = utils_notebook.iter_netcdf_batches
+
+    def recording(nc_file, *args, **kwargs):
+        name = os.path.basename(nc_file)
+        if name == fail:
+            raise Killed(name)
+        opened.append(name)
+        return iter_netcdf_batches(nc_file, *args, **kwargs)
+
+    monkeypatch.setattr('silver_layer_fixed.iter_netcdf_batches', recording)
+    return opened
+
+def test_silver_resume_skips_finished_parts(workdir, monkeypatch):
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=3, ny=30, nx=40, compress=False)
+    _silver_run('Expected', checkpoints=False)
+
+    # sst's granules come first, so the kill lands after they and one chlorophyll part are recorded
+    chlorophyll = sorted(os.listdir(os.path.join('Bronze_Data', str(YEAR), f"{MONTH:02d}", 'Chlorophyll')))
+    victim = chlorophyll[1]
+
+    with monkeypatch.context() as patch, pytest.raises(Killed):
+        _patch_extraction(patch, fail=victim)
+        _silver_run()
+
+    with monkeypatch.context() as patch:
+        opened = _patch_extraction(patch)
+        _silver_run(resume=True)
+    assert opened == chlorophyll[1:]
+
+    for folder_name in CONFIG:
+        pd.testing.assert_frame_equal(_silver('Silver_Data', folder_name), _silver('Expected', folder_name))
+
+    # Everything is recorded now: a second resume extracts nothing
+    with monkeypatch.context() as patch:
+        opened = _patch_extraction(patch)
+        _silver_run(resume=True)
+    assert opened == []
+
+def test_gold_resume_joins_only_the_remaining_buckets(workdir, monkeypatch):
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=2, ny=60, nx=80, compress=False)
+    _silver_run(checkpoints=False)
+    _gold_run('Gold_Expected', checkpoints=False)
+
+    joined, kill = [], True
+
+    def recording(spill_dir, variables, bucket, resolution):
+        if len(joined) == 3 and kill:
+            raise Killed(bucket)
+        joined.append(bucket)
+        return join_bucket(spill_dir, variables, bucket, resolution)
+
+    monkeypatch.setattr(gold_layer_fixed, 'join_bucket', recording)
+
+    with pytest.raises(Killed):
+        _gold_run('Gold_Data')
+
+    kill = False
+    _gold_run('Gold_Data', resume=True)
+    n_buckets = len(joined)
+    assert n_buckets > 4
+    assert joined[3:] == list(range(3, n_buckets))
+    pd.testing.assert_frame_equal(_gold('Gold_Data'), _gold('Gold_Expected'))
+
+    # Once the month is committed a resume skips the join altogether
+    _gold_run('Gold_Data', resume=True)
+    assert len(joined) == n_buckets
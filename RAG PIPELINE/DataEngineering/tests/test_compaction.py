@@ -0,0 +1,76 @@
+# Silver compaction: round trip through incremental runs and recovery from an interrupted swap.
+import os
+
+import pandas as pd
+import pytest
+
+import compaction
+from compaction import compact_silver_folder, COMPACT_JOURNAL
+from manifest import load_manifest, MANIFEST_LOCK
+from silver_layer_fixed import process_and_save_netcdf
+from synthetic_bronze import generate_bronze_tree
+from utils_notebook import read_silver_dataframe
+
+YEAR, MONTH = 2024, 3
+CONFIG = {'sst': 'sst'}
+OUTPUT = os.path.join('Silver_Data', str(YEAR), f"{MONTH:02d}", 'sst')
+
+def _bronze(seed=0):
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=4, ny=30, nx=40, compress=False, seed=seed)
+
+def _incremental():
+    process_and_save_netcdf('Bronze_Data', CONFIG, 'Silver_Data', chunk_size=300, batch_size=128, regions=None,
+                            year=YEAR, month=MONTH, incremental=True)
+
+def _silver():
+    df = read_silver_dataframe('Silver_Data', YEAR, MONTH, 'sst')
+    return df.sort_values(['day', 'lat', 'lon']).reset_index(drop=True)
+
+def _fragments():
+    return sorted(name for name in os.listdir(os.path.join(OUTPUT, 'fragments')) if not name.startswith('.'))
+
+def _expected():
+    process_and_save_netcdf('Bronze_Data', CONFIG, 'Expected', chunk_size=300, batch_size=128, regions=None,
+                            year=YEAR, month=MONTH, checkpoints=False)
+    df = read_silver_dataframe('Expected', YEAR, MONTH, 'sst')
+    return df.sort_values(['day', 'lat', 'lon']).reset_index(drop=True)
+
+def test_compaction_round_trip(workdir):
+    _bronze()
+    _incremental()
+    before = _silver()
+
+    assert compact_silver_folder(OUTPUT, small_bytes=2**30) == 4
+    assert len(_fragments()) == 1
+    pd.testing.assert_frame_equal(_silver(), before)
+
+    # A granule changing after compaction is cut out of the compacted file
+    os.remove(sorted(os.path.join(root, name) for root, _, names in os.walk('Bronze_Data') for name in names)[1])
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=2, ny=30, nx=40, compress=False, seed=7)
+    _incremental()
+
+    pd.testing.assert_frame_equal(_silver(), _expected())
+    assert not os.path.exists(os.path.join(OUTPUT, MANIFEST_LOCK))
+
+def test_crash_between_swap_and_manifest_is_recovered(workdir, monkeypatch):
+    _bronze()
+    _incremental()
+    before = _silver()
+
+    def crash(output_path, manifest):
+        raise OSError("killed")
+
+    with monkeypatch.context() as patch, pytest.raises(OSError):
+        patch.setattr(compaction, 'save_manifest', crash)
+        compact_silver_folder(OUTPUT, small_bytes=2**30)
+
+    # The swap happened but the manifest still lists the merged fragments
+    assert len(_fragments()) == 1
+    assert os.path.exists(os.path.join(OUTPUT, COMPACT_JOURNAL))
+
+    # The next run on the folder finishes the compaction before planning
+    _incremental()
+    assert not os.path.exists(os.path.join(OUTPUT, COMPACT_JOURNAL))
+    fragments = {os.path.basename(entry['fragment']) for entry in load_manifest(OUTPUT)['files'].values()}
+    assert fragments == set(_fragments())
+    pd.testing.assert_frame_equal(_silver(), before)
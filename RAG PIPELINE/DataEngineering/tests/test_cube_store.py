@@ -0,0 +1,104 @@
+# Gold cube and pyramid: native grid detection, the size guard and month-by-month updates.
+import os
+
+import numpy as np
+import pandas as pd
+
+from gold_dataset import save_partitioned_dataset
+from cube_store import build_gold_cube, GoldCube
+from pyramid import build_pyramid, load_pyramid_level
+
+LEVELS = {'native': None, '1': 1.0}
+
+def _native_month(year, month, seed=0):
+    """A 48 x 48 block of a 1/24 degree grid, coordinates rounded to the 0.01 join resolution"""
+    rng = np.random.default_rng(seed)
+    centres = (np.arange(48) + 0.5) / 24
+    lat, lon = np.meshgrid(np.round(-10 + centres, 2), np.round(60 + centres, 2), indexing='ij')
+    return pd.DataFrame({
+        'lat': lat.ravel(),
+        'lon': lon.ravel(),
+        'year': year,
+        'month': month,
+        'sst': rng.uniform(20, 30, lat.size),
+        'chlor_a': rng.uniform(0, 1, lat.size),
+    })
+
+def _cube_values(cube_path):
+    cube = GoldCube(cube_path)
+    return cube.index, {var: cube.arrays[var][:, :, :] for var in cube.variables}
+
+def test_cube_is_built_on_the_native_grid(workdir):
+    df = _native_month(2024, 1)
+    dataset_path = save_partitioned_dataset(df, 'Gold_Data', 'merged_gold')
+
+    cube = GoldCube(build_gold_cube(dataset_path, 'gold_cube', ['sst', 'chlor_a'], 0.01))
+
+    # Not the (997, 997) cells the 0.01 gcd step would give
+    assert (cube.n_lat, cube.n_lon) == (48, 48)
+    assert abs(cube.lat_resolution - 1 / 24) < 1e-3
+    for row in df.sample(50, random_state=0).itertuples():
+        assert cube.lookup(row.lat, row.lon, 2024, 1)['sst'] == np.float32(row.sst)
+
+def test_sparse_data_is_not_densified(workdir):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'lat': np.round(rng.uniform(-30, 30, 200), 2), 'lon': np.round(rng.uniform(40, 100, 200), 2),
+                       'year': 2024, 'month': 1, 'sst': rng.uniform(20, 30, 200)})
+    dataset_path = save_partitioned_dataset(df, 'Gold_Data', 'merged_gold')
+
+    assert build_gold_cube(dataset_path, 'gold_cube', ['sst'], 0.01) is None
+    assert not os.path.exists('gold_cube')
+
+def test_month_updates_match_a_full_rebuild(workdir):
+    dataset_path = save_partitioned_dataset(pd.concat([_native_month(2024, 1), _native_month(2024, 2, seed=1)]),
+                                            'Gold_Data', 'merged_gold')
+    build_gold_cube(dataset_path, 'gold_cube', ['sst', 'chlor_a'], 0.01)
+    build_pyramid(dataset_path, 'pyramid', ['sst', 'chlor_a'], LEVELS, 0.01)
+    january = os.path.getmtime(os.path.join('gold_cube', 'sst', '2024-01.npy'))
+
+    # February is merged again and March is new
+    save_partitioned_dataset(pd.concat([_native_month(2024, 2, seed=2), _native_month(2024, 3, seed=3)]),
+                             'Gold_Data', 'merged_gold')
+    touched = [(2024, 2), (2024, 3)]
+    build_gold_cube(dataset_path, 'gold_cube', ['sst', 'chlor_a'], 0.01, months=touched)
+    build_pyramid(dataset_path, 'pyramid', ['sst', 'chlor_a'], LEVELS, 0.01, months=touched)
+
+    build_gold_cube(dataset_path, 'full_cube', ['sst', 'chlor_a'], 0.01)
+    build_pyramid(dataset_path, 'full_pyramid', ['sst', 'chlor_a'], LEVELS, 0.01)
+
+    assert os.path.getmtime(os.path.join('gold_cube', 'sst', '2024-01.npy')) == january
+    index, arrays = _cube_values('gold_cube')
+    full_index, full_arrays = _cube_values('full_cube')
+    assert index == full_index
+    assert index['times'] == [[2024, 1], [2024, 2], [2024, 3]]
+    for var in full_arrays:
+        np.testing.assert_array_equal(arrays[var], full_arrays[var])
+
+    order = ['year', 'month', 'lat', 'lon']
+    pd.testing.assert_frame_equal(
+        load_pyramid_level('pyramid', dataset_path, '1').sort_values(order).reset_index(drop=True),
+        load_pyramid_level('full_pyramid', dataset_path, '1').sort_values(order).reset_index(drop=True))
+
+def _haversine(lat, lon, lats, lons):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0088 * 2 * np.arcsin(np.sqrt(a))
+
+def test_nearest_searches_past_empty_regions_and_ranks_exactly(workdir):
+    # A 200 x 200 grid of 0.05 degree cells: ten full rows at the bottom and a block in the far corner
+    rows, cols = np.meshgrid(np.arange(200), np.arange(200), indexing='ij')
+    filled = (rows < 10) | ((rows >= 150) & (cols >= 150))
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'lat': np.round(-5 + 0.05 * rows[filled], 2), 'lon': np.round(60 + 0.05 * cols[filled], 2),
+                       'year': 2024, 'month': 1, 'sst': rng.uniform(20, 30, filled.sum())})
+    dataset_path = save_partitioned_dataset(df, 'Gold_Data', 'merged_gold')
+    cube = GoldCube(build_gold_cube(dataset_path, 'gold_cube', ['sst'], 0.01))
+    assert (cube.n_lat, cube.n_lon) == (200, 200)
+
+    # 90 cells from the nearest data
+    assert len(cube.nearest(-5 + 0.05 * 100, 60 + 0.05 * 20, top_k=3)) == 3
+
+    for lat, lon in zip(rng.uniform(-6, 6, 30), rng.uniform(59, 71, 30)):
+        got = [record['distance'] for record in cube.nearest(lat, lon, top_k=5)]
+        expected = np.sort(_haversine(lat, lon, df['lat'].to_numpy(), df['lon'].to_numpy()))[:5]
+        np.testing.assert_allclose(got, expected, rtol=1e-4)
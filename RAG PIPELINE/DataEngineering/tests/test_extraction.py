@@ -0,0 +1,148 @@
+# Bronze → Silver extraction: row-block rebatching and whole-granule writes.
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils_notebook
+from utils_notebook import (month_date_parts, rebatch_blocks, process_internal_folder, save_internal_folder,
+                            read_parquet_file, process_netcdf_file, region_windows, _block_days)
+from silver_layer_fixed import process_and_save_netcdf
+from synthetic_bronze import generate_bronze_tree, write_synthetic_granule, grid_axes
+
+YEAR, MONTH = 2024, 3
+CONFIG = {'sst': 'sst', 'Chlorophyll': 'chlor_a'}
+
+def _sorted(df):
+    return df.sort_values(['day', 'lat', 'lon']).reset_index(drop=True)
+
+@pytest.fixture
+def bronze(workdir):
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=3, ny=40, nx=50, compress=False)
+    return os.path.join('Bronze_Data', str(YEAR), f"{MONTH:02d}")
+
+@pytest.fixture
+def failing_granule(monkeypatch):
+    """Granule .0001. raises after its first row block"""
+    iter_grid_blocks = utils_notebook.iter_grid_blocks
+
+    def failing(dataset, *args, **kwargs):
+        blocks = iter_grid_blocks(dataset, *args, **kwargs)
+        yield next(blocks)
+        if '.0001.' in dataset.filepath():
+            raise OSError("truncated granule")
+        yield from blocks
+
+    monkeypatch.setattr(utils_notebook, 'iter_grid_blocks', failing)
+
+def _without_failing_granule(bronze):
+    for folder in CONFIG:
+        for name in os.listdir(os.path.join(bronze, folder)):
+            if '.0001.' in name:
+                os.remove(os.path.join(bronze, folder, name))
+
+def test_rebatch_blocks_cuts_fixed_size_batches():
+    rng = np.random.default_rng(0)
+    blocks = []
+    for size in rng.integers(0, 40, 50):
+        lat, lon = rng.random(size), rng.random(size)
+        blocks.append((lat, lon, rng.random(size).astype(np.float32), np.full(size, 5, dtype=np.int16)))
+
+    batches = list(rebatch_blocks(iter(blocks), 'sst', month_date_parts(YEAR, MONTH), 7))
+
+    total = sum(len(block[2]) for block in blocks)
+    assert [len(batch) for batch in batches] == [7] * (total // 7) + ([total % 7] if total % 7 else [])
+    values = pd.concat(batches)['sst'].to_numpy()
+    np.testing.assert_array_equal(values, np.concatenate([block[2] for block in blocks]))
+
+def test_small_chunks_match_a_single_block(bronze):
+    date_parts = month_date_parts(YEAR, MONTH)
+    input_path = os.path.join(bronze, 'sst')
+
+    whole = process_internal_folder(input_path, 'sst', date_parts, 'sst', regions=None)
+    chunked = process_internal_folder(input_path, 'sst', date_parts, 'sst', chunk_size=300, batch_size=128,
+                                      regions=None)
+
+    assert len(whole) > 0
+    pd.testing.assert_frame_equal(_sorted(chunked), _sorted(whole))
+
+def test_granule_failing_part_way_adds_no_rows(bronze, failing_granule):
+    date_parts = month_date_parts(YEAR, MONTH)
+    input_path = os.path.join(bronze, 'sst')
+
+    in_memory = process_internal_folder(input_path, 'sst', date_parts, 'sst', chunk_size=300, regions=None)
+    rows = save_internal_folder(input_path, 'sst', date_parts, 'out', 'sst', chunk_size=300, batch_size=128,
+                                regions=None)
+    streamed = read_parquet_file(os.path.join('out', 'cleaned_sst.parquet'))
+    assert os.listdir('out') == ['cleaned_sst.parquet']
+
+    _without_failing_granule(bronze)
+    expected = process_internal_folder(input_path, 'sst', date_parts, 'sst', chunk_size=300, regions=None)
+
+    assert rows == len(expected)
+    pd.testing.assert_frame_equal(_sorted(in_memory), _sorted(expected))
+    pd.testing.assert_frame_equal(_sorted(streamed), _sorted(expected))
+
+@pytest.mark.parametrize('multi_variable', [True, False])
+def test_silver_run_drops_a_granule_failing_part_way(bronze, failing_granule, multi_variable):
+    process_and_save_netcdf('Bronze_Data', CONFIG, 'Silver_Data', chunk_size=300, batch_size=128, regions=None,
+                            year=YEAR, month=MONTH, multi_variable=multi_variable, checkpoints=False)
+    _without_failing_granule(bronze)
+    process_and_save_netcdf('Bronze_Data', CONFIG, 'Expected', chunk_size=300, batch_size=128, regions=None,
+                            year=YEAR, month=MONTH, multi_variable=multi_variable, checkpoints=False)
+
+    for folder in CONFIG:
+        relative = os.path.join(str(YEAR), f"{MONTH:02d}", folder, f"cleaned_{folder}.parquet")
+        pd.testing.assert_frame_equal(_sorted(read_parquet_file(os.path.join('Silver_Data', relative))),
+                                      _sorted(read_parquet_file(os.path.join('Expected', relative))))
+
+def test_steps_from_another_month_keep_the_fallback_day(workdir):
+    # Daily steps Jan 30, Jan 31 and Feb 1, filed under February
+    lat, lon = grid_axes(20, 30)
+    path = os.path.join('Bronze_Data', 'granule.nc')
+    write_synthetic_granule(path, 'sst', lat, lon, datetime(2024, 1, 30, 12), compress=False, time_steps=3)
+
+    df = process_netcdf_file(path, 'sst', {'year': 2024, 'month': 2, 'day': 15})
+
+    assert set(df['day'].unique()) == {15, 1}
+    pd.to_datetime(df[['year', 'month', 'day']])
+
+def test_steps_beyond_the_time_axis_are_rejected():
+    days = np.array([3, 4], dtype=np.int16)
+    np.testing.assert_array_equal(_block_days(days, np.array([0, 1, 1]), 3), [3, 4, 4])
+    with pytest.raises(ValueError):
+        _block_days(days, np.array([0, 2]), 2)
+
+def _window_lons(lon, bbox):
+    lat = np.array([0.0])
+    return np.concatenate([lon[cols] for _, cols, _ in region_windows(lat, lon, [(-10, 10) + bbox], 1000)])
+
+@pytest.mark.parametrize('lon', [np.arange(-180.0, 180.0, 10.0), np.arange(0.0, 360.0, 10.0)])
+def test_region_windows_wrap_only_the_data(lon):
+    wrapped = (lon + 180.0) % 360.0 - 180.0
+    assert region_windows(np.array([0.0]), lon, [(-10, 10, -180, 180)], 1000) != []
+    for bbox in ((-180, 180), (0, 360), (-200, 160)):
+        np.testing.assert_array_equal(np.sort(_window_lons(lon, bbox)), np.sort(lon))
+
+    east = np.sort(_window_lons(lon, (30, 180)))
+    np.testing.assert_array_equal(east, np.sort(lon[(wrapped >= 30) | (wrapped == -180)]))
+
+    # Across the antimeridian in either convention
+    expected = np.sort(lon[(wrapped >= 170) | (wrapped <= -170)])
+    for bbox in ((170, -170), (170, 190)):
+        np.testing.assert_array_equal(np.sort(_window_lons(lon, bbox)), expected)
+
+def test_dateline_region_on_a_0_360_granule(workdir):
+    lat, lon = np.arange(-5.0, 5.0, 0.5), np.arange(0.0, 360.0, 0.5)
+    write_synthetic_granule(os.path.join('Bronze_Data', 'granule.nc'), 'sst', lat, lon, datetime(2024, 3, 5, 12), compress=False)
+    date_parts = {'year': 2024, 'month': 3, 'day': 5}
+
+    whole = process_netcdf_file(os.path.join('Bronze_Data', 'granule.nc'), 'sst', date_parts, regions=None)
+    region = process_netcdf_file(os.path.join('Bronze_Data', 'granule.nc'), 'sst', date_parts, chunk_size=100, regions=(-2, 2, 175, -175))
+
+    lon_360 = whole['lon'].astype(np.float64) % 360
+    expected = whole[whole['lat'].between(-2, 2) & lon_360.between(175, 185)]
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(_sorted(region), _sorted(expected))
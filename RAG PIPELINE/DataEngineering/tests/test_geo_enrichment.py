@@ -0,0 +1,39 @@
+# Geo enrichment: the bundled basin outlines label open ocean only and leave everything else null.
+import numpy as np
+import pandas as pd
+import pytest
+
+from geo_enrichment import enrich_locations
+
+OPEN_OCEAN = {
+    (15, 63): 'Indian Ocean',
+    (-20, 80): 'Indian Ocean',
+    (35, -40): 'Atlantic Ocean',
+    (-25, -15): 'Atlantic Ocean',
+    (30, -150): 'Pacific Ocean',
+    (20, 150): 'Pacific Ocean',
+    (-62, 0): 'Southern Ocean',
+    (87, 0): 'Arctic Ocean',
+}
+
+OUTSIDE = {
+    'Mediterranean': (35, 18),
+    'Baltic': (58, 20),
+    'Java Sea': (-5, 110),
+    'South China Sea': (12, 113),
+    'Sahara': (23, 10),
+    'Central India': (22, 78),
+    'Antarctica': (-80, 0),
+    'Greenland': (72, -40),
+}
+
+def _basins(points):
+    lat, lon = np.array(points, dtype=np.float64).T
+    return enrich_locations(pd.DataFrame({'lat': lat, 'lon': lon}), verbose=False)['ocean_basin']
+
+def test_open_ocean_points_get_their_basin():
+    assert list(_basins(list(OPEN_OCEAN))) == list(OPEN_OCEAN.values())
+
+@pytest.mark.parametrize('name', OUTSIDE)
+def test_points_outside_every_basin_are_null(name):
+    assert _basins([OUTSIDE[name]]).isna().all()
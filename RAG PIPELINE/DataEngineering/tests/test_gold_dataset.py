@@ -0,0 +1,51 @@
+# Partitioned gold dataset: reads across a month swap and in-place partition rewrites.
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from gold_dataset import save_partitioned_dataset, read_gold_dataset, rewrite_partitions, load_partition_manifest, save_partition_manifest
+
+def _gold_month(year, month, n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'lat': np.round(rng.uniform(-30, 30, n), 2),
+        'lon': np.round(rng.uniform(40, 100, n), 2),
+        'year': year,
+        'month': month,
+        'sst': rng.uniform(20, 30, n),
+    })
+
+def test_read_retries_over_a_month_swap(workdir):
+    dataset_path = save_partitioned_dataset(pd.concat([_gold_month(2024, 1), _gold_month(2024, 2, seed=1)]),
+                                            'Gold_Data', 'merged_gold')
+    expected = read_gold_dataset(dataset_path)
+
+    # The middle of _swap_directory: the month is gone until the staged copy is renamed in
+    month_path = os.path.join(dataset_path, 'year=2024', 'month=2')
+    os.rename(month_path, os.path.join(dataset_path, '.staging-2024-2'))
+    swap = threading.Timer(0.15, os.rename, (os.path.join(dataset_path, '.staging-2024-2'), month_path))
+    swap.start()
+    try:
+        df = read_gold_dataset(dataset_path)
+    finally:
+        swap.join()
+
+    assert len(df) == len(expected) == 400
+    pd.testing.assert_frame_equal(df.sort_values(['month', 'lat', 'lon']).reset_index(drop=True),
+                                  expected.sort_values(['month', 'lat', 'lon']).reset_index(drop=True))
+
+def test_rewrite_partitions_skips_empty_partitions(workdir):
+    dataset_path = save_partitioned_dataset(_gold_month(2024, 1), 'Gold_Data', 'merged_gold')
+    manifest = load_partition_manifest(dataset_path)
+    manifest['partitions']['year=2024/month=1/lat_band=80'] = {
+        'year': 2024, 'month': 1, 'lat_band': 80, 'rows': 0, 'bytes': 0, 'files': [], 'sha256': None}
+    save_partition_manifest(dataset_path, manifest)
+
+    rewritten = rewrite_partitions(dataset_path, lambda df: df.assign(sst=df['sst'] + 1), extra={'enriched': 'v1'})
+
+    partitions = load_partition_manifest(dataset_path)['partitions']
+    assert rewritten == len(partitions)
+    assert all(entry['enriched'] == 'v1' for entry in partitions.values())
+    assert read_gold_dataset(dataset_path)['sst'].min() > 21
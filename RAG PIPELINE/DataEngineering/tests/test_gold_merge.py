@@ -0,0 +1,51 @@
+# Silver → Gold merge: the grid-cell join against the legacy pandas engine, and the out-of-core path.
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gold_layer_fixed import merge_silver_to_gold, _merge_on_grid, _merge_with_pandas
+from gold_dataset import read_gold_dataset
+from silver_layer_fixed import process_and_save_netcdf
+from synthetic_bronze import generate_bronze_tree
+
+YEAR, MONTH = 2024, 3
+CONFIG = {'sst': 'sst', 'Chlorophyll': 'chlor_a'}
+VARIABLES = list(CONFIG.values())
+
+def _cells(df):
+    df = df[['lat', 'lon'] + VARIABLES].astype(np.float64)
+    return df.round({'lat': 4, 'lon': 4}).sort_values(['lat', 'lon']).reset_index(drop=True)
+
+@pytest.fixture
+def silver(workdir):
+    # One granule per variable, so every grid cell has at most one observation of each
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=1, ny=60, nx=80, compress=False)
+    process_and_save_netcdf('Bronze_Data', CONFIG, 'Silver_Data', regions=None, year=YEAR, month=MONTH,
+                            checkpoints=False)
+    return 'Silver_Data'
+
+def test_grid_join_matches_the_pandas_engine(silver):
+    grid = _merge_on_grid(silver, CONFIG, YEAR, MONTH, 0.01)
+    legacy = _merge_with_pandas(silver, CONFIG, YEAR, MONTH)
+
+    assert len(grid) > 0
+    assert (grid['year'] == YEAR).all() and (grid['month'] == MONTH).all()
+    pd.testing.assert_frame_equal(_cells(grid), _cells(legacy), rtol=1e-6)
+
+def test_out_of_core_merge_matches_the_in_memory_join(workdir):
+    # Several granules per variable, so cells are averaged across spill buckets too
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=3, ny=60, nx=80, compress=False)
+    process_and_save_netcdf('Bronze_Data', CONFIG, 'Silver_Data', regions=None, year=YEAR, month=MONTH,
+                            checkpoints=False)
+
+    for gold_layer, memory_budget in (('Gold_Memory', None), ('Gold_Spilled', 64 * 1024)):
+        merge_silver_to_gold('Silver_Data', CONFIG, gold_layer, cube=False, pyramid=False, enrich=False,
+                             region_index=False, year=YEAR, month=MONTH, memory_budget=memory_budget,
+                             checkpoints=False)
+
+    in_memory = read_gold_dataset(os.path.join('Gold_Memory', 'merged_gold'))
+    spilled = read_gold_dataset(os.path.join('Gold_Spilled', 'merged_gold'))
+    assert len(in_memory) > 0
+    pd.testing.assert_frame_equal(_cells(spilled), _cells(in_memory))
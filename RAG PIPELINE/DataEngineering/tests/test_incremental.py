@@ -0,0 +1,79 @@
+# Incremental Silver builds: the processed-file manifest skips, re-extracts and drops granules.
+import os
+
+import pandas as pd
+
+import utils_notebook
+from manifest import load_manifest
+from silver_layer_fixed import process_and_save_netcdf
+from synthetic_bronze import generate_bronze_tree
+from utils_notebook import read_silver_dataframe
+
+YEAR, MONTH = 2024, 3
+CONFIG = {'sst': 'sst'}
+BRONZE = os.path.join('Bronze_Data', str(YEAR), f"{MONTH:02d}", 'sst')
+OUTPUT = os.path.join('Silver_Data', str(YEAR), f"{MONTH:02d}", 'sst')
+
+def _run(silver_layer='Silver_Data', incremental=True, regions=None):
+    process_and_save_netcdf('Bronze_Data', CONFIG, silver_layer, regions=regions, year=YEAR, month=MONTH,
+                            incremental=incremental, checkpoints=False)
+
+def _silver(silver_layer='Silver_Data'):
+    df = read_silver_dataframe(silver_layer, YEAR, MONTH, 'sst')
+    return df.sort_values(['day', 'lat', 'lon']).reset_index(drop=True)
+
+def _opened(monkeypatch):
+    """Names of the granules extracted from here on"""
+    opened = []
+    iter_netcdf_batches = utils_notebook.iter_netcdf_batches
+
+    def recording(nc_file, *args, **kwargs):
+        opened.append(os.path.basename(nc_file))
+        return iter_netcdf_batches(nc_file, *args, **kwargs)
+
+    monkeypatch.setattr('silver_layer_fixed.iter_netcdf_batches', recording)
+    return opened
+
+def test_only_new_or_changed_granules_are_extracted(workdir, monkeypatch):
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=3, ny=30, nx=40, compress=False)
+    _run()
+    names = sorted(os.listdir(BRONZE))
+    assert sorted(load_manifest(OUTPUT)['files']) == names
+
+    opened = _opened(monkeypatch)
+    _run()
+    assert opened == []
+
+    # Touched but identical: the content hash matches, nothing is re-read
+    os.utime(os.path.join(BRONZE, names[0]))
+    _run()
+    assert opened == []
+
+    # One granule rewritten with other data, one removed
+    os.remove(os.path.join(BRONZE, names[2]))
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=1, ny=30, nx=40, compress=False, seed=5)
+    _run()
+    assert opened == [names[0]]
+    assert sorted(load_manifest(OUTPUT)['files']) == sorted(os.listdir(BRONZE))
+
+    _run('Expected', incremental=False)
+    pd.testing.assert_frame_equal(_silver(), _silver('Expected'))
+
+def test_changed_extraction_settings_re_extract_every_granule(workdir, monkeypatch):
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, CONFIG, granules=3, ny=30, nx=40, compress=False)
+    _run()
+
+    opened = _opened(monkeypatch)
+    region = (-10.0, 10.0, 60.0, 90.0)
+    _run(regions=region)
+    assert sorted(opened) == sorted(os.listdir(BRONZE))
+
+    # Only fragments of the new settings are left
+    fragments = [name for name in os.listdir(os.path.join(OUTPUT, 'fragments')) if not name.startswith('.')]
+    assert len(fragments) == 3
+    _run('Expected', incremental=False, regions=region)
+    pd.testing.assert_frame_equal(_silver(), _silver('Expected'))
+
+    opened.clear()
+    _run(regions=region)
+    assert opened == []
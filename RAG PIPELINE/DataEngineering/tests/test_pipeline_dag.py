@@ -0,0 +1,34 @@
+# Stage graph runner: which input fingerprint a finished stage records.
+import os
+
+from pipeline_dag import Stage, run_dag
+
+def _write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def _statuses(stages):
+    return [entry['status'] for entry in run_dag(stages, 'state.json', 'reports')['stages']]
+
+def test_input_changed_during_a_run_runs_again(workdir):
+    _write('input.txt', 'a')
+    runs = []
+
+    def run():
+        runs.append(1)
+        if len(runs) == 1:
+            # Lands after the stage read its input
+            os.utime('input.txt', ns=(0, 0))
+
+    stage = Stage('load', run, inputs=['input.txt'])
+    assert _statuses([stage]) == ['ran']
+    assert _statuses([stage]) == ['ran']
+    assert _statuses([stage]) == ['skipped']
+
+def test_stage_rewriting_its_inputs_is_skipped_next_time(workdir):
+    _write('gold.txt', 'rows')
+    stage = Stage('enrich', lambda: _write('gold.txt', 'rows + labels'), inputs=['gold.txt'],
+                  outputs=['gold.txt'], rewrites_inputs=True)
+
+    assert _statuses([stage]) == ['ran']
+    assert _statuses([stage]) == ['skipped']
@@ -0,0 +1,72 @@
+# Platinum upsert: only changed gold partitions are merged and the table ends up equal to gold.
+import numpy as np
+import pandas as pd
+import pytest
+
+from gold_dataset import save_partitioned_dataset, read_gold_dataset
+from platinum_loader import SQLiteBackend, upsert_gold_dataset
+
+def _gold_month(month, lat_max=30, sst_offset=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.round(np.linspace(-30, lat_max, 200), 2)
+    return pd.DataFrame({
+        'cell_id': np.arange(200, dtype=np.int64),
+        'lat': lat,
+        'lon': np.round(rng.uniform(40, 100, 200), 2),
+        'year': 2024,
+        'month': month,
+        'sst': rng.uniform(20, 30, 200) + sst_offset,
+    })
+
+DTYPES = {'cell_id': np.int64, 'year': np.int64, 'month': np.int64, 'sst': np.float64}
+
+def _sorted(df):
+    return df.astype(DTYPES).sort_values(['year', 'month', 'cell_id']).reset_index(drop=True)
+
+def _table(backend):
+    return _sorted(pd.read_sql('SELECT cell_id, year, month, sst FROM gold', backend.conn))
+
+def _gold(dataset_path):
+    return _sorted(read_gold_dataset(dataset_path)[list(DTYPES)])
+
+@pytest.fixture
+def backend(workdir):
+    backend = SQLiteBackend('platinum.db')
+    yield backend
+    backend.close()
+
+def test_upsert_touches_only_changed_partitions(backend):
+    dataset_path = save_partitioned_dataset(pd.concat([_gold_month(1), _gold_month(2, seed=1)]),
+                                            'Gold_Data', 'merged_gold')
+    first = upsert_gold_dataset(dataset_path, 'gold', backend)
+    assert first['rows_written'] == 400
+    pd.testing.assert_frame_equal(_table(backend), _gold(dataset_path))
+
+    assert upsert_gold_dataset(dataset_path, 'gold', backend) == {'changed': 0, 'removed': 0, 'rows_written': 0}
+
+    # February again: new values, and no rows north of 0 (its northern lat bands disappear)
+    february = _gold_month(2, sst_offset=5.0, seed=1)
+    save_partitioned_dataset(february[february['lat'] < 0], 'Gold_Data', 'merged_gold')
+    second = upsert_gold_dataset(dataset_path, 'gold', backend)
+
+    assert second['changed'] == 3 and second['removed'] == 4
+    assert second['rows_written'] == (february['lat'] < 0).sum()
+    pd.testing.assert_frame_equal(_table(backend), _gold(dataset_path))
+
+def test_new_gold_columns_reload_the_table(backend):
+    dataset_path = save_partitioned_dataset(pd.concat([_gold_month(1), _gold_month(2, seed=1)]),
+                                            'Gold_Data', 'merged_gold')
+    upsert_gold_dataset(dataset_path, 'gold', backend)
+
+    # Enrichment adds a column to every partition
+    enriched = pd.concat([_gold_month(1), _gold_month(2, seed=1)])
+    enriched['EEZ'] = np.where(enriched['lon'] < 70, 'West', 'East')
+    save_partitioned_dataset(enriched, 'Gold_Data', 'merged_gold')
+
+    assert upsert_gold_dataset(dataset_path, 'gold', backend)['rows_written'] == 400
+    table = _sorted(pd.read_sql('SELECT cell_id, year, month, sst, EEZ FROM gold', backend.conn))
+    gold = _sorted(read_gold_dataset(dataset_path)[list(DTYPES) + ['EEZ']].astype({'EEZ': str}))
+    pd.testing.assert_frame_equal(table, gold)
+
+    # The ledger was rebuilt with the reload
+    assert upsert_gold_dataset(dataset_path, 'gold', backend) == {'changed': 0, 'removed': 0, 'rows_written': 0}
@@ -0,0 +1,64 @@
+# Sharded runs: N shards plus finalize_shards produce the Silver files and gold month of a single run.
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sharding
+from config import SLIVER_CONFIG
+from gold_dataset import read_gold_dataset
+from gold_layer_fixed import merge_silver_to_gold
+from sharding import run_silver_shard, run_gold_shard, finalize_shards, parse_shard
+from silver_layer_fixed import process_and_save_netcdf
+from synthetic_bronze import generate_bronze_tree
+from utils_notebook import read_silver_dataframe
+
+YEAR, MONTH = 2024, 3
+SHARDS = 2
+VARIABLES = list(SLIVER_CONFIG.values())
+
+def _silver(silver_layer, folder_name):
+    df = read_silver_dataframe(silver_layer, YEAR, MONTH, folder_name)
+    return df.sort_values(['day', 'lat', 'lon']).reset_index(drop=True)
+
+def _gold(gold_layer):
+    df = read_gold_dataset(os.path.join(gold_layer, 'merged_gold'))
+    df = df[['lat', 'lon'] + VARIABLES].astype(np.float64)
+    return df.sort_values(['lat', 'lon']).reset_index(drop=True)
+
+def test_parse_shard():
+    assert parse_shard('1/4') == (1, 4)
+    for text in ('4/4', '-1/2', 'one/two', '3'):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+def test_shards_match_an_unsharded_run(workdir, monkeypatch):
+    # The sharded layers are the config's; every variable folder gets two granules
+    generate_bronze_tree('Bronze_Data', YEAR, MONTH, granules=2, ny=30, nx=40, compress=False)
+    process_and_save_netcdf('Bronze_Data', SLIVER_CONFIG, 'Expected_Silver', regions=None, year=YEAR, month=MONTH,
+                            multi_variable=False, checkpoints=False)
+    merge_silver_to_gold('Expected_Silver', SLIVER_CONFIG, 'Expected_Gold', cube=False, pyramid=False, enrich=False,
+                         region_index=False, year=YEAR, month=MONTH, memory_budget=None, checkpoints=False)
+
+    finalized = []
+    monkeypatch.setattr(sharding, 'finalize_backfill', lambda platinum, months: finalized.append((platinum, months)))
+
+    # In one process the shards run step by step: gold waits for every shard's Silver parts
+    silver_rows = sum(run_silver_shard(index, SHARDS, YEAR, MONTH) for index in range(SHARDS))
+    gold_rows = sum(run_gold_shard(index, SHARDS, YEAR, MONTH, memory_budget=64 * 1024, timeout=0)
+                    for index in range(SHARDS))
+    totals = finalize_shards(SHARDS, YEAR, MONTH)
+
+    assert totals == {'silver_rows': silver_rows, 'gold_rows': gold_rows}
+    assert finalized == [(False, [(YEAR, MONTH)])]
+
+    for folder_name in SLIVER_CONFIG:
+        pd.testing.assert_frame_equal(_silver('Silver_Data', folder_name), _silver('Expected_Silver', folder_name))
+    expected = _gold('Expected_Gold')
+    assert gold_rows == len(expected) > 0
+    pd.testing.assert_frame_equal(_gold('Gold_Data'), expected)
+
+    # The shard scratch space is gone
+    assert not os.path.exists(os.path.join('Silver_Data', str(YEAR), f"{MONTH:02d}", sharding.SHARDS_DIR))
+    assert not any(name.startswith('.') for name in os.listdir(os.path.join('Gold_Data', 'merged_gold')))
@@ -1,15 +1,120 @@
 import os
+import sys
+import shutil
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import netCDF4 as nc
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 
+from schema import PACKED_ATTR, enforce_schema, packed_encodings, pack_values, decode_packed, align_packing, concat_frames, to_arrow_table, read_packing
+from config import SILVER_ROW_GROUP_SIZE, SILVER_COMPRESSION
+
 def get_current_date_parts():
     """Get current year, month, day"""
     now = datetime.now()
     return now.year, now.month, now.day
 
+def month_date_parts(year=None, month=None):
+    """Date parts for a partition month; the current month when year/month are None
+
+    day is the fallback for granules without a readable timestamp: today
+    for the current month, the 1st for any other month.
+    """
+    now = datetime.now()
+    if year is None or month is None:
+        return {'year': now.year, 'month': now.month, 'day': now.day}
+    day = now.day if (int(year), int(month)) == (now.year, now.month) else 1
+    return {'year': int(year), 'month': int(month), 'day': day}
+
+def parse_month(text):
+    """(year, month) from a 'YYYY-MM' string"""
+    try:
+        year, month = (int(part) for part in str(text).split('-'))
+    except ValueError:
+        raise ValueError(f"Expected a YYYY-MM month, got {text!r}")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Month out of range in {text!r}")
+    return year, month
+
+def month_range(start, end):
+    """Every (year, month) from start to end inclusive"""
+    first = start[0] * 12 + start[1] - 1
+    last = end[0] * 12 + end[1] - 1
+    return [(period // 12, period % 12 + 1) for period in range(first, last + 1)]
+
+TIME_VARIABLES = ['time', 'juld']
+
+def read_observation_times(dataset):
+    """Observation datetime of each time step of a granule, or [] if none is readable
+
+    Values of a 'time' (or Argo 'juld') variable with "<unit> since <epoch>"
+    units are decoded, with None for masked steps; the time_coverage_start
+    global attribute is used when no such variable exists.
+    """
+    for name in TIME_VARIABLES:
+        var = dataset.variables.get(name)
+        units = getattr(var, 'units', '') if var is not None else ''
+        if ' since ' not in units:
+            continue
+
+        values = np.ma.masked_invalid(np.ma.atleast_1d(var[:]).ravel())
+        if values.count() == 0:
+            continue
+
+        steps = np.flatnonzero(~np.ma.getmaskarray(values))
+        try:
+            decoded = nc.num2date(np.ma.getdata(values)[steps], units, getattr(var, 'calendar', 'standard'),
+                                  only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+        except (ValueError, TypeError):
+            continue
+
+        times = [None] * len(values)
+        for step, observed in zip(steps, np.atleast_1d(decoded)):
+            times[step] = observed
+        return times
+
+    start = getattr(dataset, 'time_coverage_start', None)
+    if start:
+        try:
+            return [datetime.strptime(str(start)[:19], '%Y-%m-%dT%H:%M:%S')]
+        except ValueError:
+            pass
+    return []
+
+def _observation_days(dataset, nc_file, date_parts):
+    """Day of month of each time step of a granule
+
+    Rows are filed under the folder's year/month, so a step observed in
+    another month keeps the fallback day instead of its own (which could
+    be no date at all in the folder's month, e.g. the 31st in February);
+    those steps are reported.
+    """
+    times = read_observation_times(dataset) or [None]
+    month = (int(date_parts['year']), int(date_parts['month']))
+    days = np.array([t.day if t is not None and (t.year, t.month) == month else date_parts['day'] for t in times],
+                    dtype=np.int16)
+
+    elsewhere = sorted({f"{t.year}-{t.month:02d}" for t in times if t is not None and (t.year, t.month) != month})
+    if elsewhere:
+        print(f"[WARN] {nc_file} has observations from {', '.join(elsewhere)} but is filed under "
+              f"{month[0]}-{month[1]:02d}; those rows keep day {date_parts['day']}")
+    return days
+
+def _block_days(days, steps, n):
+    """Day of every pixel of a block from its time-step indices (None: a single-step variable)
+
+    A step beyond the granule's time axis means the variable and its time
+    coordinate disagree, so the file is rejected rather than given guessed days.
+    """
+    if steps is None or len(days) == 1:
+        return np.full(n, days[0], dtype=np.int16)
+    if len(steps) and steps.max() >= len(days):
+        raise ValueError(f"Time step {int(steps.max())} beyond the {len(days)} observation times of the granule")
+    return days[steps]
+
 def build_input_path(base_folder, year, month, folder_name):
     """Build input path for data files"""
     return os.path.join(base_folder, str(year), str(month).zfill(2), folder_name)
@@ -23,83 +128,597 @@ def build_output_path(base_folder, year, month, folder_name):
 def save_dataframe(df, output_path, filename, file_format='parquet'):
     """Save dataframe to specified format"""
     os.makedirs(output_path, exist_ok=True)
+    df = enforce_schema(df)
 
     if file_format == 'parquet':
-        df.to_parquet(os.path.join(output_path, f"cleaned_{filename}.parquet"), index=False)
+        write_parquet(df, os.path.join(output_path, f"cleaned_{filename}.parquet"))
     elif file_format == 'csv':
-        df.to_csv(os.path.join(output_path, f"cleaned_{filename}.csv"), index=False)
+        # CSV has nowhere to keep the scale metadata, so packed columns are decoded
+        decode_packed(df.copy()).to_csv(os.path.join(output_path, f"cleaned_{filename}.csv"), index=False)
     else:
         raise ValueError(f"Unsupported file format: {file_format}")
 
     print(f"[INFO] Saved {len(df)} records to {output_path}")
 
-def process_internal_folder(input_path, variable, date_parts, folder_name):
-    """Process NetCDF files in a folder"""
-    df_list = []
+def write_parquet(df, path):
+    """Write a frame to parquet, recording the encodings of its packed columns"""
+    pq.write_table(to_arrow_table(df), path)
+
+def read_parquet_file(path, columns=None):
+    """Read a parquet file, restoring the encodings of its packed columns"""
+    df = pd.read_parquet(path, columns=columns)
+    df.attrs[PACKED_ATTR] = {col: encoding for col, encoding in read_packing(pq.read_schema(path)).items()
+                             if col in df.columns}
+    return df
+
+class ParquetBatchWriter:
+    """Stream record batches into one parquet file in row groups of row_group_size rows
+
+    Batches are buffered only up to a row group, so memory stays flat
+    however many batches arrive. The file is written under a hidden
+    temporary name and moved into place by close(); abort() discards it.
+    The first batch fixes the encoding of packed columns and later batches
+    are aligned to it.
+    """
+
+    def __init__(self, path, row_group_size=SILVER_ROW_GROUP_SIZE, compression=SILVER_COMPRESSION):
+        self.path = path
+        self.tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.packing = None
+        self.rows = 0
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, df):
+        """Append a record batch"""
+        if df.empty:
+            return
+
+        df = enforce_schema(df)
+        if self.packing is None:
+            self.packing = packed_encodings(df)
+        else:
+            df = align_packing(df, self.packing)
+
+        self._pending.append(to_arrow_table(df))
+        self._pending_rows += len(df)
+        self.rows += len(df)
+
+        while self._pending_rows >= self.row_group_size:
+            self._flush(self.row_group_size)
+
+    def _flush(self, n_rows):
+        """Write the first n_rows buffered rows as one row group"""
+        table = pa.concat_tables(self._pending)
+
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._writer = pq.ParquetWriter(self.tmp_path, table.schema, compression=self.compression)
+
+        self._writer.write_table(table.slice(0, n_rows), row_group_size=n_rows)
+        rest = table.slice(n_rows)
+        self._pending = [rest] if len(rest) else []
+        self._pending_rows = len(rest)
+
+    def close(self):
+        """Write the last row group and move the file into place; returns rows written (0: no file)"""
+        if self._pending_rows:
+            self._flush(self._pending_rows)
+        if self._writer is None:
+            return 0
+
+        self._writer.close()
+        self._writer = None
+        os.replace(self.tmp_path, self.path)
+        return self.rows
+
+    def abort(self):
+        """Drop the partial file"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self._pending, self._pending_rows = [], 0
+
+def write_parquet_batches(batches, path, row_group_size=SILVER_ROW_GROUP_SIZE, compression=SILVER_COMPRESSION):
+    """Stream record batches into one parquet file; returns rows written (no file when there are none)"""
+    writer = ParquetBatchWriter(path, row_group_size, compression)
+    try:
+        for batch in batches:
+            writer.write(batch)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+def read_grid_coordinates(dataset):
+    """Read lat/lon coordinates, keeping 2-D grids as lazy variables"""
+    if 'lat' not in dataset.variables or 'lon' not in dataset.variables:
+        return None, None
+
+    lat_var = dataset.variables['lat']
+    lon_var = dataset.variables['lon']
+
+    # 1-D axes are small, 2-D grids are sliced per row block later
+    if lat_var.ndim == 1 and lon_var.ndim == 1:
+        return lat_var[:], lon_var[:]
+    elif lat_var.ndim == 2 and lon_var.ndim == 2:
+        return lat_var, lon_var
+
+    return None, None
+
+def normalize_regions(regions):
+    """Accept one (lat_min, lat_max, lon_min, lon_max) bbox or a list of them
+
+    Longitude bounds may be given in -180-180 or 0-360 and are brought to
+    [-180, 180]; a bbox crossing the antimeridian (lon_min > lon_max after
+    wrapping) is split into its eastern and western halves.
+    """
+    if not regions:
+        return None
+    if len(regions) == 4 and all(np.isscalar(v) for v in regions):
+        regions = [regions]
+    return [(lat_min, lat_max, lo, hi)
+            for lat_min, lat_max, lon_min, lon_max in regions
+            for lo, hi in _lon_intervals(lon_min, lon_max)]
+
+def _wrap_lon(lon):
+    """Map longitudes to [-180, 180) so 0-360 grids match -180-180 bboxes"""
+    return (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+
+def _lon_intervals(lon_min, lon_max):
+    """Longitude bounds as [(lo, hi)] intervals within [-180, 180]"""
+    if lon_max - lon_min >= 360:
+        return [(-180.0, 180.0)]
+
+    lo, hi = float(_wrap_lon(lon_min)), float(_wrap_lon(lon_max))
+    if hi == -180.0 and lon_max != lon_min:
+        return [(lo, 180.0), (-180.0, -180.0)]  # an eastern bound on the antimeridian; 180 wraps to -180
+    if lo > hi:
+        return [(lo, 180.0), (-180.0, hi)]
+    return [(lo, hi)]
+
+def _lon_in_range(lon, lon_min, lon_max):
+    """Mask of longitudes (any convention) within a normalized [lon_min, lon_max] interval"""
+    lon = _wrap_lon(lon)
+    return (lon >= lon_min) & (lon <= lon_max)
+
+def _in_bbox(lat, lon, bbox):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    return (lat >= lat_min) & (lat <= lat_max) & _lon_in_range(lon, lon_min, lon_max)
+
+def _index_span(mask):
+    """Smallest slice covering the True entries of a 1-D mask, or None"""
+    hits = np.flatnonzero(mask)
+    return slice(int(hits[0]), int(hits[-1]) + 1) if hits.size else None
+
+def region_windows(lat, lon, regions, chunk_size):
+    """Translate bboxes into (row slice, col slice, bbox) hyperslabs of the grid
+
+    Bboxes are normalized first, so one crossing the antimeridian
+    yields a window on each side. 1-D axes are matched directly. For 2-D grids the coordinate arrays are
+    scanned in row blocks to find the rows and columns touching each bbox,
+    so only the covering hyperslab of each variable has to be read.
+    """
+    if lat.ndim == 1:
+        n_rows, n_cols = lat.shape[0], lon.shape[0]
+    else:
+        n_rows, n_cols = lat.shape
+
+    regions = normalize_regions(regions)
+    if not regions:
+        return [(slice(0, n_rows), slice(0, n_cols), None)]
+
+    windows = []
+    for bbox in regions:
+        lat_min, lat_max, lon_min, lon_max = bbox
+
+        if lat.ndim == 1:
+            lat_data = np.ma.getdata(lat)
+            rows = _index_span((lat_data >= lat_min) & (lat_data <= lat_max))
+            cols = _index_span(_lon_in_range(np.ma.getdata(lon), lon_min, lon_max))
+        else:
+            row_hits = np.zeros(n_rows, dtype=bool)
+            col_hits = np.zeros(n_cols, dtype=bool)
+            rows_per_block = max(1, chunk_size // max(n_cols, 1))
+
+            for start in range(0, n_rows, rows_per_block):
+                stop = min(start + rows_per_block, n_rows)
+                inside = _in_bbox(np.ma.getdata(lat[start:stop, :]), np.ma.getdata(lon[start:stop, :]), bbox)
+                row_hits[start:stop] = inside.any(axis=1)
+                col_hits |= inside.any(axis=0)
+
+            rows, cols = _index_span(row_hits), _index_span(col_hits)
+
+        if rows is not None and cols is not None:
+            windows.append((rows, cols, bbox))
+
+    return windows
+
+def packed_encoding(var):
+    """scale_factor/add_offset encoding of an integer NetCDF variable, or None if it is not packed"""
+    if var.dtype.kind not in 'iu' or getattr(var, '_Unsigned', 'false') == 'true':
+        return None
+    if not hasattr(var, 'scale_factor') and not hasattr(var, 'add_offset'):
+        return None
+    return {
+        'dtype': var.dtype.name,
+        'scale_factor': float(getattr(var, 'scale_factor', 1.0)),
+        'add_offset': float(getattr(var, 'add_offset', 0.0)),
+    }
+
+def _packing_plan(dataset, variables, packed, encodings):
+    """Variables of a file to read as raw integers, and {variable: encoding} of those to re-pack
+
+    The first file holding a packed variable fixes its encoding for the
+    run (recorded in encodings); files packed differently, or not at all,
+    are read decoded and re-packed to it.
+    """
+    raw, repack = [], {}
+    for variable in variables:
+        encoding = packed_encoding(dataset.variables[variable]) if variable in packed else None
+        reference = encodings.setdefault(variable, encoding)
+
+        if encoding is not None and encoding == reference:
+            raw.append(variable)
+        elif reference is not None:
+            repack[variable] = reference
+    return raw, repack
+
+def iter_grid_blocks(dataset, variables, chunk_size, regions=None, raw=()):
+    """Yield (variable, lat, lon, values, steps) arrays of valid pixels, one row block at a time
 
+    Variables are either (lat, lon) or (time, lat, lon) on the shared grid.
+    Each block's coordinates, their mask and the region masks are read and
+    computed once and reused for every variable. A time dimension is read
+    in the same hyperslab (all steps at once) with the coordinates and step
+    indices broadcast over it as views, so only the valid pixels are ever
+    materialized; steps holds each pixel's time index, or is None for 2-D
+    variables. With regions, only the hyperslabs covering each bbox are
+    read, and pixels already covered by an earlier bbox are not yielded twice.
+    Variables in raw are read as their packed integers (fill values still
+    masked) instead of being decoded to float64.
+    """
+    lat, lon = read_grid_coordinates(dataset)
+
+    for variable in raw:
+        dataset.variables[variable].set_auto_scale(False)
+
+    if lat.ndim == 1:
+        grid_shape = (lat.shape[0], lon.shape[0])
+    else:
+        grid_shape = lat.shape
+
+    n_steps = {}
+    for variable in variables:
+        shape = dataset.variables[variable].shape
+        if shape == grid_shape:
+            n_steps[variable] = None
+        elif len(shape) == 3 and shape[1:] == grid_shape:
+            n_steps[variable] = shape[0]
+        else:
+            raise ValueError(f"Variable {variable} shape {shape} does not match grid {grid_shape}")
+
+    # Blocks hold about chunk_size values of the deepest variable
+    depth = max([steps for steps in n_steps.values() if steps] + [1])
+    windows = region_windows(lat, lon, regions, chunk_size)
+
+    for index, (rows, cols, bbox) in enumerate(windows):
+        n_cols = cols.stop - cols.start
+        rows_per_block = max(1, chunk_size // max(n_cols * depth, 1))
+
+        for start in range(rows.start, rows.stop, rows_per_block):
+            stop = min(start + rows_per_block, rows.stop)
+            block_shape = (stop - start, n_cols)
+
+            if lat.ndim == 1:
+                # Broadcast the 1-D axes over the block instead of a full meshgrid
+                lat_block = lat[start:stop, np.newaxis]
+                lon_block = lon[np.newaxis, cols]
+            else:
+                lat_block = lat[start:stop, cols]
+                lon_block = lon[start:stop, cols]
+
+            coord_valid = ~np.broadcast_to(np.ma.getmaskarray(lat_block) | np.ma.getmaskarray(lon_block), block_shape)
+            lat_grid = np.broadcast_to(np.ma.getdata(lat_block), block_shape)
+            lon_grid = np.broadcast_to(np.ma.getdata(lon_block), block_shape)
+
+            if bbox is not None:
+                coord_valid = coord_valid & _in_bbox(lat_grid, lon_grid, bbox)
+                for earlier in windows[:index]:
+                    coord_valid &= ~_in_bbox(lat_grid, lon_grid, earlier[2])
+
+            if not coord_valid.any():
+                continue
+
+            for variable in variables:
+                steps = n_steps[variable]
+                if steps is None:
+                    values = dataset.variables[variable][start:stop, cols]
+                else:
+                    values = dataset.variables[variable][:, start:stop, cols]
+
+                # Drop masked/fill pixels and NaNs without building a DataFrame
+                data = np.ma.getdata(values)
+                valid = np.broadcast_to(coord_valid, data.shape) & ~np.ma.getmaskarray(values)
+                valid &= np.isfinite(data)
+
+                if not valid.any():
+                    continue
+                if steps is None:
+                    yield variable, lat_grid[valid], lon_grid[valid], data[valid], None
+                else:
+                    step_index = np.arange(steps, dtype=np.int16)[:, np.newaxis, np.newaxis]
+                    yield (variable, np.broadcast_to(lat_grid, data.shape)[valid], np.broadcast_to(lon_grid, data.shape)[valid],
+                           data[valid], np.broadcast_to(step_index, data.shape)[valid])
+
+def iter_variable_blocks(dataset, variable, chunk_size, regions=None):
+    """Yield (lat, lon, values) arrays of valid pixels of one variable, one row block at a time"""
+    for _, lat, lon, values, _ in iter_grid_blocks(dataset, [variable], chunk_size, regions):
+        yield lat, lon, values
+
+def _records_frame(lat, lon, values, day, variable, date_parts, encoding=None):
+    """Build a silver record batch from flat coordinate, value and day arrays
+
+    With an encoding, values are packed integers and the encoding is kept
+    in the frame's attrs.
+    """
+    df = pd.DataFrame({
+        'lat': lat,
+        'lon': lon,
+        'year': date_parts['year'],
+        'month': date_parts['month'],
+        'day': day,
+        variable: values
+    })
+    if encoding is not None:
+        df.attrs[PACKED_ATTR] = {variable: encoding}
+    return enforce_schema(df)
+
+def rebatch_blocks(blocks, variable, date_parts, batch_size, encodings=None):
+    """Regroup variable-sized (lat, lon, values, day) pixel blocks into fixed-size record batches"""
+    encodings = {} if encodings is None else encodings
+    pending = []
+    pending_rows = 0
+
+    for block in blocks:
+        pending.append(block)
+        pending_rows += len(block[2])
+        if pending_rows < batch_size:
+            continue
+
+        # Concatenated once, then cut into batches at a moving offset
+        lat, lon, values, day = (np.concatenate(parts) for parts in zip(*pending))
+        start = 0
+        while pending_rows - start >= batch_size:
+            stop = start + batch_size
+            yield _records_frame(lat[start:stop], lon[start:stop], values[start:stop], day[start:stop],
+                                 variable, date_parts, encodings.get(variable))
+            start = stop
+
+        pending = [(lat[start:], lon[start:], values[start:], day[start:])]
+        pending_rows -= start
+
+    if pending_rows:
+        lat, lon, values, day = (np.concatenate(parts) for parts in zip(*pending))
+        yield _records_frame(lat, lon, values, day, variable, date_parts, encodings.get(variable))
+
+def _iter_file_blocks(nc_file, variable, chunk_size, date_parts, regions=None, packed=(), encodings=None):
+    """Yield valid pixel blocks of one file, stamped with their observation day; read errors are raised
+
+    A variable listed in packed stays in its integer encoding, which is
+    recorded in encodings (see _packing_plan).
+    """
+    encodings = {} if encodings is None else encodings
+    print(f"[INFO] Processing {nc_file}")
+    with nc.Dataset(nc_file, 'r') as dataset:
+        lat, lon = read_grid_coordinates(dataset)
+
+        if lat is None:
+            print(f"[WARN] Unexpected lat/lon dimensions in {nc_file}")
+            return
+
+        if variable not in dataset.variables:
+            print(f"[WARN] Variable {variable} not found in {nc_file}")
+            return
+
+        days = _observation_days(dataset, nc_file, date_parts)
+        raw, repack = _packing_plan(dataset, [variable], packed, encodings)
+        if repack:
+            print(f"[WARN] {variable} in {nc_file} is encoded differently, re-packing it")
+
+        for _, lat_block, lon_block, values, steps in iter_grid_blocks(dataset, [variable], chunk_size, regions, raw):
+            if variable in repack:
+                values = pack_values(values, repack[variable])
+            yield lat_block, lon_block, values, _block_days(days, steps, len(values))
+
+def iter_netcdf_batches(nc_file, variable, date_parts, chunk_size, batch_size, regions=None, packed=(), encodings=None):
+    """Stream one NetCDF file as fixed-size record batches, raising on read errors"""
+    encodings = {} if encodings is None else encodings
+    blocks = _iter_file_blocks(nc_file, variable, chunk_size, date_parts, regions, packed, encodings)
+    yield from rebatch_blocks(blocks, variable, date_parts, batch_size, encodings)
+
+def list_netcdf_files(input_path):
+    """List NetCDF files under a folder in a stable order"""
+    if not os.path.exists(input_path):
+        return []
+    return sorted(Path(input_path).rglob("*.nc"))
+
+def process_netcdf_file(nc_file, variable, date_parts, chunk_size=None, batch_size=500_000, regions=None, packed=()):
+    """Extract one NetCDF file into a silver DataFrame, raising on read errors"""
+    # Without a chunk size the whole grid is read as a single block
+    batches = list(iter_netcdf_batches(nc_file, variable, date_parts, chunk_size or sys.maxsize, batch_size,
+                                       regions, packed))
+    return concat_frames(batches) if batches else pd.DataFrame()
+
+def iter_netcdf_variable_batches(nc_file, variables, date_parts, chunk_size, regions=None, packed=(), encodings=None):
+    """Stream (variable, record batch) pairs for every listed variable present in one NetCDF file
+
+    The file is opened once and its coordinates, masks and timestamp are
+    read once for all variables; each row block yields one batch per
+    variable. Variables missing from the file are skipped. Read errors are
+    raised. Variables listed in packed keep their integer encoding, shared
+    through encodings across the files of a run (see _packing_plan).
+    """
+    encodings = {} if encodings is None else encodings
+    print(f"[INFO] Processing {nc_file}")
+    with nc.Dataset(nc_file, 'r') as dataset:
+        lat, lon = read_grid_coordinates(dataset)
+
+        if lat is None:
+            print(f"[WARN] Unexpected lat/lon dimensions in {nc_file}")
+            return
+
+        present = [variable for variable in variables if variable in dataset.variables]
+        if not present:
+            return
+
+        days = _observation_days(dataset, nc_file, date_parts)
+        raw, repack = _packing_plan(dataset, present, packed, encodings)
+        if repack:
+            print(f"[WARN] {', '.join(repack)} in {nc_file} encoded differently, re-packing")
+
+        for variable, lat_block, lon_block, values, steps in iter_grid_blocks(dataset, present, chunk_size, regions, raw):
+            if variable in repack:
+                values = pack_values(values, repack[variable])
+            yield variable, _records_frame(lat_block, lon_block, values, _block_days(days, steps, len(values)),
+                                           variable, date_parts, encodings.get(variable))
+
+def process_netcdf_variables(nc_file, variables, date_parts, chunk_size=None, regions=None, packed=()):
+    """Extract several variables from one NetCDF file in a single pass into {variable: DataFrame}"""
+    batches = {}
+    for variable, batch in iter_netcdf_variable_batches(nc_file, variables, date_parts, chunk_size or sys.maxsize,
+                                                        regions, packed):
+        batches.setdefault(variable, []).append(batch)
+    return {variable: concat_frames(frames) for variable, frames in batches.items()}
+
+def iter_folder_file_batches(input_path, variable, date_parts, chunk_size, batch_size, regions=None, packed=()):
+    """Yield (nc_file, record batches) for every NetCDF file in a folder
+
+    Each file's batches raise on read errors, so the caller can drop what
+    it already took from a file that fails part-way (see
+    process_internal_folder). Packed encodings are fixed by the first file
+    and shared by the rest.
+    """
     if not os.path.exists(input_path):
         print(f"[WARN] Input path does not exist: {input_path}")
-        return pd.DataFrame()
+        return
 
-    try:
-        # Find all .nc files in the input path
-        nc_files = list(Path(input_path).rglob("*.nc"))
+    nc_files = list_netcdf_files(input_path)
 
-        if not nc_files:
-            print(f"[WARN] No NetCDF files found in {input_path}")
-            return pd.DataFrame()
+    if not nc_files:
+        print(f"[WARN] No NetCDF files found in {input_path}")
+        return
 
-        for nc_file in nc_files:
-            try:
-                print(f"[INFO] Processing {nc_file}")
-                with nc.Dataset(nc_file, 'r') as dataset:
-                    # Extract coordinates
-                    if 'lat' in dataset.variables and 'lon' in dataset.variables:
-                        lat = dataset.variables['lat'][:]
-                        lon = dataset.variables['lon'][:]
-
-                        # Handle different grid structures
-                        if lat.ndim == 1 and lon.ndim == 1:
-                            lon_grid, lat_grid = np.meshgrid(lon, lat)
-                        elif lat.ndim == 2 and lon.ndim == 2:
-                            lat_grid, lon_grid = lat, lon
-                        else:
-                            print(f"[WARN] Unexpected lat/lon dimensions in {nc_file}")
-                            continue
-
-                        # Extract variable data
-                        if variable in dataset.variables:
-                            var_data = dataset.variables[variable][:]
-
-                            # Flatten grids and create dataframe
-                            df_temp = pd.DataFrame({
-                                'lat': lat_grid.flatten(),
-                                'lon': lon_grid.flatten(),
-                                'year': date_parts['year'],
-                                'month': date_parts['month'],
-                                'day': date_parts['day'],
-                                variable: var_data.flatten()
-                            })
-
-                            # Remove NaN values
-                            df_temp = df_temp.dropna()
-                            df_list.append(df_temp)
-
-                        else:
-                            print(f"[WARN] Variable {variable} not found in {nc_file}")
+    encodings = {}
+    for nc_file in nc_files:
+        yield nc_file, iter_netcdf_batches(nc_file, variable, date_parts, chunk_size, batch_size, regions, packed,
+                                           encodings)
+
+def silver_files(silver_layer, year, month, folder_name):
+    """Parquet files holding a variable's silver data: the single file, else its fragments"""
+    output_path = os.path.join(silver_layer, str(year), str(month).zfill(2), folder_name)
+    parquet_path = os.path.join(output_path, f"cleaned_{folder_name}.parquet")
+    fragments_path = os.path.join(output_path, 'fragments')
+
+    if os.path.exists(parquet_path):
+        return [parquet_path]
+    if os.path.isdir(fragments_path):
+        return [str(path) for path in sorted(Path(fragments_path).glob('*.parquet'))]
+    return []
+
+def read_silver_dataframe(silver_layer, year, month, folder_name, columns=None):
+    """Read a variable's silver data, from the single file or its fragments"""
+    paths = silver_files(silver_layer, year, month, folder_name)
+
+    if not paths:
+        return None
+    if len(paths) == 1:
+        return enforce_schema(read_parquet_file(paths[0], columns))
 
+    # Fragments are read one by one so granules packed differently are aligned
+    return enforce_schema(concat_frames([read_parquet_file(path, columns) for path in paths]))
+
+def silver_row_count(silver_layer, year, month, folder_name):
+    """Rows of a variable's silver data, from the parquet footers only"""
+    return sum(pq.ParquetFile(path).metadata.num_rows for path in silver_files(silver_layer, year, month, folder_name))
+
+def iter_silver_batches(silver_layer, year, month, folder_name, columns=None, batch_size=500_000):
+    """Stream a variable's silver data as record batches of at most batch_size rows"""
+    return iter_parquet_batches(silver_files(silver_layer, year, month, folder_name), columns, batch_size)
+
+def iter_parquet_batches(paths, columns=None, batch_size=500_000):
+    """Stream silver parquet files as frames of at most batch_size rows, packed columns kept packed"""
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        packing = read_packing(parquet_file.schema_arrow)
+
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            df = batch.to_pandas()
+            df.attrs[PACKED_ATTR] = {col: encoding for col, encoding in packing.items() if col in df.columns}
+            yield enforce_schema(df)
+
+def process_internal_folder(input_path, variable, date_parts, folder_name, chunk_size=None, batch_size=500_000, regions=None,
+                            packed=()):
+    """Process NetCDF files in a folder
+
+    Peak extraction memory is bounded by chunk_size; without one, each
+    file's grid (all time steps) is read as a single block. A variable
+    listed in packed is kept as its packed integers (see schema.PACKED_ATTR).
+    A file is taken whole or not at all: one that fails part-way adds no rows.
+    """
+    df_list = []
+    for nc_file, batches in iter_folder_file_batches(input_path, variable, date_parts, chunk_size or sys.maxsize,
+                                                     batch_size, regions, packed):
+        try:
+            frames = list(batches)
+        except Exception as e:
+            print(f"[ERROR] Error processing {nc_file}: {str(e)}")
+            continue
+        df_list.extend(frames)
+
+    return concat_frames(df_list) if df_list else pd.DataFrame()
+
+def save_internal_folder(input_path, variable, date_parts, output_path, filename, chunk_size=None, batch_size=500_000,
+                         regions=None, packed=()):
+    """Stream a folder's NetCDF files into the cleaned_{filename}.parquet silver file
+
+    Each file is streamed into its own hidden part, kept only once the
+    whole file has been read, and the parts are then streamed into the
+    silver file. Memory stays flat however many granules the folder holds,
+    and a file that fails part-way leaves no rows behind. Returns rows
+    written; nothing is written (and an existing file is kept) when there
+    are none.
+    """
+    parts_dir = os.path.join(output_path, f".cleaned_{filename}.parts")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    part_paths = []
+
+    try:
+        for index, (nc_file, batches) in enumerate(iter_folder_file_batches(
+                input_path, variable, date_parts, chunk_size or sys.maxsize, batch_size, regions, packed)):
+            part_path = os.path.join(parts_dir, f"{index:05d}.parquet")
+            try:
+                if write_parquet_batches(batches, part_path):
+                    part_paths.append(part_path)
             except Exception as e:
                 print(f"[ERROR] Error processing {nc_file}: {str(e)}")
-                continue
 
-        if df_list:
-            return pd.concat(df_list, ignore_index=True)
-        else:
-            return pd.DataFrame()
+        rows = merge_parquet_parts(part_paths, os.path.join(output_path, f"cleaned_{filename}.parquet"), batch_size)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    if rows:
+        print(f"[INFO] Saved {rows} records to {output_path}")
+    return rows
 
-    except Exception as e:
-        print(f"[ERROR] Error processing folder {input_path}: {str(e)}")
-        return pd.DataFrame()
+def merge_parquet_parts(part_paths, path, batch_size=500_000):
+    """Stream part files, in order, into one parquet file; returns rows written (no file when there are none)"""
+    return write_parquet_batches(iter_parquet_batches(part_paths, batch_size=batch_size), path)
 
 def validate_dataframe(df, required_columns):
     """Validate dataframe structure"""
@@ -1,4 +1,5 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -8,6 +9,10 @@ import chromadb
 from sentence_transformers import SentenceTransformer
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataEngineering'))
+from gold_dataset import read_gold_dataset
+from cube_store import GoldCube
+
 class DataIntegration:
     def __init__(self):
         self.geolocator = Nominatim(user_agent="oceanographic_chatbot")
@@ -15,16 +20,35 @@ class DataIntegration:
         self.collection = self.chroma_client.get_or_create_collection(name="oceanographic_data")
         self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
         self.setup_logging()
+        self.cube = self.load_gold_cube()
 
     def setup_logging(self):
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-    def load_processed_data(self):
-        """Load data from the Gold layer"""
+    def load_gold_cube(self):
+        """Open the memory-mapped gold cube if the pipeline built one"""
+        cube_path = "../DataEngineering/Gold_Data/gold_cube"
+        try:
+            if os.path.exists(cube_path):
+                return GoldCube(cube_path)
+        except Exception as e:
+            self.logger.error(f"Error opening gold cube: {str(e)}")
+        return None
+
+    def load_processed_data(self, lat_range=None, lon_range=None, time_range=None):
+        """Load data from the Gold layer, optionally restricted to a region and time range"""
         gold_layer_path = "../DataEngineering/Gold_Data"
+        gold_dataset_path = os.path.join(gold_layer_path, "merged_gold")
 
         try:
+            # Partitioned gold: only matching partitions and row groups are read
+            if os.path.isdir(gold_dataset_path):
+                self.logger.info(f"Loading processed data from: {gold_dataset_path}")
+                df = read_gold_dataset(gold_dataset_path, lat_range, lon_range, time_range)
+                self.store_in_chromadb(df)
+                return df
+
             # Find the most recent merged gold data
             if os.path.exists(gold_layer_path):
                 for root, dirs, files in os.walk(gold_layer_path):
@@ -124,6 +148,12 @@ class DataIntegration:
 
     def find_nearest_locations(self, lat, lon, top_k=5):
         """Find nearest oceanographic measurement locations"""
+        if self.cube is not None:
+            # Direct array indexing around the query cell; vector search if the cube has no data
+            nearest_data = self.cube.nearest(lat, lon, top_k)
+            if nearest_data:
+                return nearest_data
+
         try:
             # Query ChromaDB for similar documents
             query_text = f"Oceanographic data near coordinates ({lat}, {lon})"
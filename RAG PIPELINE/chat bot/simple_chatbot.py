@@ -15,6 +15,9 @@ import time
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataEngineering'))
+from schema import enforce_schema
+
 class OceanographicChatbot:
     def __init__(self):
         self.df = None
@@ -53,7 +56,7 @@ class OceanographicChatbot:
 
             for path in parent_paths:
                 if os.path.exists(path):
-                    self.df = pd.read_parquet(path).astype(str)
+                    self.df = enforce_schema(pd.read_parquet(path))
                     break
 
             if self.df is None:
@@ -348,7 +351,7 @@ Oceanographic Data Information:
 
 Dataset Overview:
 • Total Records: """ + str(len(self.df)) + """
-• Date Range: """ + self.df['year'].min() + "-" + self.df['year'].max() + """
+• Date Range: """ + str(self.df['year'].min()) + "-" + str(self.df['year'].max()) + """
 • Location Range: """ + str(len(self.df[['lat', 'lon']].drop_duplicates())) + """ unique locations
 
 Available Measurements:
@@ -356,8 +359,8 @@ Available Measurements:
 • Chlorophyll-a concentration
 
 Data Statistics:
-• SST Range: """ + self.df['sst'].min() + """°C - """ + self.df['sst'].max() + """°C
-• Chlorophyll Range: """ + self.df['chlor_a'].min() + " - " + self.df['chlor_a'].max() + """ mg/m³
+• SST Range: """ + str(self.df['sst'].min()) + """°C - """ + str(self.df['sst'].max()) + """°C
+• Chlorophyll Range: """ + str(self.df['chlor_a'].min()) + " - " + str(self.df['chlor_a'].max()) + """ mg/m³
 """
 
         return info
@@ -389,7 +392,7 @@ Chlorophyll Statistics:
 
 Data Summary:
 • Total Records: """ + str(len(self.df)) + """
-• Date Range: """ + self.df['year'].min() + " - " + self.df['year'].max() + """
+• Date Range: """ + str(self.df['year'].min()) + " - " + str(self.df['year'].max()) + """
 • Unique Locations: """ + str(len(self.df[['lat', 'lon']].drop_duplicates())) + """
 """
 
@@ -13,9 +13,16 @@ from plotly.subplots import make_subplots
 import folium
 from streamlit_folium import folium_static
 import json
+import os
+import sys
 from datetime import datetime
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DataEngineering'))
+from pyramid import load_map_cells, collapse_months
+
+GOLD_LAYER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DataEngineering', 'Gold_Data')
+
 # Page configuration
 st.set_page_config(
     page_title="🌊 Visual FloatChat",
@@ -118,24 +125,38 @@ def show_dashboard():
     # Sample data visualization
     st.subheader("🌍 Global Oceanographic Data Distribution")
 
-    # Create sample data for visualization
-    sample_data = pd.DataFrame({
-        'lat': np.random.uniform(-60, 60, 100),
-        'lon': np.random.uniform(-180, 180, 100),
-        'sst': np.random.uniform(15, 35, 100),
-        'chlor_a': np.random.uniform(0.1, 2.0, 100)
-    })
+    # Global overview from the coarsest fitting pyramid level, sample data if not built
+    pyramid_path = os.path.join(GOLD_LAYER_PATH, 'pyramid')
+    if os.path.exists(pyramid_path):
+        cells, level = load_map_cells(pyramid_path, os.path.join(GOLD_LAYER_PATH, 'merged_gold'), max_cells=1000)
+        variables = [col[:-len('_mean')] for col in cells.columns if col.endswith('_mean')]
+        cells = collapse_months(cells, variables)
+        sample_data = cells.rename(columns={f"{var}_mean": var for var in variables})
+    else:
+        sample_data = pd.DataFrame({
+            'lat': np.random.uniform(-60, 60, 100),
+            'lon': np.random.uniform(-180, 180, 100),
+            'sst': np.random.uniform(15, 35, 100),
+            'chlor_a': np.random.uniform(0.1, 2.0, 100)
+        })
 
     # Map visualization
     st.subheader("Interactive World Map")
     m = folium.Map(location=[20, 0], zoom_start=2)
 
+    # A pyramid may hold only one of the variables
+    has_sst, has_chlor = 'sst' in sample_data.columns, 'chlor_a' in sample_data.columns
     for idx, row in sample_data.iterrows():
+        popup = []
+        if has_sst:
+            popup.append(f"SST: {row['sst']:.1f}°C")
+        if has_chlor:
+            popup.append(f"Chlorophyll-a: {row['chlor_a']:.2f} mg/m³")
         folium.CircleMarker(
             location=[row['lat'], row['lon']],
             radius=3,
-            popup=f"SST: {row['sst']:.1f}°C<br>Chlorophyll-a: {row['chlor_a']:.2f} mg/m³",
-            color='blue' if row['sst'] < 25 else 'red',
+            popup="<br>".join(popup),
+            color='red' if has_sst and row['sst'] >= 25 else 'blue',
             fill=True,
             fill_opacity=0.7
         ).add_to(m)
@@ -147,13 +168,19 @@ def show_dashboard():
 
     with col1:
         st.subheader("Sea Surface Temperature Distribution")
-        fig = px.histogram(sample_data, x='sst', nbins=20, title="SST Distribution")
-        st.plotly_chart(fig, use_container_width=True)
+        if has_sst:
+            fig = px.histogram(sample_data, x='sst', nbins=20, title="SST Distribution")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No SST data in the gold layer")
 
     with col2:
         st.subheader("Chlorophyll-a Distribution")
-        fig = px.histogram(sample_data, x='chlor_a', nbins=20, title="Chlorophyll-a Distribution")
-        st.plotly_chart(fig, use_container_width=True)
+        if has_chlor:
+            fig = px.histogram(sample_data, x='chlor_a', nbins=20, title="Chlorophyll-a Distribution")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No chlorophyll-a data in the gold layer")
 
 def show_chat_assistant():
     st.header("🤖 AI Chat Assistant")